@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Customer, Account, Transaction
+from .middleware import invalidate_account_ref
+from .search import index_customer
+from .models import (
+    Customer, Account, Transaction, ArchivedTransaction, DailyTransactionSummary, BalanceSnapshot, IdempotencyKey,
+    InterestAccrual, StandingInstruction, OutboxEvent, OutboxOffset,
+)
 
 
 @admin.register(Customer)
@@ -8,6 +13,12 @@ class CustomerAdmin(admin.ModelAdmin):
     list_filter = ['is_approved', 'city', 'state', 'created_at']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'phone']
     list_editable = ['is_approved']
+    list_select_related = ['user']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_account_ref(obj.user_id)
+        index_customer(obj.id)
 
 
 @admin.register(Account)
@@ -16,7 +27,13 @@ class AccountAdmin(admin.ModelAdmin):
     list_filter = ['account_type', 'is_active', 'created_at']
     search_fields = ['account_number', 'customer__user__username']
     list_editable = ['is_active']
-    readonly_fields = ['account_number', 'created_at']
+    list_select_related = ['customer__user']
+    # Balances only change through ledger postings
+    readonly_fields = ['account_number', 'balance', 'created_at']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_account_ref(obj.customer.user_id)
 
 
 @admin.register(Transaction)
@@ -24,6 +41,109 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ['transaction_id', 'account', 'transaction_type', 'amount', 'balance_after_transaction', 'created_at']
     list_filter = ['transaction_type', 'created_at']
     search_fields = ['transaction_id', 'account__account_number']
+    list_select_related = ['account__customer__user']
     readonly_fields = ['transaction_id', 'created_at']
     date_hierarchy = 'created_at'
 
+    # The ledger is append-only and postings go through accounts.ledger
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    list_display = ['transaction_id', 'account', 'transaction_type', 'amount', 'created_at', 'archived_at']
+    list_filter = ['transaction_type', 'created_at']
+    search_fields = ['transaction_id', 'account__account_number']
+    list_select_related = ['account__customer__user']
+    date_hierarchy = 'created_at'
+
+    # Rows only arrive through `manage.py archive_transactions`
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyTransactionSummary)
+class DailyTransactionSummaryAdmin(admin.ModelAdmin):
+    list_display = ['date', 'transaction_type', 'account_type', 'bucket', 'total_amount', 'transaction_count']
+    list_filter = ['transaction_type', 'account_type', 'date']
+    date_hierarchy = 'date'
+
+
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['account', 'entry_created_at', 'balance', 'entry_count', 'created_at']
+    list_select_related = ['account__customer__user']
+    date_hierarchy = 'entry_created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'status', 'response_location', 'created_at', 'expires_at']
+    list_filter = ['status']
+    search_fields = ['key', 'user__username']
+    list_select_related = ['user']
+
+
+@admin.register(InterestAccrual)
+class InterestAccrualAdmin(admin.ModelAdmin):
+    list_display = ['account', 'period_start', 'period_end', 'average_balance', 'amount', 'transaction_id']
+    list_select_related = ['account__customer__user']
+    search_fields = ['account__account_number', 'transaction_id']
+    date_hierarchy = 'period_end'
+
+    # Written by `manage.py accrue_interest` together with the interest posting
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StandingInstruction)
+class StandingInstructionAdmin(admin.ModelAdmin):
+    list_display = ['account', 'to_account', 'amount', 'frequency', 'next_run_at', 'is_active', 'last_error']
+    list_filter = ['frequency', 'is_active']
+    search_fields = ['account__account_number', 'to_account__account_number', 'last_transaction_id']
+    list_select_related = ['account__customer__user', 'to_account__customer__user']
+    raw_id_fields = ['account', 'to_account']
+    # Kept up to date by `manage.py run_standing_instructions`
+    readonly_fields = ['scheduled_for', 'next_run_at', 'attempts', 'last_run_at', 'last_transaction_id',
+                       'last_error', 'created_at']
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'account_id', 'transaction_id', 'created_at']
+    list_filter = ['event_type']
+    search_fields = ['transaction_id']
+
+    # Written with each posting and relayed by `manage.py relay_outbox`
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxOffset)
+class OutboxOffsetAdmin(admin.ModelAdmin):
+    list_display = ['consumer', 'last_event_id', 'updated_at']
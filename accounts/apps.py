@@ -1,7 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
 
+    def ready(self):
+        from . import metrics
+        # Query counts, DB time and the slow-query log (see accounts/metrics.py)
+        connection_created.connect(metrics.install_query_wrapper)
@@ -0,0 +1,190 @@
+"""
+Archival of cold ledger rows (``manage.py archive_transactions``).
+
+``Transaction`` only grows, and every index on it, and every scan over an
+account's legs, grows with it. ``archive_before()`` moves rows older than a
+cutoff into ``ArchivedTransaction``, which has the same columns and keeps
+each row's id, oldest first and in small batches. Each batch is its own
+short transaction (copy, then delete), so postings are never blocked for
+long and an interrupted run leaves every row in exactly one of the two
+tables.
+
+Because rows move strictly oldest first, every archived row is older than
+every row still in the hot table. Readers rely on that and read the hot
+table first, falling back to the archive only for the part of a range it
+does not hold: history pages through ``KeysetPaginator(older=...)``,
+statements through ``legs()``, and balances and ``verify_ledger`` add the
+archived legs in. Daily summaries are unaffected: archiving moves rows but
+changes no totals.
+
+Native partitioning of ``Transaction`` itself is not possible on MySQL:
+InnoDB refuses to partition tables with foreign keys, and every unique key
+(the primary key and ``transaction_id``) would have to include
+``created_at``. The archive table has neither, so on MySQL
+``ensure_partitions()`` range-partitions it by month (``ARCHIVE_PARTITIONS``
+setting, on by default), which lets queries for a date range prune to the
+months they touch and lets a whole month be dropped at once. On other
+backends the archive is a plain table with the same indexes.
+"""
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Transaction, ArchivedTransaction
+from .pagination import KeysetPaginator
+
+
+# Rows posted more recently than this are never archived, so a posting that
+# commits late with an earlier timestamp cannot land behind archived rows
+ARCHIVE_MIN_AGE = timedelta(days=1)
+ARCHIVE_BATCH_SIZE = 1000
+FIELDS = (
+    'id', 'transaction_id', 'account_id', 'transaction_type', 'amount', 'balance_after_transaction',
+    'signed_amount', 'description', 'created_at', 'to_account_id',
+)
+
+
+def legs(**filters):
+    """The archived and hot querysets for the given filters, oldest first"""
+    return ArchivedTransaction.objects.filter(**filters), Transaction.objects.filter(**filters)
+
+
+def history(account_id, per_page):
+    """Newest-first KeysetPaginator over an account's hot and archived legs"""
+    archived, hot = legs(account_id=account_id)
+    return KeysetPaginator(hot, per_page, older=[archived])
+
+
+def check_cutoff(cutoff):
+    """Raise ValueError for a cutoff too recent to archive before"""
+    if cutoff > timezone.now() - ARCHIVE_MIN_AGE:
+        raise ValueError(f'The cutoff must be at least {ARCHIVE_MIN_AGE.days} day(s) in the past.')
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE, after=None):
+    """
+    Move the oldest hot rows before `cutoff` (and after the (created_at, id)
+    key `after`) to the archive in one transaction. Returns the number of
+    rows moved and the key of the last one (None when nothing was left).
+    """
+    rows = Transaction.objects.filter(created_at__lt=cutoff)
+    if after is not None:
+        # Starting past the last batch skips index entries deleted rows
+        # leave behind until the database purges them
+        created_at, pk = after
+        rows = rows.filter(created_at__gte=created_at).filter(Q(created_at__gt=created_at) | Q(id__gt=pk))
+    with transaction.atomic():
+        batch = list(rows.order_by('created_at', 'id').values(*FIELDS)[:batch_size])
+        if not batch:
+            return 0, None
+        if any(row['signed_amount'] is None for row in batch):
+            raise ValueError('Legs without a signed amount cannot be archived; '
+                             'run `manage.py verify_ledger --backfill` first.')
+        ArchivedTransaction.objects.bulk_create([ArchivedTransaction(**row) for row in batch])
+        Transaction.objects.filter(id__in=[row['id'] for row in batch]).delete()
+    return len(batch), (batch[-1]['created_at'], batch[-1]['id'])
+
+
+def archive_before(cutoff, batch_size=ARCHIVE_BATCH_SIZE, pause=0.0, progress=None):
+    """
+    Archive every hot row created before `cutoff`, `batch_size` rows per
+    transaction, sleeping `pause` seconds between batches (e.g. to let
+    replicas catch up). progress(moved) is called after each batch. Returns
+    the number of rows moved.
+    """
+    check_cutoff(cutoff)
+    ensure_partitions(cutoff)
+    moved = 0
+    after = None
+    while True:
+        count, after = archive_batch(cutoff, batch_size, after)
+        if not count:
+            return moved
+        moved += count
+        if progress is not None:
+            progress(moved)
+        if pause:
+            time.sleep(pause)
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def partition_names():
+    """The archive table's partition names on MySQL; empty when it is not partitioned"""
+    if connection.vendor != 'mysql':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT partition_name FROM information_schema.partitions '
+            'WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL '
+            'ORDER BY partition_ordinal_position',
+            [ArchivedTransaction._meta.db_table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _month_bounds(first, until):
+    """First days of the months after `first`'s month, up to and including `until`'s next month"""
+    first, until = first.astimezone(dt_timezone.utc), until.astimezone(dt_timezone.utc)
+    year, month = first.year, first.month
+    bounds = []
+    while (year, month) <= (until.year, until.month):
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        bounds.append(datetime(year, month, 1))
+    return bounds
+
+
+def _partition(bound):
+    # p202401 holds January 2024: rows before 2024-02-01 (UTC)
+    previous = bound - timedelta(days=1)
+    return f"PARTITION p{previous:%Y%m} VALUES LESS THAN ('{bound:%Y-%m-%d %H:%M:%S}')"
+
+
+def ensure_partitions(until):
+    """
+    On MySQL, give the archive table a monthly partition for every month up
+    to `until`, partitioning it on first use. Returns partitions added.
+    """
+    if connection.vendor != 'mysql' or not getattr(settings, 'ARCHIVE_PARTITIONS', True):
+        return 0
+    table = _quote(ArchivedTransaction._meta.db_table)
+    existing = [name for name in partition_names() if name != 'pmax']
+    if existing:
+        last = datetime.strptime(existing[-1], 'p%Y%m').replace(tzinfo=dt_timezone.utc)
+        bounds = _month_bounds(last, until)[1:]
+        if bounds:
+            definitions = ', '.join(_partition(bound) for bound in bounds)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {table} REORGANIZE PARTITION pmax INTO '
+                               f'({definitions}, PARTITION pmax VALUES LESS THAN (MAXVALUE))')
+        return len(bounds)
+
+    oldest = ArchivedTransaction.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if oldest is None:
+        oldest = Transaction.objects.order_by('created_at').values_list('created_at', flat=True).first() or until
+    bounds = _month_bounds(oldest, until)
+    definitions = ', '.join(_partition(bound) for bound in bounds)
+    with connection.cursor() as cursor:
+        # MySQL requires the partitioning column in the primary key
+        cursor.execute(f'ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at) '
+                       f'PARTITION BY RANGE COLUMNS(created_at) '
+                       f'({definitions}, PARTITION pmax VALUES LESS THAN (MAXVALUE))')
+    return len(bounds)
+
+
+def stats():
+    """Row counts and the time range of the hot and archived ledger rows"""
+    result = {}
+    for name, queryset in (('archived', ArchivedTransaction.objects), ('hot', Transaction.objects)):
+        ordered = queryset.order_by('created_at').values_list('created_at', flat=True)
+        result[name] = {
+            'rows': queryset.count(),
+            'oldest': ordered.first(),
+            'newest': ordered.last(),
+        }
+    result['partitions'] = len(partition_names())
+    return result
@@ -0,0 +1,250 @@
+"""
+Async versions of the customer account views, served under ASGI.
+
+Reads go through Django's async ORM, so a request waiting on the database
+does not hold a worker thread. Ledger postings still need a transaction
+and row locks, which the async ORM does not provide, so they run in a
+bounded thread pool (``settings.POSTING_THREAD_POOL_SIZE``) via
+``sync_to_async``. Requests beyond the pool size queue for a thread instead
+of opening more database connections.
+
+The views mirror accounts/views.py and render the same templates. Querysets
+are evaluated before rendering because templates cannot query the database
+from an async context.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.shortcuts import render, redirect
+from django.utils.functional import SimpleLazyObject
+from .models import Account
+from .views import is_admin, statement_response
+from . import archive, groupcommit, ledger, metrics, pagecache, statements
+from .idempotency import async_idempotent, posting_succeeded
+from .routers import is_pinned, iter_on_replica, use_replica
+from .forms import DepositForm, WithdrawForm, TransferForm
+
+
+_posting_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'POSTING_THREAD_POOL_SIZE', 16),
+    thread_name_prefix='posting',
+)
+
+
+def _in_posting_thread(func, *args):
+    # Pool threads outlive requests, so recycle connections the way the
+    # request_started/request_finished signals do for request threads.
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def post(func, *args):
+    """Run a ledger function in the posting thread pool"""
+    return await sync_to_async(
+        _in_posting_thread, thread_sensitive=False, executor=_posting_executor
+    )(func, *args)
+
+
+async def post_single(transaction_type, account_id, amount, description):
+    """Post a deposit or withdrawal, through the group committer when it is on"""
+    committer = groupcommit.get_committer()
+    with metrics.posting(transaction_type.lower()):
+        if committer is not None and not committer.dead:
+            # Wait on the batch without holding a thread
+            future = committer.enqueue(account_id, transaction_type, amount, description)
+            try:
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), committer.timeout)
+            except asyncio.TimeoutError:
+                if not committer.abandon(future):
+                    return await asyncio.wrap_future(future)
+            except groupcommit.CommitterStopped:
+                pass
+        return await post(groupcommit.direct(transaction_type), account_id, amount, description)
+
+
+def async_login_required(view):
+    """login_required for async views; also resolves request.user for the templates"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _posting_ref(request):
+    """Return the AccountRef for a posting view, or a redirect response"""
+    ref = await request.customer_context.aref()
+    if ref is None:
+        messages.error(request, 'Account not found.')
+        return None, redirect('dashboard')
+    if not ref.is_approved:
+        messages.error(request, 'Your account is not approved yet.')
+        return None, redirect('dashboard')
+    return ref, None
+
+
+@async_login_required
+async def dashboard(request):
+    """User dashboard"""
+    ref = await request.customer_context.aref()
+    if ref is None:
+        messages.error(request, 'Account not found. Please contact administrator.')
+        return redirect('home')
+
+    context = {
+        'ref': ref,
+        'account': SimpleLazyObject(lambda: request.customer_context.account),
+        'recent_transactions': SimpleLazyObject(lambda: archive.history(ref.id, 5).get_page().object_list),
+        **pagecache.dashboard_context(await pagecache.aaccount_version(ref.id)),
+    }
+    # Rendered in a thread, where the template can query for whatever its
+    # cached fragments are missing
+    return await sync_to_async(render)(request, 'accounts/dashboard.html', context)
+
+
+@async_login_required
+@async_idempotent
+async def deposit(request):
+    """Deposit money view"""
+    ref, response = await _posting_ref(request)
+    if response is not None:
+        return response
+
+    if request.method == 'POST':
+        form = DepositForm(request.POST)
+        if form.is_valid():
+            amount = form.cleaned_data['amount']
+            description = form.cleaned_data.get('description', 'Deposit')
+
+            posted = await post_single('Deposit', ref.id, amount, description)
+
+            posting_succeeded(request, f'Successfully deposited ₹{amount}. New balance: ₹{posted.balance_after_transaction}')
+            return redirect('dashboard')
+    else:
+        form = DepositForm()
+
+    account = await request.customer_context.aaccount()
+    return render(request, 'accounts/deposit.html', {'form': form, 'account': account})
+
+
+@async_login_required
+@async_idempotent
+async def withdraw(request):
+    """Withdraw money view"""
+    ref, response = await _posting_ref(request)
+    if response is not None:
+        return response
+
+    if request.method == 'POST':
+        form = WithdrawForm(request.POST)
+        if form.is_valid():
+            amount = form.cleaned_data['amount']
+            description = form.cleaned_data.get('description', 'Withdrawal')
+
+            try:
+                posted = await post_single('Withdraw', ref.id, amount, description)
+            except ledger.InsufficientBalance:
+                messages.error(request, 'Insufficient balance!')
+            except ledger.VelocityLimitExceeded as exc:
+                messages.error(request, str(exc))
+            else:
+                posting_succeeded(request, f'Successfully withdrew ₹{amount}. New balance: ₹{posted.balance_after_transaction}')
+                return redirect('dashboard')
+    else:
+        form = WithdrawForm()
+
+    account = await request.customer_context.aaccount()
+    return render(request, 'accounts/withdraw.html', {'form': form, 'account': account})
+
+
+@async_login_required
+@async_idempotent
+async def transfer(request):
+    """Transfer money view"""
+    ref, response = await _posting_ref(request)
+    if response is not None:
+        return response
+
+    if request.method == 'POST':
+        form = TransferForm(request.POST)
+        if form.is_valid():
+            to_account_number = form.cleaned_data['to_account_number']
+            amount = form.cleaned_data['amount']
+            description = form.cleaned_data.get('description', 'Transfer')
+
+            try:
+                to_account = await Account.objects.only('id', 'account_number').aget(
+                    account_number=to_account_number, is_active=True)
+            except Account.DoesNotExist:
+                messages.error(request, 'Recipient account not found or inactive!')
+            else:
+                if to_account.id == ref.id:
+                    messages.error(request, 'Cannot transfer to your own account!')
+                else:
+                    try:
+                        with metrics.posting('transfer'):
+                            await post(ledger.transfer, ref, to_account, amount, description)
+                    except ledger.InsufficientBalance:
+                        messages.error(request, 'Insufficient balance!')
+                    except ledger.VelocityLimitExceeded as exc:
+                        messages.error(request, str(exc))
+                    else:
+                        posting_succeeded(request, f'Successfully transferred ₹{amount} to account {to_account_number}')
+                        return redirect('dashboard')
+    else:
+        form = TransferForm()
+
+    account = await request.customer_context.aaccount()
+    return render(request, 'accounts/transfer.html', {'form': form, 'account': account})
+
+
+@async_login_required
+@use_replica
+async def transaction_history(request):
+    """Transaction history view"""
+    ref = await request.customer_context.aref()
+    if ref is None:
+        messages.error(request, 'Account not found.')
+        return redirect('dashboard')
+
+    page_obj = await archive.history(ref.id, 10).aget_page(request.GET.get('cursor'))
+
+    return render(request, 'accounts/transaction_history.html', {
+        'page_obj': page_obj,
+        'account': ref
+    })
+
+
+@async_login_required
+@use_replica
+async def export_transactions(request):
+    """Download a statement as CSV or JSON Lines; staff may pass ?account=<number>"""
+    try:
+        start, end, fmt = statements.parse_params(request.GET)
+    except ValueError as exc:
+        messages.error(request, f'Invalid export request: {exc}')
+        return redirect('transaction_history')
+
+    account_number = request.GET.get('account')
+    if account_number and is_admin(request.user):
+        account = await Account.objects.filter(account_number=account_number).only(
+            'id', 'account_number').afirst()
+    else:
+        account = await request.customer_context.aref()
+    if account is None:
+        messages.error(request, 'Account not found.')
+        return redirect('dashboard')
+
+    chunks = statements.render(statements.statement_lines(account.id, start, end), fmt)
+    if not is_pinned(request):
+        chunks = iter_on_replica(chunks)
+    return statement_response(statements.astream(chunks), account.account_number, start, end, fmt)
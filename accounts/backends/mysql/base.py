@@ -0,0 +1,18 @@
+"""
+MySQL backend with connection pooling (see accounts/dbpool.py).
+
+Use it with ``'ENGINE': 'accounts.backends.mysql'`` and a ``POOL`` dict in
+the database settings; without ``POOL`` it behaves like Django's backend.
+"""
+from django.db.backends.mysql import base
+from accounts.dbpool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+
+    def ping_connection(self, conn):
+        try:
+            conn.ping()
+        except base.Database.Error:
+            return False
+        return True
@@ -0,0 +1,146 @@
+"""
+Balances derived from the append-only ledger.
+
+Every Transaction row is one leg of a posting and carries ``signed_amount``,
+the change it makes to its account's balance; rows are never updated. An
+account's balance is therefore the sum of its legs, and
+``Account.balance`` is a maintained copy of that sum which
+``verify_ledger()`` checks.
+
+``BalanceSnapshot`` rows record the running balance every
+``SNAPSHOT_INTERVAL`` legs, so ``balance_at()`` answers "what was the
+balance at time T" from the latest snapshot before T plus at most
+``SNAPSHOT_INTERVAL`` legs. ``take_snapshots()`` (``manage.py
+snapshot_balances``) only snapshots legs older than ``SNAPSHOT_LAG`` so a
+posting that commits late with an earlier timestamp is never skipped.
+
+Legs moved to ``ArchivedTransaction`` (see accounts/archive.py) still count:
+every function here reads the archived legs before the hot ones.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from .models import Account, Transaction, ArchivedTransaction, BalanceSnapshot
+from . import archive
+
+
+SNAPSHOT_INTERVAL = 1000
+SNAPSHOT_LAG = timedelta(minutes=5)
+SCAN_BATCH_SIZE = 5000
+
+
+def backfill_signed_amounts():
+    """Fill signed_amount on legs written before the column existed; returns rows updated"""
+    legacy = Transaction.objects.filter(signed_amount__isnull=True)
+    updated = legacy.filter(transaction_type='Deposit').update(signed_amount=F('amount'))
+    updated += legacy.filter(transaction_type='Withdraw').update(signed_amount=-F('amount'))
+    # Transfer legs are told apart by the description ledger.transfer() writes
+    updated += legacy.filter(transaction_type='Transfer', description__startswith='Transfer to ').update(
+        signed_amount=-F('amount'))
+    updated += legacy.filter(transaction_type='Transfer').update(signed_amount=F('amount'))
+    return updated
+
+
+def _after(queryset, created_at, pk):
+    """Restrict a leg queryset to rows after (created_at, pk)"""
+    return queryset.filter(created_at__gte=created_at).filter(Q(created_at__gt=created_at) | Q(id__gt=pk))
+
+
+def latest_snapshot(account_id, at=None):
+    snapshots = BalanceSnapshot.objects.filter(account_id=account_id)
+    if at is not None:
+        snapshots = snapshots.filter(entry_created_at__lte=at)
+    return snapshots.order_by('-entry_created_at', '-last_entry_id').first()
+
+
+def balance_at(account_id, at=None):
+    """Return the account balance after every leg posted at or before `at` (default: now)"""
+    snapshot = latest_snapshot(account_id, at)
+    balance = Decimal('0.00') if snapshot is None else snapshot.balance
+    for legs in archive.legs(account_id=account_id):
+        if at is not None:
+            legs = legs.filter(created_at__lte=at)
+        if snapshot is not None:
+            legs = _after(legs, snapshot.entry_created_at, snapshot.last_entry_id)
+        tail = legs.order_by().aggregate(total=Sum('signed_amount'))['total']
+        balance += tail or Decimal('0.00')
+    return balance
+
+
+def snapshot_account(account_id, lag=SNAPSHOT_LAG):
+    """Add snapshots for an account every SNAPSHOT_INTERVAL legs; returns snapshots added"""
+    snapshot = latest_snapshot(account_id)
+    if snapshot is None:
+        balance, count = Decimal('0.00'), 0
+    else:
+        balance, count = snapshot.balance, snapshot.entry_count
+
+    added = []
+    for legs in archive.legs(account_id=account_id, created_at__lt=timezone.now() - lag):
+        if snapshot is not None:
+            legs = _after(legs, snapshot.entry_created_at, snapshot.last_entry_id)
+        legs = legs.order_by('created_at', 'id').values_list('id', 'created_at', 'signed_amount')
+        batch = list(legs[:SCAN_BATCH_SIZE])
+        while batch:
+            for pk, created_at, signed_amount in batch:
+                balance += signed_amount
+                count += 1
+                if count % SNAPSHOT_INTERVAL == 0:
+                    added.append(BalanceSnapshot(
+                        account_id=account_id, entry_created_at=created_at, last_entry_id=pk,
+                        balance=balance, entry_count=count,
+                    ))
+            if len(batch) < SCAN_BATCH_SIZE:
+                break
+            batch = list(_after(legs, batch[-1][1], batch[-1][0])[:SCAN_BATCH_SIZE])
+    BalanceSnapshot.objects.bulk_create(added)
+    return len(added)
+
+
+def take_snapshots(account_ids=None, lag=SNAPSHOT_LAG):
+    """Snapshot every account (or the given ones); returns snapshots added"""
+    if account_ids is None:
+        account_ids = Account.objects.order_by('id').values_list('id', flat=True).iterator()
+    return sum(snapshot_account(account_id, lag) for account_id in account_ids)
+
+
+def verify_chunk(account_ids):
+    """
+    Return [(account_id, stored, derived, unsigned_legs)] for accounts whose
+    stored balance differs from the sum of their legs, or that have legs
+    without a signed_amount. Stored and derived values come from one
+    statement, so concurrent postings cannot cause false mismatches.
+    """
+    # A subquery rather than a second join, which would repeat every hot leg
+    # once per archived leg
+    archived = ArchivedTransaction.objects.filter(account_id=OuterRef('pk')).order_by().values(
+        'account_id').annotate(total=Sum('signed_amount')).values('total')
+    try:
+        rows = Account.objects.filter(id__in=account_ids).order_by().values_list('id', 'balance').annotate(
+            derived=Sum('transactions__signed_amount'),
+            unsigned=Count('transactions', filter=Q(transactions__signed_amount__isnull=True)),
+            archived=Subquery(archived),
+        )
+        problems = []
+        for account_id, stored, derived, unsigned, archived_sum in rows:
+            # SQLite sums decimals as floats; round back to the column's scale
+            derived = ((derived or Decimal('0.00')) + (archived_sum or Decimal('0.00'))).quantize(Decimal('0.01'))
+            if stored != derived or unsigned:
+                problems.append((account_id, stored, derived, unsigned))
+        return problems
+    finally:
+        connection.close()
+
+
+def verify_ledger(chunk_size=1000, workers=4):
+    """Re-derive every account balance in parallel chunks; returns (accounts checked, problems)"""
+    account_ids = list(Account.objects.order_by('id').values_list('id', flat=True))
+    chunks = [account_ids[start:start + chunk_size] for start in range(0, len(account_ids), chunk_size)]
+    problems = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk_problems in pool.map(verify_chunk, chunks):
+            problems.extend(chunk_problems)
+    return len(account_ids), problems
@@ -0,0 +1,888 @@
+"""
+Benchmark scenarios run by ``manage.py benchmark <scenario>``.
+
+Each scenario builds its own throwaway fixtures (usernames prefixed with
+``bench_``), measures against the configured database and returns a dict of
+results. Fixtures are removed afterwards.
+"""
+import os
+import random
+import string
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.db.models import Min, Q, Sum
+from django.db.models.functions import Mod
+from django.utils import timezone
+from .models import (
+    Customer, Account, Transaction, ArchivedTransaction, IdempotencyKey, StandingInstruction, OutboxEvent, OutboxOffset,
+)
+from . import (archive, balances, dbpool, groupcommit, idempotency, interest, ledger, metrics, outbox, pagecache,
+               reconcile, rollups, search, seeding, standing, statements, velocity)
+from .ingest import post_batch
+from .ids import new_account_number, new_transaction_id
+from .pagination import KeysetPaginator, encode_cursor
+from .middleware import invalidate_account_ref
+
+
+SCENARIOS = {}
+BENCH_PREFIX = 'bench_'
+
+
+def scenario(name):
+    """Register a benchmark scenario under the given name"""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def make_account(balance=Decimal('0.00'), account_type='Saving'):
+    """Create an approved customer with an account for benchmarking"""
+    user = User.objects.create(username=BENCH_PREFIX + uuid.uuid4().hex[:20])
+    customer = Customer.objects.create(
+        user=user, phone='0000000000', address='Benchmark', city='Benchmark',
+        state='Benchmark', pincode='000000', is_approved=True
+    )
+    return Account.objects.create(customer=customer, account_type=account_type, balance=balance)
+
+
+def bulk_customers(count, batch_size=5000):
+    """Bulk-create approved customers with accounts and search terms; returns nothing"""
+    first_names = ('Arjun', 'Priya', 'Rahul', 'Anita', 'Vikram', 'Sneha', 'Kiran', 'Meera')
+    last_names = ('Sharma', 'Iyer', 'Patel', 'Reddy', 'Nair', 'Gupta', 'Das', 'Khan')
+    for start in range(0, count, batch_size):
+        names = [f'{BENCH_PREFIX}{uuid.uuid4().hex[:20]}' for _ in range(min(batch_size, count - start))]
+        User.objects.bulk_create([
+            User(username=name, first_name=first_names[i % 8], last_name=last_names[(i // 8) % 8],
+                 email=f'{name}@example.com')
+            for i, name in enumerate(names, start)
+        ])
+        # Not every backend returns bulk-inserted primary keys, so read them back
+        users = list(User.objects.filter(username__in=names))
+        Customer.objects.bulk_create([
+            Customer(user=user, phone=f'9{user.id:09d}', address='Benchmark', city='Benchmark',
+                     state='Benchmark', pincode='000000', is_approved=True)
+            for user in users
+        ])
+        customers = list(Customer.objects.filter(user__in=users).select_related('user'))
+        Account.objects.bulk_create([
+            Account(customer=customer, account_number=new_account_number(), balance=Decimal('1000.00'))
+            for customer in customers
+        ])
+        search.index_customers(Customer.objects.filter(user__in=users).select_related('user', 'account'))
+
+
+def require_benchmark_database():
+    """Refuse to run against a database that is not marked as a benchmark database"""
+    if not settings.BENCHMARK_DATABASE:
+        raise ImproperlyConfigured(
+            'Benchmarks write fixtures to the configured database and rebuild its daily summaries; '
+            'set BENCHMARK_DATABASE=1 only for a database that holds benchmark or seeded data.'
+        )
+
+
+def cleanup():
+    """Remove every benchmark fixture and re-derive the summaries its postings touched today"""
+    require_benchmark_database()
+    today = timezone.localdate()
+    accounts = Account.objects.filter(customer__user__username__startswith=BENCH_PREFIX)
+    # Postings made through the ledger added to today's summaries, bulk-loaded rows did not
+    buckets = set(Transaction.objects.filter(account__in=accounts, created_at__date__gte=today).order_by().annotate(
+        bucket=Mod('account_id', rollups.SUMMARY_BUCKETS)).values_list('bucket', flat=True).distinct())
+    # Outbox events only hold plain account ids, so they are not deleted with the accounts
+    OutboxEvent.objects.filter(account_id__in=accounts.values('id')).delete()
+    OutboxOffset.objects.filter(consumer__startswith=BENCH_PREFIX).delete()
+    User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+    if buckets:
+        rollups.rebuild(since=today, buckets={int(bucket) for bucket in buckets})
+
+
+def run_threads(worker, threads):
+    """Run worker(index) in parallel threads, each on its own DB connection"""
+    errors = []
+
+    def target(index):
+        try:
+            worker(index)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    pool = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return elapsed
+
+
+@scenario('postings')
+def postings(options):
+    """Hammer one account from many threads and check no update is lost"""
+    threads = options['threads']
+    iterations = options['iterations']
+    amount = Decimal('1.00')
+    account = make_account(Decimal('1000.00'))
+    counterparty = make_account(Decimal('1000.00'))
+
+    def worker(index):
+        for i in range(iterations):
+            if i % 3 == 0:
+                ledger.deposit(account.id, amount)
+            elif i % 3 == 1:
+                ledger.withdraw(account.id, amount)
+            elif index % 2:
+                ledger.transfer(account, counterparty, amount)
+            else:
+                ledger.transfer(counterparty, account, amount)
+
+    # Two accounts take every debit, far beyond any velocity limit
+    with override_settings(VELOCITY_LIMITS={}):
+        elapsed = run_threads(worker, threads)
+    postings_made = threads * iterations
+
+    net_per_thread = len(range(0, iterations, 3)) - len(range(1, iterations, 3))
+    expected = Decimal('2000.00') + threads * net_per_thread * amount
+    account.refresh_from_db()
+    counterparty.refresh_from_db()
+    return {
+        'threads': threads,
+        'postings': postings_made,
+        'seconds': round(elapsed, 3),
+        'postings_per_second': round(postings_made / elapsed, 1),
+        'lost_updates': (expected - account.balance - counterparty.balance) / amount,
+        'rows_written': Transaction.objects.filter(account__in=[account, counterparty]).count(),
+    }
+
+
+def legacy_transaction_id():
+    """The original random-id-plus-exists() loop, kept for comparison"""
+    while True:
+        trans_id = 'TXN' + ''.join(random.choices(string.digits, k=10))
+        if not Transaction.objects.filter(transaction_id=trans_id).exists():
+            return trans_id
+
+
+@scenario('ids')
+def ids(options):
+    """Compare transaction insert throughput with legacy vs generated ids"""
+    count = options['iterations']
+    account = make_account()
+    results = {'inserts': count}
+    for label, make_id in (('legacy', legacy_transaction_id), ('generated', new_transaction_id)):
+        start = time.perf_counter()
+        for _ in range(count):
+            Transaction.objects.create(
+                transaction_id=make_id(),
+                account=account,
+                transaction_type='Deposit',
+                amount=Decimal('1.00'),
+                balance_after_transaction=Decimal('1.00'),
+            )
+        elapsed = time.perf_counter() - start
+        results[f'{label}_inserts_per_second'] = round(count / elapsed, 1)
+    return results
+
+
+@scenario('ingest')
+def ingest(options):
+    """Post a generated batch through post_batch() vs. one ledger call per posting"""
+    size = options['size']
+    accounts = [make_account(Decimal('100000.00')) for _ in range(100)]
+    numbers = [account.account_number for account in accounts]
+    types = ('Deposit', 'Withdraw', 'Transfer')
+    records = [
+        (i, {
+            'account_number': numbers[i % len(numbers)],
+            'transaction_type': types[i % 3],
+            'amount': '1.00',
+            'to_account_number': numbers[(i + 1) % len(numbers)],
+        })
+        for i in range(size)
+    ]
+
+    start = time.perf_counter()
+    result = post_batch(records)
+    batch_elapsed = time.perf_counter() - start
+
+    sample = min(size, options['iterations'])
+    start = time.perf_counter()
+    for i in range(sample):
+        ledger.deposit(accounts[i % len(accounts)].id, Decimal('1.00'))
+    single_elapsed = time.perf_counter() - start
+
+    return {
+        'postings': result.posted,
+        'rejected': len(result.rejected),
+        'batch_seconds': round(batch_elapsed, 3),
+        'batch_postings_per_second': round(result.posted / batch_elapsed, 1),
+        'single_postings_per_second': round(sample / single_elapsed, 1),
+    }
+
+
+def bulk_transactions(accounts, count, batch_size=10000, spread=None):
+    """
+    Insert `count` Deposit rows spread across `accounts` without per-row
+    save(); with a `spread` timedelta, their timestamps are spaced evenly
+    over that long up to now.
+    """
+    now = timezone.now()
+    for start in range(0, count, batch_size):
+        rows = [
+            Transaction(
+                transaction_id=new_transaction_id(),
+                account=accounts[i % len(accounts)],
+                transaction_type=('Deposit', 'Withdraw', 'Transfer')[i % 3],
+                amount=Decimal('1.00'),
+                signed_amount=Decimal('-1.00') if i % 3 == 1 else Decimal('1.00'),
+                balance_after_transaction=Decimal('1.00'),
+                created_at=now - spread * (1 - i / count) if spread else None,
+            )
+            for i in range(start, min(start + batch_size, count))
+        ]
+        if spread:
+            with seeding.explicit_created_at(Transaction):
+                Transaction.objects.bulk_create(rows, batch_size=batch_size)
+        else:
+            Transaction.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def percentile(sorted_values, fraction):
+    """Return the value at `fraction` (0-1) of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def best_of(func, runs):
+    """Return the fastest of `runs` timings of func() in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return round(min(timings) * 1000, 2)
+
+
+@scenario('reports')
+def reports(options):
+    """Report totals from raw Transaction aggregates vs. the daily summaries"""
+    size = options['size']
+    accounts = [make_account() for _ in range(100)]
+    bulk_transactions(accounts, size)
+    rollups.rebuild(since=timezone.localdate())
+
+    def raw_totals():
+        for transaction_type in ('Deposit', 'Withdraw', 'Transfer'):
+            Transaction.objects.filter(transaction_type=transaction_type).aggregate(Sum('amount'))
+
+    return {
+        'transactions': Transaction.objects.count(),
+        'raw_aggregate_ms': best_of(raw_totals, 5),
+        'summary_ms': best_of(rollups.totals_by_type, 5),
+    }
+
+
+@scenario('pagination')
+def pagination(options):
+    """Time the first and the deepest history page with OFFSET vs. keyset pagination"""
+    size = options['size']
+    per_page = 10
+    account = make_account()
+    bulk_transactions([account], size)
+    history = Transaction.objects.filter(account=account)
+    last_page = max(1, size // per_page)
+
+    boundary = history.order_by('-created_at', '-id')[(last_page - 1) * per_page - 1] if last_page > 1 else None
+    deep_cursor = encode_cursor(boundary.created_at, boundary.pk, 'next') if boundary else None
+
+    def offset_page(number):
+        return lambda: list(Paginator(history.order_by('-created_at', '-id'), per_page).get_page(number))
+
+    def keyset_page(cursor):
+        return lambda: list(KeysetPaginator(history, per_page).get_page(cursor))
+
+    return {
+        'transactions': size,
+        'deep_page': last_page,
+        'offset_first_ms': best_of(offset_page(1), 5),
+        'offset_deep_ms': best_of(offset_page(last_page), 5),
+        'keyset_first_ms': best_of(keyset_page(None), 5),
+        'keyset_deep_ms': best_of(keyset_page(deep_cursor), 5),
+    }
+
+
+@scenario('request_context')
+def request_context(options):
+    """Count queries per customer view with a cold and a warm account cache"""
+    account = make_account(Decimal('1000.00'))
+    user = account.customer.user
+    client = Client()
+    client.force_login(user)
+
+    def queries(method, url, data=None):
+        with CaptureQueriesContext(connection) as captured:
+            method(url, data or {})
+        return len(captured)
+
+    results = {}
+    requests = [(name, client.get, None) for name in (
+        'dashboard', 'deposit', 'withdraw', 'transfer', 'transaction_history', 'profile')]
+    requests.append(('deposit_post', client.post, {'amount': '1.00'}))
+    for name, method, data in requests:
+        url = reverse(name.replace('_post', ''))
+        invalidate_account_ref(user.pk)
+        results[f'{name}_cold'] = queries(method, url, data)
+        results[f'{name}_warm'] = queries(method, url, data)
+    return results
+
+
+@scenario('search')
+def search_latency(options):
+    """Customer search through the term index vs. the old icontains predicates"""
+    size = options['size']
+    bulk_customers(size)
+    queries = ('priya', 'sharma', 'arjun nair', '9000001', 'nosuchname')
+
+    def legacy():
+        for query in queries:
+            list(Customer.objects.filter(
+                Q(user__username__icontains=query) |
+                Q(user__first_name__icontains=query) |
+                Q(user__last_name__icontains=query) |
+                Q(phone__icontains=query)
+            ).order_by('-created_at')[:10])
+
+    def indexed():
+        for query in queries:
+            search.search_customers(query)
+
+    return {
+        'customers': Customer.objects.count(),
+        'queries': len(queries),
+        'icontains_ms': best_of(legacy, 3),
+        'indexed_ms': best_of(indexed, 3),
+    }
+
+
+# Peak memory allowed for streaming a statement, whatever its length
+EXPORT_MEMORY_CEILING_MB = 64
+
+
+@scenario('export')
+def export(options):
+    """Stream a `--size` row statement and check memory stays under the ceiling"""
+    size = options['size']
+    account = make_account()
+    bulk_transactions([account], size)
+
+    tracemalloc.start()
+    began = time.perf_counter()
+    # Minus the header line
+    rows = sum(1 for _ in statements.render(statements.statement_lines(account.id), 'csv')) - 1
+    elapsed = time.perf_counter() - began
+    peak_mb = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+    tracemalloc.stop()
+    return {
+        'rows': rows,
+        'rows_per_second': round(rows / elapsed, 1),
+        'peak_mb': peak_mb,
+        'ceiling_mb': EXPORT_MEMORY_CEILING_MB,
+        'within_ceiling': peak_mb <= EXPORT_MEMORY_CEILING_MB,
+    }
+
+
+@scenario('group_commit')
+def group_commit(options):
+    """Deposit throughput and latency per thread count, per-request commits vs. group commit"""
+    iterations = options['iterations']
+    amount = Decimal('1.00')
+    counts = sorted({1, *(2 ** n for n in range(1, options['threads'].bit_length())), options['threads']})
+    accounts = [make_account() for _ in range(options['threads'])]
+    committer = groupcommit.GroupCommitter()
+    modes = {
+        'direct': lambda account_id: ledger.deposit(account_id, amount),
+        'group': lambda account_id: committer.submit(account_id, 'Deposit', amount, 'Deposit'),
+    }
+
+    results = {}
+    for threads in counts:
+        for mode, post in modes.items():
+            latencies = []
+
+            def worker(index):
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    post(accounts[index].id)
+                    latencies.append(time.perf_counter() - start)
+
+            elapsed = run_threads(worker, threads)
+            latencies.sort()
+            results[f'{mode}_{threads}t_per_second'] = round(len(latencies) / elapsed, 1)
+            results[f'{mode}_{threads}t_p50_ms'] = round(percentile(latencies, 0.50) * 1000, 2)
+            results[f'{mode}_{threads}t_p99_ms'] = round(percentile(latencies, 0.99) * 1000, 2)
+    results['group_batches'] = committer.batches
+    results['group_mean_batch'] = round(committer.postings / max(committer.batches, 1), 1)
+    return results
+
+
+@scenario('balance_at')
+def balance_at(options):
+    """Point-in-time balance from a full sum of ledger entries vs. snapshot plus tail"""
+    size = options['size']
+    account = make_account()
+    bulk_transactions([account], size)
+    snapshots = balances.take_snapshots([account.id], lag=timedelta(0))
+    points = list(Transaction.objects.filter(account=account).order_by('?').values_list(
+        'created_at', flat=True)[:20])
+
+    def full_sum():
+        for at in points:
+            Transaction.objects.filter(account=account, created_at__lte=at).aggregate(Sum('signed_amount'))
+
+    def snapshot_tail():
+        for at in points:
+            balances.balance_at(account.id, at)
+
+    for at in points[:3]:
+        expected = Transaction.objects.filter(account=account, created_at__lte=at).aggregate(
+            total=Sum('signed_amount'))['total']
+        if balances.balance_at(account.id, at) != expected:
+            raise AssertionError(f'Snapshot balance at {at} differs from the full sum')
+
+    return {
+        'entries': size,
+        'snapshots': snapshots,
+        'queries': len(points),
+        'full_sum_ms': best_of(full_sum, 3),
+        'snapshot_ms': best_of(snapshot_tail, 3),
+    }
+
+
+@scenario('idempotency')
+def idempotency_overhead(options):
+    """Per-request cost of the idempotency-key lookup, claim and completion"""
+    iterations = options['iterations']
+    user = make_account().customer.user
+    request_hash = 'x' * 64
+    idempotency.claim(user.pk, 'replayed', request_hash)
+    IdempotencyKey.objects.filter(user=user, key='replayed').update(
+        status=IdempotencyKey.DONE, response_location='/dashboard/')
+    keys = [idempotency.new_key() for _ in range(iterations)]
+
+    def per_call_ms(func):
+        start = time.perf_counter()
+        for i in range(iterations):
+            func(i)
+        return round((time.perf_counter() - start) * 1000 / iterations, 3)
+
+    def claim_and_complete(i):
+        record, _ = idempotency.claim(user.pk, keys[i], request_hash)
+        IdempotencyKey.objects.filter(pk=record.pk).update(status=IdempotencyKey.DONE)
+
+    return {
+        'iterations': iterations,
+        'lookup_ms': per_call_ms(lambda i: idempotency.lookup(user.pk, 'replayed')),
+        'replay_resolve_ms': per_call_ms(lambda i: idempotency._resolve(user.pk, 'replayed', request_hash)),
+        'claim_and_complete_ms': per_call_ms(claim_and_complete),
+    }
+
+
+@scenario('connection_pool')
+def connection_pool(options):
+    """Request latency with a new connection per request vs. connections from the pool"""
+    if not isinstance(connections[DEFAULT_DB_ALIAS], dbpool.PooledDatabaseWrapperMixin):
+        raise ValueError("ENGINE is not a pooled backend such as 'accounts.backends.mysql'")
+    iterations = options['iterations']
+    user = make_account(Decimal('1000.00')).customer.user
+    url = reverse('dashboard')
+    pool_options = connection.settings_dict.get('POOL') or {'MAX_SIZE': options['threads']}
+
+    def run(threads):
+        latencies = []
+
+        def worker(index):
+            client = Client()
+            client.force_login(user)
+            for _ in range(iterations):
+                start = time.perf_counter()
+                client.get(url)
+                # What request_finished does with CONN_MAX_AGE = 0
+                connection.close()
+                latencies.append(time.perf_counter() - start)
+
+        elapsed = run_threads(worker, threads)
+        latencies.sort()
+        return elapsed, latencies
+
+    results = {}
+    saved = connection.settings_dict.get('POOL')
+    connection.close()
+    try:
+        for mode, pool in (('no_pool', {}), ('pool', pool_options)):
+            connection.settings_dict['POOL'] = pool
+            for threads in sorted({1, options['threads']}):
+                elapsed, latencies = run(threads)
+                results[f'{mode}_{threads}t_per_second'] = round(len(latencies) / elapsed, 1)
+                results[f'{mode}_{threads}t_p50_ms'] = round(percentile(latencies, 0.50) * 1000, 2)
+                results[f'{mode}_{threads}t_p99_ms'] = round(percentile(latencies, 0.99) * 1000, 2)
+    finally:
+        connection.settings_dict['POOL'] = saved
+
+    stats = dbpool.stats()['pools'].get(DEFAULT_DB_ALIAS, {})
+    for counter in ('created', 'checkouts', 'waits', 'wait_ms', 'reconnects'):
+        results[f'pool_{counter}'] = stats.get(counter, 0)
+    return results
+
+
+@scenario('instrumentation')
+def instrumentation(options):
+    """Dashboard request latency without the metrics middleware, and with it at 0% and 100% sampling"""
+    iterations = options['iterations']
+    user = make_account(Decimal('1000.00')).customer.user
+    url = reverse('dashboard')
+    without = [name for name in settings.MIDDLEWARE if name != 'accounts.metrics.MetricsMiddleware']
+    modes = {
+        'no_middleware': {'MIDDLEWARE': without},
+        'sampled_0': {'METRICS_SAMPLE_RATE': 0.0, 'SLOW_QUERY_MS': None},
+        'sampled_100': {'METRICS_SAMPLE_RATE': 1.0},
+    }
+
+    results = {}
+    for mode, overrides in modes.items():
+        with override_settings(**overrides):
+            client = Client()
+            client.force_login(user)
+            client.get(url)
+            latencies = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                client.get(url)
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results[f'{mode}_p50_ms'] = round(percentile(latencies, 0.50) * 1000, 3)
+        results[f'{mode}_p99_ms'] = round(percentile(latencies, 0.99) * 1000, 3)
+    results['metrics_lines'] = metrics.render().count('\n')
+    return results
+
+
+@scenario('page_cache')
+def page_cache(options):
+    """Dashboard time and queries with its fragments re-rendered vs. served from the cache"""
+    iterations = options['iterations']
+    account = make_account(Decimal('1000.00'))
+    bulk_transactions([account], 50)
+    client = Client()
+    client.force_login(account.customer.user)
+    url = reverse('dashboard')
+
+    def measure(bump):
+        client.get(url)
+        timings, queries = [], 0
+        for _ in range(iterations):
+            if bump:
+                # What a posting does to the account's cached fragments
+                pagecache.bump_account_versions([account.id])
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                client.get(url)
+                timings.append(time.perf_counter() - start)
+            queries = len(captured)
+        timings.sort()
+        return round(percentile(timings, 0.50) * 1000, 3), queries
+
+    results = {}
+    for mode, bump in (('uncached', True), ('cached', False)):
+        results[f'dashboard_{mode}_p50_ms'], results[f'dashboard_{mode}_queries'] = measure(bump)
+    return results
+
+
+@scenario('archive')
+def archive_tiers(options):
+    """Recent-history reads with a year of rows in the hot table vs. after archiving all but 30 days"""
+    size = options['size']
+    accounts = [make_account() for _ in range(10)]
+    account_ids = [account.id for account in accounts]
+    bulk_transactions(accounts, size, spread=timedelta(days=365))
+    balances.take_snapshots(account_ids, lag=timedelta(0))
+    recent = timezone.localdate(timezone.now() - timedelta(days=30))
+    # Archiving moves every row before the cutoff, so it must not pass the
+    # oldest hot row outside the benchmark, or that row would be left behind
+    # archived ones
+    oldest_other = Transaction.objects.exclude(account_id__in=account_ids).aggregate(
+        oldest=Min('created_at'))['oldest']
+    cutoff = min(filter(None, [timezone.now() - timedelta(days=30), oldest_other]))
+
+    def history():
+        for account_id in account_ids:
+            list(archive.history(account_id, 10).get_page())
+
+    def listing():
+        list(KeysetPaginator(Transaction.objects.filter(account_id__in=account_ids), 20, older=[
+            ArchivedTransaction.objects.filter(account_id__in=account_ids)]).get_page())
+
+    def export_recent():
+        for account_id in account_ids:
+            list(statements.statement_lines(account_id, recent))
+
+    def balance_now():
+        for account_id in account_ids:
+            balances.balance_at(account_id)
+
+    cases = {'history': history, 'listing': listing, 'export_30d': export_recent, 'balance_now': balance_now}
+    results = {'transactions': size}
+    expected = [list(statements.statement_lines(account_id, recent)) for account_id in account_ids]
+    for name, func in cases.items():
+        results[f'{name}_before_ms'] = best_of(func, 5)
+    start = time.perf_counter()
+    results['archived'] = archive.archive_before(cutoff)
+    results['archive_seconds'] = round(time.perf_counter() - start, 2)
+    if [list(statements.statement_lines(account_id, recent)) for account_id in account_ids] != expected:
+        raise AssertionError('Statements differ after archiving')
+    for name, func in cases.items():
+        results[f'{name}_after_ms'] = best_of(func, 5)
+    return results
+
+
+@scenario('interest')
+def interest_accrual(options):
+    """A month of interest for --size Saving accounts: one account at a time vs. the chunked engine"""
+    size = options['size']
+    bulk_customers(size)
+    opened = timezone.now() - timedelta(days=31)
+    accounts = Account.objects.filter(customer__user__username__startswith=BENCH_PREFIX)
+    accounts.update(created_at=opened)
+    ids = list(accounts.order_by('id').values_list('id', flat=True))
+    # An opening deposit of the accounts' 1000.00 and a second deposit part-way through the month
+    with seeding.explicit_created_at(Transaction):
+        for start in range(0, len(ids), 5000):
+            Transaction.objects.bulk_create([
+                Transaction(transaction_id=new_transaction_id(), account_id=account_id, transaction_type='Deposit',
+                            amount=amount, signed_amount=amount, balance_after_transaction=balance,
+                            description='Benchmark', created_at=opened + timedelta(days=days))
+                for n, account_id in enumerate(ids[start:start + 5000])
+                for amount, balance, days in ((Decimal('1000.00'), Decimal('1000.00'), 0),
+                                              (Decimal('500.00'), Decimal('1500.00'), 1 + n % 29))
+            ], batch_size=5000)
+    accounts.update(balance=Decimal('1500.00'))
+    day = timezone.localdate() - timedelta(days=1)
+    first = day - timedelta(days=29)
+
+    def one_account(account_id):
+        # What a per-row job does: a balance lookup per day, then a ledger posting
+        total = sum(balances.balance_at(account_id, statements.day_start(first + timedelta(days=n + 1)))
+                    for n in range(30))
+        amount = (total * interest.annual_rate() / interest.day_count()).quantize(Decimal('0.01'))
+        if amount > 0:
+            ledger.deposit(account_id, amount, 'Interest')
+
+    sample = ids[:min(len(ids), 200)]
+    start = time.perf_counter()
+    for account_id in sample:
+        one_account(account_id)
+    per_row = (time.perf_counter() - start) / len(sample)
+
+    start = time.perf_counter()
+    result = interest.accrue(day, workers=options['threads'], account_ids=ids)
+    elapsed = time.perf_counter() - start
+    return {
+        'accounts': size,
+        'per_row_ms_per_account': round(per_row * 1000, 3),
+        'per_row_projected_seconds': round(per_row * size, 1),
+        'engine_seconds': round(elapsed, 2),
+        'engine_accounts_per_second': round(result['accrued'] / elapsed, 1),
+        'credited': result['credited'],
+    }
+
+
+@scenario('reconcile')
+def reconcile_scaling(options):
+    """Reconciliation throughput over --size accounts with 1, 2, 4 ... --threads worker processes"""
+    size = options['size']
+    bulk_customers(size)
+    ids = list(Account.objects.filter(customer__user__username__startswith=BENCH_PREFIX).values_list('id', flat=True))
+    # One opening deposit per account, matching the 1000.00 bulk_customers() stores
+    for start in range(0, len(ids), 10000):
+        Transaction.objects.bulk_create([
+            Transaction(transaction_id=new_transaction_id(), account_id=account_id, transaction_type='Deposit',
+                        amount=Decimal('1000.00'), signed_amount=Decimal('1000.00'),
+                        balance_after_transaction=Decimal('1000.00'), description='Benchmark')
+            for account_id in ids[start:start + 10000]
+        ], batch_size=10000)
+
+    counts = sorted({1, *(2 ** n for n in range(1, options['threads'].bit_length())), options['threads']})
+    results = {'accounts': Account.objects.count()}
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in counts:
+            start = time.perf_counter()
+            result = reconcile.reconcile(os.path.join(directory, f'{workers}.jsonl'), workers)
+            elapsed = time.perf_counter() - start
+            results[f'{workers}w_accounts_per_second'] = round(result['accounts'] / elapsed, 1)
+    results['mismatches'] = result['mismatches']
+    return results
+
+
+@scenario('velocity')
+def velocity_limits(options):
+    """Withdrawal latency without velocity limits vs. with them, and how fast a limit rejects"""
+    iterations = options['iterations']
+    amount = Decimal('1.00')
+    accounts = [make_account(Decimal('1000000.00')) for _ in range(2)]
+    generous = {'Saving': {window: {'count': 10 ** 6, 'amount': '100000000.00'} for window in velocity.WINDOWS}}
+    modes = {'unlimited': ({}, accounts[0]), 'limited': (generous, accounts[1])}
+
+    results = {}
+    for mode, (limits, account) in modes.items():
+        with override_settings(VELOCITY_LIMITS=limits):
+            ledger.withdraw(account.id, amount)
+            latencies = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                ledger.withdraw(account.id, amount)
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results[f'{mode}_p50_ms'] = round(percentile(latencies, 0.50) * 1000, 3)
+        results[f'{mode}_p99_ms'] = round(percentile(latencies, 0.99) * 1000, 3)
+    results['added_p50_ms'] = round(results['limited_p50_ms'] - results['unlimited_p50_ms'], 3)
+
+    def reserve():
+        for _ in range(iterations):
+            velocity.reserve(accounts[1].id, 'Saving', amount)
+
+    with override_settings(VELOCITY_LIMITS=generous):
+        results['reserve_us'] = round(best_of(reserve, 3) * 1000 / iterations, 2)
+    with override_settings(VELOCITY_LIMITS={'Saving': {'minute': {'count': 1}}}):
+        rejected = 0
+        for _ in range(iterations):
+            try:
+                ledger.withdraw(accounts[1].id, amount)
+            except ledger.VelocityLimitExceeded:
+                rejected += 1
+    results['rejected_over_limit'] = rejected
+    return results
+
+
+@scenario('standing')
+def standing_instructions(options):
+    """--size due standing instructions: one transfer request per instruction vs. the batched executor"""
+    size = options['size']
+    bulk_customers(max(size // 10, 2))
+    accounts = list(Account.objects.filter(customer__user__username__startswith=BENCH_PREFIX)
+                    .order_by('id').values_list('id', flat=True))
+    due = timezone.now() - timedelta(minutes=1)
+    # Ten instructions per account paying the next one; every 25th asks for more than it holds
+    for start in range(0, size, 5000):
+        StandingInstruction.objects.bulk_create([
+            StandingInstruction(account_id=accounts[n % len(accounts)], to_account_id=accounts[(n + 1) % len(accounts)],
+                                amount=Decimal('5000.00') if n % 25 == 0 else Decimal('1.00'),
+                                frequency='Monthly', starts_at=due, scheduled_for=due, next_run_at=due)
+            for n in range(start, min(start + 5000, size))
+        ], batch_size=5000)
+    instructions = StandingInstruction.objects.filter(account_id__in=accounts)
+
+    def one_instruction(instruction):
+        # What a request per instruction does: a ledger transfer, then the schedule update
+        source, target = Account.objects.only('id', 'account_number').in_bulk(
+            [instruction.account_id, instruction.to_account_id]).values()
+        try:
+            debit, _ = ledger.transfer(source, target, instruction.amount, 'Standing instruction')
+            instruction.last_transaction_id = debit.transaction_id
+        except ledger.InsufficientBalance:
+            instruction.attempts += 1
+        instruction.scheduled_for = instruction.next_run_at = standing.next_occurrence(
+            instruction.frequency, instruction.starts_at, instruction.scheduled_for)
+        instruction.save(update_fields=standing.UPDATED_FIELDS)
+
+    sample = list(instructions.order_by('id')[:min(size, 200)])
+    # Limits would stop the sample's repeated debits; the executor is not subject to them
+    with override_settings(VELOCITY_LIMITS={}):
+        start = time.perf_counter()
+        for instruction in sample:
+            one_instruction(instruction)
+        per_row = (time.perf_counter() - start) / len(sample)
+    instructions.filter(id__in=[instruction.id for instruction in sample]).update(
+        scheduled_for=due, next_run_at=due, attempts=0)
+
+    start = time.perf_counter()
+    result = standing.run_due()
+    elapsed = time.perf_counter() - start
+    return {
+        'instructions': size,
+        'per_row_ms_per_instruction': round(per_row * 1000, 3),
+        'per_row_projected_seconds': round(per_row * size, 1),
+        'executor_seconds': round(elapsed, 2),
+        'executor_instructions_per_second': round(result['picked'] / elapsed, 1),
+        'posted': result['posted'],
+        'retried': result['retried'],
+        'still_due': instructions.filter(next_run_at__lte=due).count(),
+    }
+
+
+@scenario('outbox')
+def outbox_relay(options):
+    """Deposit latency with and without the outbox, and relay throughput for --size events per sink"""
+    iterations = options['iterations']
+    size = options['size']
+    amount = Decimal('1.00')
+    account = make_account()
+
+    results = {}
+    for mode, on in (('without_outbox', False), ('with_outbox', True)):
+        with override_settings(OUTBOX_ENABLED=on):
+            ledger.deposit(account.id, amount)
+            latencies = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                ledger.deposit(account.id, amount)
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results[f'{mode}_p50_ms'] = round(percentile(latencies, 0.50) * 1000, 3)
+        results[f'{mode}_p99_ms'] = round(percentile(latencies, 0.99) * 1000, 3)
+    results['added_p50_ms'] = round(results['with_outbox_p50_ms'] - results['without_outbox_p50_ms'], 3)
+
+    # Events as a batch posting writes them, for legs that need not exist
+    first = None
+    posted_at = timezone.now()
+    for start in range(0, size, 5000):
+        legs = [Transaction(transaction_id=new_transaction_id(), account_id=account.id, transaction_type='Deposit',
+                            amount=amount, signed_amount=amount, balance_after_transaction=amount,
+                            description='Benchmark', created_at=posted_at)
+                for _ in range(min(5000, size - start))]
+        outbox.record(*legs)
+        if first is None:
+            first = OutboxEvent.objects.filter(transaction_id=legs[0].transaction_id).values_list('id', flat=True)[0]
+
+    with tempfile.TemporaryDirectory() as directory:
+        sinks = {
+            'jsonl': outbox.JsonlSink(os.path.join(directory, 'outbox.jsonl')),
+            'local_broker': outbox.make_sink('local'),
+        }
+        for name, sink in sinks.items():
+            consumer = f'{BENCH_PREFIX}{name}'
+            outbox.replay(consumer, first)
+            start = time.perf_counter()
+            published = outbox.relay(sink, consumer)
+            elapsed = time.perf_counter() - start
+            sink.close()
+            results[f'{name}_events'] = published
+            results[f'{name}_events_per_second'] = round(published / elapsed, 1)
+    return results
@@ -0,0 +1,195 @@
+"""
+End-to-end benchmark suite run by ``manage.py benchmark_suite``.
+
+For each data size the suite seeds a fresh synthetic bank (see
+accounts/seeding.py), then times every route in accounts/urls.py through
+the test client and the core posting paths (ledger deposit, withdrawal and
+transfer, and a batch through ``post_batch()``). A route without a case in
+``VIEW_CASES`` fails the run, so new views cannot slip past it.
+
+Results are plain dicts, written as JSON; ``compare()`` checks a run
+against an earlier one and lists the cases whose median slowed down by more
+than a tolerance.
+"""
+import statistics
+import time
+from decimal import Decimal
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .models import Account, Customer
+from .benchmarks import BENCH_PREFIX, require_benchmark_database
+from . import ingest, ledger, seeding, urls
+
+
+# Route name -> [(method, who, data)]; who is 'anonymous', 'customer',
+# 'staff' or 'fresh' (a customer logged in anew for every request)
+VIEW_CASES = {
+    'home': [('get', 'anonymous', None)],
+    'register': [('get', 'anonymous', None)],
+    'login': [('get', 'anonymous', None)],
+    'logout': [('post', 'fresh', None)],
+    'dashboard': [('get', 'customer', None)],
+    'deposit': [('get', 'customer', None), ('post', 'customer', {'amount': '10.00'})],
+    'withdraw': [('get', 'customer', None), ('post', 'customer', {'amount': '1.00'})],
+    'transfer': [('get', 'customer', None), ('post', 'customer', 'transfer')],
+    'transaction_history': [('get', 'customer', None)],
+    'export_transactions': [('get', 'customer', {'format': 'csv'})],
+    'profile': [('get', 'customer', None)],
+    'admin_dashboard': [('get', 'staff', None)],
+    'manage_customers': [('get', 'staff', None)],
+    'approve_customer': [('post', 'staff', None)],
+    'deactivate_customer': [('post', 'staff', None)],
+    'activate_customer': [('post', 'staff', None)],
+    'all_transactions': [('get', 'staff', None)],
+    'reports': [('get', 'staff', None)],
+    'db_pool_stats': [('get', 'staff', None)],
+    'metrics': [('get', 'staff', None)],
+}
+# Medians below this many milliseconds apart are noise, whatever the ratio
+MIN_REGRESSION_MS = 0.5
+
+
+def summarize(timings, queries=None):
+    timings = sorted(timings)
+    result = {
+        'runs': len(timings),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+    }
+    if queries is not None:
+        result['queries'] = queries
+    return result
+
+
+def check_coverage():
+    """Raise if a route in accounts/urls.py has no benchmark case"""
+    missing = sorted({pattern.name for pattern in urls.urlpatterns} - set(VIEW_CASES))
+    if missing:
+        raise ValueError(f'No benchmark case for: {", ".join(missing)}')
+
+
+def _fixtures():
+    """Pick the busiest seeded account, a transfer target and a staff user"""
+    accounts = Account.objects.filter(customer__user__username__startswith=BENCH_PREFIX,
+                                      customer__is_approved=True, is_active=True)
+    busiest = accounts.annotate(legs=Count('transactions')).order_by('-legs').select_related('customer__user')[0]
+    # Enough money for every posting case, whatever the seeded balance
+    ledger.deposit(busiest.id, Decimal('1000000.00'), 'Benchmark float')
+    target = accounts.exclude(id=busiest.id).first()
+    staff = User.objects.create(username=f'{BENCH_PREFIX}staff', is_staff=True)
+    return busiest, target, staff
+
+
+def time_views(iterations):
+    """Time every route; returns {'<route> <METHOD>': summary}"""
+    account, target, staff = _fixtures()
+    customer_user = account.customer.user
+    clients = {'anonymous': Client(), 'customer': Client(), 'staff': Client()}
+    clients['customer'].force_login(customer_user)
+    clients['staff'].force_login(staff)
+    other = Customer.objects.filter(user__username__startswith=BENCH_PREFIX).exclude(id=account.customer_id).first()
+
+    results = {}
+    for name, cases in VIEW_CASES.items():
+        kwargs = {'customer_id': other.id} if name.endswith('_customer') else {}
+        url = reverse(name, kwargs=kwargs)
+        for method, who, data in cases:
+            if data == 'transfer':
+                data = {'to_account_number': target.account_number, 'amount': '1.00'}
+            timings = []
+            for i in range(iterations + 1):
+                if who == 'fresh':
+                    client = Client()
+                    client.force_login(customer_user)
+                else:
+                    client = clients[who]
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(url, data or {})
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - start
+                if response.status_code not in (200, 302):
+                    raise AssertionError(f'{method.upper()} {url} returned {response.status_code}')
+                # The first request warms caches and is not counted
+                if i:
+                    timings.append(elapsed)
+            results[f'{name} {method.upper()}'] = summarize(timings, len(captured))
+    return results
+
+
+def time_postings(iterations):
+    """Time the ledger posting paths; returns {path: summary}"""
+    accounts = list(Account.objects.filter(customer__user__username__startswith=BENCH_PREFIX)[:2])
+    source, target = accounts
+    ledger.deposit(source.id, Decimal('1000000.00'), 'Benchmark float')
+    records = [(n, {'account_number': target.account_number, 'transaction_type': 'Deposit', 'amount': '1.00'})
+               for n in range(100)]
+    paths = {
+        'ledger.deposit': lambda: ledger.deposit(source.id, Decimal('1.00')),
+        'ledger.withdraw': lambda: ledger.withdraw(source.id, Decimal('1.00')),
+        'ledger.transfer': lambda: ledger.transfer(source, target, Decimal('1.00')),
+        'ingest.post_batch (100 records)': lambda: ingest.post_batch(records),
+    }
+    results = {}
+    for name, post in paths.items():
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            post()
+            timings.append(time.perf_counter() - start)
+        results[name] = summarize(timings)
+    return results
+
+
+def run_suite(sizes, customers, iterations, random_seed=1):
+    """Seed each data size in turn and time views and postings against it"""
+    require_benchmark_database()
+    check_coverage()
+    results = {
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'django': django.get_version(),
+        'customers': customers,
+        'iterations': iterations,
+        'sizes': {},
+    }
+    try:
+        for size in sizes:
+            seeding.clear(BENCH_PREFIX)
+            start = time.perf_counter()
+            counts = seeding.seed(customers, size, prefix=BENCH_PREFIX, random_seed=random_seed)
+            results['sizes'][str(size)] = {
+                'seed_seconds': round(time.perf_counter() - start, 2),
+                'ledger_entries': counts['transactions'],
+                'views': time_views(iterations),
+                'postings': time_postings(iterations),
+            }
+    finally:
+        seeding.clear(BENCH_PREFIX)
+    return results
+
+
+def compare(baseline, current, tolerance=0.25):
+    """Return [(size, case, baseline median, current median)] for cases that slowed down"""
+    regressions = []
+    for size, sections in current['sizes'].items():
+        before = baseline.get('sizes', {}).get(size)
+        if before is None:
+            continue
+        for section in ('views', 'postings'):
+            for case, result in sections[section].items():
+                old = before.get(section, {}).get(case)
+                if old is None:
+                    continue
+                new_ms, old_ms = result['median_ms'], old['median_ms']
+                if new_ms > old_ms * (1 + tolerance) and new_ms - old_ms > MIN_REGRESSION_MS:
+                    regressions.append((size, case, old_ms, new_ms))
+    return regressions
@@ -0,0 +1,245 @@
+"""
+Database connection pooling.
+
+Django opens a connection on a thread's first query and, with
+``CONN_MAX_AGE = 0``, closes it when the request finishes, so every request
+pays for a TCP connect and a MySQL handshake. Persistent connections
+(``CONN_MAX_AGE > 0``) avoid that under WSGI, but under ASGI requests run on
+whichever thread is free and idle connections pile up one per thread.
+
+The pooled backend (``ENGINE = 'accounts.backends.mysql'``) keeps Django's
+per-request lifecycle but hands the raw connection back to a per-process
+pool on close() and takes one from it on connect(), which works the same
+under WSGI and ASGI. Each alias with a ``POOL`` dict in ``DATABASES`` gets
+its own pool:
+
+- ``MAX_SIZE``: connections the pool may have open, in use or idle
+- ``TIMEOUT``: seconds a checkout waits for a free connection before
+  raising PoolExhausted
+- ``MAX_LIFETIME``: seconds after which a connection is closed instead of
+  being reused
+- ``HEALTH_CHECK``: ping an idle connection on checkout and replace it if
+  the server dropped it
+
+A missing or empty ``POOL`` turns pooling off for that alias. ``stats()``
+returns the pool counters (checkouts, waits, reconnects, ...) of the
+current worker process.
+"""
+import collections
+import os
+import threading
+import time
+from django.db import DatabaseError
+
+
+class PoolExhausted(DatabaseError):
+    """No connection became free within the pool's TIMEOUT"""
+
+
+class ConnectionPool:
+    """Bounded pool of raw DB-API connections for one database alias"""
+
+    def __init__(self, max_size=10, timeout=10, max_lifetime=30 * 60, health_check=True):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check = health_check
+        self._cond = threading.Condition()
+        # Most recently returned last: reusing it keeps a small hot set and
+        # lets surplus connections age out
+        self._idle = collections.deque()
+        self._born = {}
+        self._size = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.reconnects = 0
+        self.expired = 0
+        self.discarded = 0
+
+    def _expired(self, born):
+        return self.max_lifetime is not None and time.monotonic() - born >= self.max_lifetime
+
+    def _count(self, counter):
+        with self._cond:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def checkout(self, connect, ping):
+        """
+        Return an idle connection or a new one from connect(). ping(conn)
+        returns False for a connection the server has dropped.
+        """
+        started = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, born = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = born = None
+                    break
+                if started is None:
+                    started = time.monotonic()
+                    self.waits += 1
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolExhausted(f'No database connection free after {self.timeout}s '
+                                        f'({self.max_size} in use)')
+                self._cond.wait(remaining)
+            self.checkouts += 1
+            if started is not None:
+                self.wait_seconds += time.monotonic() - started
+
+        # Checks and connects happen outside the lock; the slot is already ours
+        if conn is not None and self._expired(born):
+            self._close(conn)
+            self._count('expired')
+            conn = None
+        elif conn is not None and self.health_check and not ping(conn):
+            self._close(conn)
+            self._count('reconnects')
+            conn = None
+        if conn is None:
+            try:
+                conn = connect()
+            except BaseException:
+                self._release_slot()
+                raise
+            born = time.monotonic()
+            self._count('created')
+        self._born[id(conn)] = born
+        return conn
+
+    def checkin(self, conn, reusable=True):
+        """Return a connection to the pool, or close it if it cannot be reused"""
+        born = self._born.pop(id(conn), None)
+        if born is None:
+            # Not checked out from this pool (e.g. opened before a fork)
+            self._close(conn)
+            return
+        if not reusable or self._expired(born):
+            self._close(conn)
+            self._count('expired' if reusable else 'discarded')
+            self._release_slot()
+            return
+        with self._cond:
+            self._idle.append((conn, born))
+            self._cond.notify()
+
+    def close_idle(self):
+        """Close every idle connection; returns how many were closed"""
+        with self._cond:
+            idle, self._idle = list(self._idle), collections.deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+        return len(idle)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            size = self._size
+        return {
+            'max_size': self.max_size,
+            'open': size,
+            'in_use': size - idle,
+            'idle': idle,
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'wait_ms': round(self.wait_seconds * 1000, 1),
+            'timeouts': self.timeouts,
+            'created': self.created,
+            'reconnects': self.reconnects,
+            'expired': self.expired,
+            'discarded': self.discarded,
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = None
+
+
+def get_pool(alias, options):
+    """Return the current process's pool for a database alias"""
+    global _pools, _pools_pid
+    pool = _pools.get(alias)
+    if pool is not None and _pools_pid == os.getpid():
+        return pool
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Connections inherited across fork() belong to the parent
+            _pools, _pools_pid = {}, os.getpid()
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                max_lifetime=options.get('MAX_LIFETIME', 30 * 60),
+                health_check=options.get('HEALTH_CHECK', True),
+            )
+        return _pools[alias]
+
+
+def stats():
+    """Pool counters of this worker process, per alias"""
+    pools = _pools if _pools_pid == os.getpid() else {}
+    return {'pid': os.getpid(), 'pools': {alias: pool.stats() for alias, pool in pools.items()}}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    DatabaseWrapper mixin that takes connections from, and returns them to,
+    the alias's ConnectionPool when its settings have a POOL.
+    """
+
+    def _pool(self):
+        options = self.settings_dict.get('POOL')
+        return get_pool(self.alias, options) if options else None
+
+    def ping_connection(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.checkout(lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+                             self.ping_connection)
+
+    def _close(self):
+        pool = self._pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Only a connection back in its configured autocommit state, outside
+        # any transaction, is safe to hand to the next request
+        reusable = (
+            not self.in_atomic_block
+            and self.autocommit == self.settings_dict['AUTOCOMMIT']
+            and not (self.errors_occurred and not self.is_usable())
+        )
+        pool.checkin(self.connection, reusable)
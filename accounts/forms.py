@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Customer, Account, Transaction
+from .idempotency import new_key
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
@@ -70,7 +71,17 @@ class UserRegistrationForm(UserCreationForm):
         self.fields['password2'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Confirm Password'})
 
 
-class DepositForm(forms.Form):
+class IdempotentForm(forms.Form):
+    """Posting form carrying a per-render idempotency key, so resubmits post once"""
+    idempotency_key = forms.CharField(
+        required=False,
+        max_length=64,
+        initial=new_key,
+        widget=forms.HiddenInput()
+    )
+
+
+class DepositForm(IdempotentForm):
     """Form for deposit transactions"""
     amount = forms.DecimalField(
         max_digits=12,
@@ -94,7 +105,7 @@ class DepositForm(forms.Form):
     )
 
 
-class WithdrawForm(forms.Form):
+class WithdrawForm(IdempotentForm):
     """Form for withdrawal transactions"""
     amount = forms.DecimalField(
         max_digits=12,
@@ -118,7 +129,7 @@ class WithdrawForm(forms.Form):
     )
 
 
-class TransferForm(forms.Form):
+class TransferForm(IdempotentForm):
     """Form for transfer transactions"""
     to_account_number = forms.CharField(
         max_length=20,
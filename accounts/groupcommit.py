@@ -0,0 +1,287 @@
+"""
+Group commit for deposits and withdrawals.
+
+With ``settings.GROUP_COMMIT`` on, single-account postings are not committed
+by the request that makes them. They are queued to a committer thread that
+gathers everything arriving within ``GROUP_COMMIT_WINDOW_MS`` (up to
+``GROUP_COMMIT_MAX_BATCH`` postings) and commits the lot in one database
+transaction: one locking read of the touched accounts, one net-delta UPDATE
+per account, one rollup update per summary row and a bulk INSERT of the
+Transaction rows. Each caller waits for its own result, which carries its
+own transaction id and resulting balance, or for its own
+InsufficientBalance/AccountNotFound/VelocityLimitExceeded. Under bursty load this replaces many
+tiny commits (and their log flushes) with a few larger ones. A posting
+queued by an idempotent request has its key marked done in the batch's
+transaction, as ``ledger`` does for a posting of its own.
+
+Transfers keep their per-request transaction. The queue lives in each
+process, so batching happens per worker process. Rows returned from a group
+commit have no primary key on backends where bulk_create() cannot return
+one (MySQL); ``transaction_id`` and ``balance_after_transaction`` are set.
+
+An error outside a batch's transaction fails that batch's postings and the
+thread carries on. A caller whose posting is still queued after
+``GROUP_COMMIT_TIMEOUT`` seconds takes it back and posts it directly, and
+the committer is then marked dead: from then on, and if its thread ever
+stops, the process posts directly as if ``GROUP_COMMIT`` were off.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from decimal import Decimal
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .models import Account, Transaction
+from .ids import new_transaction_id
+from . import idempotency, ledger, outbox, pagecache, rollups, velocity
+
+
+logger = logging.getLogger(__name__)
+
+
+class CommitterStopped(Exception):
+    """The committer stopped before taking a posting; the posting was not applied"""
+
+
+class _Posting:
+    __slots__ = ('account_id', 'transaction_type', 'amount', 'description', 'claim', 'future')
+
+    def __init__(self, account_id, transaction_type, amount, description):
+        self.account_id = account_id
+        self.transaction_type = transaction_type
+        self.amount = amount
+        self.description = description
+        # The caller's idempotency key, marked done in the batch's transaction
+        self.claim = idempotency.current_claim()
+        self.future = Future()
+
+
+class GroupCommitter:
+    """Queue of pending deposits/withdrawals drained by one committer thread"""
+
+    def __init__(self, window_ms=2, max_batch=500, timeout=30):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.dead = False
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.postings = 0
+
+    def enqueue(self, account_id, transaction_type, amount, description):
+        """Queue a posting and return a Future for its Transaction"""
+        if transaction_type not in ('Deposit', 'Withdraw'):
+            raise ValueError(f'Cannot group-commit {transaction_type!r} postings')
+        posting = _Posting(account_id, transaction_type, amount, description)
+        self._ensure_thread()
+        if self.dead:
+            posting.future.set_exception(CommitterStopped('Group committer is not running'))
+        else:
+            self._queue.put(posting)
+        return posting.future
+
+    def submit(self, account_id, transaction_type, amount, description):
+        """Queue a posting and wait for its Transaction; posts directly if the committer is dead or stuck"""
+        future = self.enqueue(account_id, transaction_type, amount, description)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            if not self.abandon(future):
+                # Its batch is committing; the database bounds how long that takes
+                return future.result()
+        except CommitterStopped:
+            pass
+        return direct(transaction_type)(account_id, amount, description)
+
+    def abandon(self, future):
+        """
+        Take back a posting that timed out and mark the committer dead.
+        Returns False if its batch has already started, in which case the
+        caller must keep waiting for the outcome.
+        """
+        if not future.cancel():
+            return False
+        if not self.dead:
+            self.dead = True
+            logger.error('Group committer has not taken a posting for %ss; posting directly from now on',
+                         self.timeout)
+        return True
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        if self._pid == os.getpid() and (self.dead or self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Postings queued before a fork belong to the parent
+                self._queue = queue.SimpleQueue()
+                self.dead = False
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            elif not self._thread.is_alive():
+                self.dead = True
+
+    def _run(self):
+        batch = []
+        try:
+            while not self.dead:
+                batch = []
+                try:
+                    batch.append(self._queue.get())
+                    deadline = time.monotonic() + self.window
+                    while len(batch) < self.max_batch:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            batch.append(self._queue.get(timeout=remaining))
+                        except queue.Empty:
+                            break
+                    close_old_connections()
+                    self.commit(batch)
+                except Exception as exc:
+                    logger.exception('Group commit batch failed')
+                    for posting in batch:
+                        if not posting.future.done():
+                            posting.future.set_exception(exc)
+        finally:
+            # Whatever stopped the thread, nobody will take what is queued
+            self.dead = True
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for posting in batch:
+                if posting.future.running():
+                    # Stopped inside commit(); the posting may or may not have been applied
+                    posting.future.set_exception(RuntimeError('Group committer stopped during the batch'))
+                elif not posting.future.done():
+                    posting.future.set_exception(CommitterStopped('Group committer stopped'))
+
+    def commit(self, batch):
+        """Commit a batch of postings in one transaction and resolve their futures"""
+        # Postings whose callers gave up waiting have been cancelled; the rest can no longer be
+        batch = [posting for posting in batch if posting.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = []
+        undos = []
+        try:
+            with transaction.atomic():
+                accounts = {
+                    account.id: account
+                    for account in Account.objects.select_for_update()
+                    .filter(id__in={posting.account_id for posting in batch})
+                    .order_by('id')
+                    .only('id', 'balance', 'account_type')
+                }
+                balances = {account_id: account.balance for account_id, account in accounts.items()}
+                deltas = {}
+                totals = {}
+                rows = []
+                for posting in batch:
+                    account = accounts.get(posting.account_id)
+                    if account is None:
+                        results.append((posting, ledger.AccountNotFound('Account not found.')))
+                        continue
+                    delta = posting.amount if posting.transaction_type == 'Deposit' else -posting.amount
+                    if balances[account.id] + delta < 0:
+                        results.append((posting, ledger.InsufficientBalance('Insufficient balance!')))
+                        continue
+                    if delta < 0:
+                        breach, undo = velocity.reserve(account.id, account.account_type, posting.amount)
+                        if breach:
+                            results.append((posting, ledger.VelocityLimitExceeded(breach)))
+                            continue
+                        undos.append(undo)
+                    if posting.claim is not None and not idempotency.mark_posted(posting.claim):
+                        if delta < 0:
+                            undos.pop()()
+                        results.append((posting, idempotency.ClaimLost(
+                            'Idempotency key was taken over by another request')))
+                        continue
+                    balances[account.id] += delta
+                    deltas[account.id] = deltas.get(account.id, Decimal('0.00')) + delta
+                    key = (account.id, account.account_type, posting.transaction_type)
+                    total, count = totals.get(key, (Decimal('0.00'), 0))
+                    totals[key] = (total + posting.amount, count + 1)
+                    row = Transaction(
+                        transaction_id=new_transaction_id(),
+                        account_id=account.id,
+                        transaction_type=posting.transaction_type,
+                        amount=posting.amount,
+                        balance_after_transaction=balances[account.id],
+                        signed_amount=delta,
+                        description=posting.description,
+                    )
+                    rows.append(row)
+                    results.append((posting, row))
+
+                ledger.apply_deltas(deltas)
+                rollups.record_many(totals)
+                pagecache.bump_on_commit(*deltas)
+                Transaction.objects.bulk_create(rows, batch_size=1000)
+                outbox.record(*rows)
+        except Exception as exc:
+            for undo in undos:
+                undo()
+            for posting in batch:
+                posting.future.set_exception(exc)
+            return
+
+        self.batches += 1
+        self.postings += len(batch)
+        for posting, outcome in results:
+            if isinstance(outcome, Exception):
+                posting.future.set_exception(outcome)
+            else:
+                posting.future.set_result(outcome)
+
+
+_committer = None
+_committer_lock = threading.Lock()
+
+
+def get_committer():
+    """Return the process-wide GroupCommitter, or None when GROUP_COMMIT is off"""
+    global _committer
+    if not getattr(settings, 'GROUP_COMMIT', False):
+        return None
+    if _committer is None:
+        with _committer_lock:
+            if _committer is None:
+                _committer = GroupCommitter(
+                    window_ms=getattr(settings, 'GROUP_COMMIT_WINDOW_MS', 2),
+                    max_batch=getattr(settings, 'GROUP_COMMIT_MAX_BATCH', 500),
+                    timeout=getattr(settings, 'GROUP_COMMIT_TIMEOUT', 30),
+                )
+    return _committer
+
+
+def direct(transaction_type):
+    """The ledger function that posts a transaction type on its own"""
+    return ledger.deposit if transaction_type == 'Deposit' else ledger.withdraw
+
+
+def deposit(account_id, amount, description='Deposit'):
+    """ledger.deposit(), through the group committer when GROUP_COMMIT is on"""
+    committer = get_committer()
+    if committer is None or committer.dead:
+        return ledger.deposit(account_id, amount, description)
+    return committer.submit(account_id, 'Deposit', amount, description)
+
+
+def withdraw(account_id, amount, description='Withdrawal'):
+    """ledger.withdraw(), through the group committer when GROUP_COMMIT is on"""
+    committer = get_committer()
+    if committer is None or committer.dead:
+        return ledger.withdraw(account_id, amount, description)
+    return committer.submit(account_id, 'Withdraw', amount, description)
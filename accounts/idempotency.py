@@ -0,0 +1,281 @@
+"""
+Idempotency keys for the posting views.
+
+A client sends an ``Idempotency-Key`` header (or the ``idempotency_key``
+form field the posting forms render) with a POST. The first request with a
+key claims it by inserting an IdempotencyKey row (unique on user and key).
+The ledger marks the claimed key as done inside the posting's own
+transaction (``record_posting()``), so the key and the ledger entries
+commit together. When the view then reports its success message through
+``posting_succeeded()`` and redirects, the row also stores the redirect and
+that message. Any outcome without a posting (form errors, a rejected
+posting, an unapproved account) releases the claim, so a retry runs the
+view again. A retry with the same key is answered from that row with one
+indexed lookup, without running the view or touching Account.
+
+Concurrent duplicates lose the insert race and poll the claim until the
+winner finishes, then replay its response. If the winner did not post,
+its claim is released and the waiter runs the view itself. A claim still
+pending after ``WAIT_TIMEOUT`` gets a 409. A claim pending for longer than
+``CLAIM_LEASE`` cannot have posted (the key would be done), so its owner
+died and a retry takes it over; should the old owner still post, its
+marking fails and its posting rolls back. Keys expire after
+``settings.IDEMPOTENCY_KEY_TTL`` seconds and are purged by
+``manage.py purge_idempotency_keys``.
+"""
+import asyncio
+import contextvars
+import functools
+import hashlib
+import time
+import uuid
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.shortcuts import resolve_url
+from django.utils import timezone
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+WAIT_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+# Seconds after which a pending claim is presumed abandoned; longer than any
+# posting takes, group commit's timeout included
+CLAIM_LEASE = 60
+# Replayed when the posting committed but its response was never stored
+ALREADY_POSTED = 'This request was already processed.'
+
+# The claim of the request being run, for record_posting()
+_claim = contextvars.ContextVar('idempotency_claim', default=None)
+
+
+class ClaimLost(Exception):
+    """Another request took over an abandoned-looking claim; this posting must not commit"""
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def request_key(request):
+    """Return the request's idempotency key, or None"""
+    key = request.headers.get(HEADER) or request.POST.get(FORM_FIELD)
+    return key.strip()[:MAX_KEY_LENGTH] if key and key.strip() else None
+
+
+def fingerprint(request):
+    """Hash of the path and posted fields, to detect a key reused for a different request"""
+    items = sorted(
+        (name, value) for name, values in request.POST.lists() for value in values
+        if name not in ('csrfmiddlewaretoken', FORM_FIELD)
+    )
+    return hashlib.sha256(repr((request.path, items)).encode()).hexdigest()
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def claim(user_id, key, request_hash):
+    """
+    Try to claim a key. Returns (record, claimed): the new pending record
+    and True, or the existing record and False.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user_id=user_id, key=key, request_hash=request_hash, expires_at=now + _ttl()
+            ), True
+    except IntegrityError:
+        pass
+    existing = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+    if existing is not None and existing.expires_at <= now:
+        # Expired but not yet purged: reuse the key
+        IdempotencyKey.objects.filter(pk=existing.pk, expires_at__lte=now).delete()
+        return claim(user_id, key, request_hash)
+    return existing, False
+
+
+def take_over(record):
+    """Claim a pending record whose lease ran out; returns True if this request now owns it"""
+    now = timezone.now()
+    if not IdempotencyKey.objects.filter(
+            pk=record.pk, status=IdempotencyKey.PENDING, claimed_at=record.claimed_at).update(claimed_at=now):
+        return False
+    record.claimed_at = now
+    return True
+
+
+def lookup(user_id, key):
+    return IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+
+
+def current_claim():
+    """The claimed record of the request being run, or None"""
+    return _claim.get()
+
+
+def mark_posted(record):
+    """Mark a claimed key done; call inside the posting's transaction. Returns False if the claim was lost"""
+    return bool(IdempotencyKey.objects.filter(
+        pk=record.pk, status=IdempotencyKey.PENDING, claimed_at=record.claimed_at
+    ).update(status=IdempotencyKey.DONE))
+
+
+def record_posting():
+    """Mark the current request's key done inside the posting's transaction; a no-op without one"""
+    record = _claim.get()
+    if record is not None and not mark_posted(record):
+        raise ClaimLost('Idempotency key was taken over by another request')
+
+
+def posting_succeeded(request, message):
+    """Flash a posting's success message and mark the request's response for replay"""
+    messages.success(request, message)
+    request.idempotent_message = message
+
+
+def complete(record, response, request):
+    """Store the redirect after a successful posting for replay, or release the claim"""
+    message = getattr(request, 'idempotent_message', None)
+    if message is None or response.status_code != 302:
+        release(record)
+        return
+    IdempotencyKey.objects.filter(pk=record.pk, claimed_at=record.claimed_at).update(
+        status=IdempotencyKey.DONE,
+        response_location=response['Location'],
+        message_level=messages.SUCCESS,
+        message=message,
+    )
+
+
+def release(record):
+    """Drop a claim that did not post; a key the ledger marked done is kept"""
+    IdempotencyKey.objects.filter(
+        pk=record.pk, status=IdempotencyKey.PENDING, claimed_at=record.claimed_at).delete()
+
+
+def replay(request, record):
+    """Rebuild the original response from a completed record"""
+    if record.message_level is not None:
+        messages.add_message(request, record.message_level, record.message)
+    elif not record.response_location:
+        messages.info(request, ALREADY_POSTED)
+    response = HttpResponseRedirect(record.response_location or resolve_url(settings.LOGIN_REDIRECT_URL))
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def mismatch():
+    return HttpResponse('Idempotency key reused with a different request.', status=422)
+
+
+def in_progress():
+    response = HttpResponse('A request with this idempotency key is still being processed.', status=409)
+    response['Retry-After'] = '1'
+    return response
+
+
+def _resolve(user_id, key, request_hash):
+    """
+    One step of the claim protocol. Returns ('run', record), ('replay',
+    record), ('mismatch', None) or ('wait', None).
+    """
+    # Fast path for retries: a single indexed read
+    record = lookup(user_id, key)
+    if record is None or record.expires_at <= timezone.now():
+        record, claimed = claim(user_id, key, request_hash)
+        if claimed:
+            return 'run', record
+        if record is None:
+            # Released between our insert and lookup; try again
+            return 'wait', None
+    if record.request_hash != request_hash:
+        return 'mismatch', None
+    if record.status == IdempotencyKey.DONE:
+        return 'replay', record
+    if record.claimed_at <= timezone.now() - timedelta(seconds=CLAIM_LEASE) and take_over(record):
+        return 'run', record
+    return 'wait', None
+
+
+def idempotent(view):
+    """Deduplicate POSTs to a posting view that carry an idempotency key"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request_key(request) if request.method == 'POST' else None
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        request_hash = fingerprint(request)
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while True:
+            action, record = _resolve(request.user.pk, key, request_hash)
+            if action == 'run':
+                break
+            if action == 'replay':
+                return replay(request, record)
+            if action == 'mismatch':
+                return mismatch()
+            if time.monotonic() >= deadline:
+                return in_progress()
+            time.sleep(POLL_INTERVAL)
+
+        token = _claim.set(record)
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            release(record)
+            raise
+        finally:
+            _claim.reset(token)
+        complete(record, response, request)
+        return response
+    return wrapper
+
+
+def async_idempotent(view):
+    """idempotent() for async views; polling waits without holding a thread"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        key = request_key(request) if request.method == 'POST' else None
+        if key is None:
+            return await view(request, *args, **kwargs)
+
+        request_hash = fingerprint(request)
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while True:
+            action, record = await sync_to_async(_resolve)(request.user.pk, key, request_hash)
+            if action == 'run':
+                break
+            if action == 'replay':
+                return replay(request, record)
+            if action == 'mismatch':
+                return mismatch()
+            if time.monotonic() >= deadline:
+                return in_progress()
+            await asyncio.sleep(POLL_INTERVAL)
+
+        token = _claim.set(record)
+        try:
+            response = await view(request, *args, **kwargs)
+        except BaseException:
+            await sync_to_async(release)(record)
+            raise
+        finally:
+            _claim.reset(token)
+        await sync_to_async(complete)(record, response, request)
+        return response
+    return wrapper
+
+
+def purge_expired():
+    """Delete expired keys; returns the number removed"""
+    return IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()[0]
@@ -0,0 +1,147 @@
+"""
+Query-free identifier generation for accounts and transactions.
+
+The default generator is Snowflake-style: a 63-bit integer made of a
+millisecond timestamp, a 10-bit node id and a 12-bit per-millisecond
+sequence. Ids are unique as long as no two live processes share a node id,
+and they increase with time so new rows land at the end of the index.
+
+The node id is the host number ``ID_NODE`` in its top ``ID_HOST_BITS``
+bits and a per-host process slot in the rest. A process claims the first
+free slot by taking an exclusive ``flock`` on a file in ``ID_SLOT_DIR``;
+the lock is held for the life of the process and released by the kernel
+when it exits, however it exits, so every worker on a host (gunicorn, ASGI,
+commands) gets its own slot. A host number that does not fit, or a host
+with every slot taken, raises ImproperlyConfigured instead of risking
+duplicates. Another generator can be plugged in through ``ID_GENERATOR``.
+"""
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+# 2024-01-01T00:00:00Z in milliseconds
+EPOCH_MS = 1704067200000
+
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+BASE36 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# 2**63 needs 13 base-36 digits, 19 decimal digits
+TRANSACTION_ID_WIDTH = 13
+ACCOUNT_NUMBER_WIDTH = 19
+
+
+def claim_slot(directory, slots):
+    """
+    Lock the first free slot file in `directory`; returns (slot, open file).
+    The slot stays ours until the file is closed or the process exits.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for slot in range(slots):
+        handle = open(os.path.join(directory, f'slot-{slot}.lock'), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        return slot, handle
+    raise ImproperlyConfigured(
+        f'All {slots} id slots in {directory} are taken; raise NODE_BITS - ID_HOST_BITS or run fewer processes.')
+
+
+class SnowflakeIdGenerator:
+    """Thread-safe time-ordered 63-bit id generator"""
+
+    def __init__(self, node=None):
+        # An explicit node is the caller's responsibility (tests, one-off scripts)
+        self._configured_node = node
+        self._slot_file = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        if self._slot_file is not None:
+            # Inherited across fork(): the parent still holds that slot
+            self._slot_file.close()
+            self._slot_file = None
+        node = self._configured_node
+        if node is None:
+            node = self._claim_node()
+        if not 0 <= int(node) <= MAX_NODE:
+            raise ImproperlyConfigured(f'Id node {node} does not fit in {NODE_BITS} bits.')
+        self.node = int(node)
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _claim_node(self):
+        host_bits = getattr(settings, 'ID_HOST_BITS', 4)
+        slot_bits = NODE_BITS - host_bits
+        host = getattr(settings, 'ID_NODE', None) or 0
+        if not 0 <= host < 1 << host_bits:
+            raise ImproperlyConfigured(f'ID_NODE must be between 0 and {(1 << host_bits) - 1} '
+                                       f'with ID_HOST_BITS = {host_bits}.')
+        directory = getattr(settings, 'ID_SLOT_DIR', None) or os.path.join(tempfile.gettempdir(), 'bank-id-slots')
+        slot, self._slot_file = claim_slot(directory, 1 << slot_bits)
+        return host << slot_bits | slot
+
+    def next_id(self):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked after the generator was built (e.g. gunicorn --preload)
+                self._reset()
+            now = int(time.time() * 1000) - EPOCH_MS
+            if now < self._last_ms:
+                # Clock stepped backwards: keep issuing ids from the last tick
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    while now <= self._last_ms:
+                        now = int(time.time() * 1000) - EPOCH_MS
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (NODE_BITS + SEQUENCE_BITS)) | (self.node << SEQUENCE_BITS) | self._sequence
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_id_generator():
+    """Return the process-wide generator named by settings.ID_GENERATOR"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                path = getattr(settings, 'ID_GENERATOR', 'accounts.ids.SnowflakeIdGenerator')
+                _generator = import_string(path)()
+    return _generator
+
+
+def to_base36(number, width):
+    """Encode a non-negative integer as fixed-width upper-case base 36"""
+    digits = []
+    while number:
+        number, remainder = divmod(number, 36)
+        digits.append(BASE36[remainder])
+    return ''.join(reversed(digits)).rjust(width, '0')
+
+
+def new_transaction_id():
+    """Return a new transaction id such as TXN0F3K9Q2A7B001"""
+    return 'TXN' + to_base36(get_id_generator().next_id(), TRANSACTION_ID_WIDTH)
+
+
+def new_account_number():
+    """Return a new all-digit account number"""
+    return str(get_id_generator().next_id()).zfill(ACCOUNT_NUMBER_WIDTH)
@@ -0,0 +1,182 @@
+"""
+Bulk posting of batch files (salary credits, standing orders, ...).
+
+Records are streamed from CSV or JSON Lines, validated a chunk at a time and
+applied per chunk with one locking read of the touched accounts, a few
+``CASE``-based UPDATEs for the per-account net deltas and a ``bulk_create``
+of the Transaction rows. Lines that fail validation or would overdraw an
+account are rejected individually; the rest of the chunk still posts.
+
+Record fields: ``account_number``, ``transaction_type`` (Deposit, Withdraw
+or Transfer), ``amount``, ``to_account_number`` (transfers only) and an
+optional ``description``.
+"""
+import csv
+import json
+from decimal import Decimal
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .models import Account, Transaction
+from .ids import new_transaction_id
+from .forms import DepositForm
+from . import ledger, outbox, pagecache, rollups
+
+
+DEFAULT_CHUNK_SIZE = 5000
+# Amounts follow the deposit form's rules (at least 0.01, at most two
+# decimal places and 12 digits), so nothing is rounded or overflows a column
+AMOUNT_FIELD = DepositForm.base_fields['amount']
+MAX_BALANCE = Decimal('9999999999.99')
+
+
+class BatchResult:
+    """Outcome of a post_batch() run"""
+
+    def __init__(self):
+        self.posted = 0
+        self.rejected = []
+
+    def reject(self, line_no, reason):
+        self.rejected.append((line_no, reason))
+
+
+def read_records(fileobj, fmt='csv'):
+    """Yield (line_no, record) pairs from a CSV (with header) or JSON Lines file"""
+    if fmt == 'csv':
+        for line_no, row in enumerate(csv.DictReader(fileobj), start=2):
+            yield line_no, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(fileobj, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError:
+                yield line_no, None
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _parse(record):
+    """Return (account_number, type, amount, to_account_number, description) or raise ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError('Malformed line')
+    account_number = str(record.get('account_number') or '').strip()
+    transaction_type = str(record.get('transaction_type') or '').strip().capitalize()
+    to_account_number = str(record.get('to_account_number') or '').strip()
+    description = str(record.get('description') or transaction_type)
+    if not account_number:
+        raise ValueError('Missing account_number')
+    if transaction_type not in ('Deposit', 'Withdraw', 'Transfer'):
+        raise ValueError('Invalid transaction_type')
+    raw = record.get('amount')
+    try:
+        amount = AMOUNT_FIELD.clean(raw if raw is None else str(raw))
+    except ValidationError as exc:
+        raise ValueError(f'Invalid amount: {exc.messages[0]}')
+    amount = amount.quantize(Decimal('0.01'))
+    if transaction_type == 'Transfer':
+        if not to_account_number:
+            raise ValueError('Missing to_account_number')
+        if to_account_number == account_number:
+            raise ValueError('Cannot transfer to the same account')
+    return account_number, transaction_type, amount, to_account_number, description
+
+
+def _post_chunk(chunk, result):
+    parsed = []
+    numbers = set()
+    for line_no, record in chunk:
+        try:
+            row = _parse(record)
+        except ValueError as exc:
+            result.reject(line_no, str(exc))
+            continue
+        parsed.append((line_no, row))
+        numbers.add(row[0])
+        if row[3]:
+            numbers.add(row[3])
+    if not parsed:
+        return
+
+    with transaction.atomic():
+        accounts = {
+            account.account_number: account
+            for account in Account.objects.select_for_update()
+            .filter(account_number__in=numbers)
+            .order_by('id')
+            .only('id', 'account_number', 'account_type', 'balance', 'is_active')
+        }
+        balances = {account.id: account.balance for account in accounts.values()}
+        deltas = {}
+        totals = {}
+        rows = []
+
+        def post(account, transaction_type, amount, delta, description, to_account=None):
+            balances[account.id] += delta
+            deltas[account.id] = deltas.get(account.id, Decimal('0.00')) + delta
+            key = (account.id, account.account_type, transaction_type)
+            total, count = totals.get(key, (Decimal('0.00'), 0))
+            totals[key] = (total + amount, count + 1)
+            rows.append(Transaction(
+                transaction_id=new_transaction_id(),
+                account_id=account.id,
+                transaction_type=transaction_type,
+                amount=amount,
+                balance_after_transaction=balances[account.id],
+                signed_amount=delta,
+                description=description,
+                to_account_id=to_account.id if to_account else None,
+            ))
+
+        for line_no, (number, transaction_type, amount, to_number, description) in parsed:
+            account = accounts.get(number)
+            if account is None:
+                result.reject(line_no, 'Account not found')
+                continue
+            if transaction_type == 'Deposit':
+                if balances[account.id] + amount > MAX_BALANCE:
+                    result.reject(line_no, 'Balance would exceed the account limit')
+                    continue
+                post(account, 'Deposit', amount, amount, description)
+            elif balances[account.id] < amount:
+                result.reject(line_no, 'Insufficient balance')
+                continue
+            elif transaction_type == 'Withdraw':
+                post(account, 'Withdraw', amount, -amount, description)
+            else:
+                to_account = accounts.get(to_number)
+                if to_account is None or not to_account.is_active:
+                    result.reject(line_no, 'Recipient account not found or inactive')
+                    continue
+                if balances[to_account.id] + amount > MAX_BALANCE:
+                    result.reject(line_no, "Recipient's balance would exceed the account limit")
+                    continue
+                post(account, 'Transfer', amount, -amount,
+                     f'Transfer to {to_number} - {description}', to_account)
+                post(to_account, 'Transfer', amount, amount,
+                     f'Transfer from {number} - {description}', account)
+            result.posted += 1
+
+        ledger.apply_deltas(deltas)
+        rollups.record_many(totals)
+        pagecache.bump_on_commit(*deltas)
+        Transaction.objects.bulk_create(rows, batch_size=1000)
+        outbox.record(*rows)
+
+
+def post_batch(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Post an iterable of (line_no, record) pairs, as produced by read_records().
+
+    Each chunk commits independently, so a failure part-way through leaves
+    earlier chunks posted. Returns a BatchResult.
+    """
+    result = BatchResult()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return result
+        _post_chunk(chunk, result)
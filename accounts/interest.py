@@ -0,0 +1,228 @@
+"""
+Interest accrual for Saving accounts (``manage.py accrue_interest``).
+
+Interest for a period is ``SAVINGS_INTEREST_RATE / INTEREST_DAY_COUNT``
+times the sum of the account's end-of-day balances over the period, rounded
+down to the paisa. A period runs from the day after the account's previous
+accrual (or the day it opened) to the accrual date, so running monthly
+credits monthly interest and a missed run is caught up by the next one.
+
+End-of-day balances come from ``balance_after_transaction``: the balance
+going into the period is that of the last leg before it, and each leg in
+the period sets the balance from its day on. Between legs the balance is
+constant, so an account costs one step per leg rather than one per day, and
+sums are kept in integer paise-days instead of Decimals.
+
+Accounts are processed in chunks of ``INTEREST_CHUNK_SIZE`` by a pool of
+worker processes, as ``reconcile`` does, each with its own database
+connection. The per-leg arithmetic is plain Python, so threads would share
+one core; processes spread the chunks over all of them. A chunk reads its
+accounts' periods, opening balances and legs in a handful of set-based
+queries (hot and archived legs alike), then in one transaction records an
+``InterestAccrual`` per account, locks the accounts that earned interest,
+bulk-creates their Deposit legs and moves the balances with CASE UPDATEs.
+Accounts already accrued up to the date are skipped, so a run that stops
+part-way is resumed by running it again. The unique (account, period_end)
+accrual makes a concurrent run of the same chunk roll back instead of
+crediting twice; the losing run counts the chunk as skipped and carries on
+with the others, and the next run picks up any account it left out.
+
+Deactivated accounts are skipped: nothing is posted to a frozen account.
+Once reactivated, its next accrual covers the days since its previous one,
+inactive days included, as the money was held throughout.
+"""
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, ROUND_DOWN
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+from .models import Account, Transaction, ArchivedTransaction, InterestAccrual
+from .ids import new_transaction_id
+from .balances import SNAPSHOT_LAG
+from .statements import day_start
+from . import archive, ledger, outbox, pagecache, rollups
+
+
+INTEREST_CHUNK_SIZE = 2000
+CENT = Decimal('0.01')
+
+
+def annual_rate():
+    return Decimal(str(getattr(settings, 'SAVINGS_INTEREST_RATE', '0.035')))
+
+
+def day_count():
+    return getattr(settings, 'INTEREST_DAY_COUNT', 365)
+
+
+def check_date(day):
+    """Raise ValueError unless every posting of `day` is final"""
+    if timezone.now() < day_start(day + timedelta(days=1)) + SNAPSHOT_LAG:
+        raise ValueError('Interest can only be accrued for a day that has ended.')
+
+
+def paise_days(opening, legs, start, end):
+    """
+    Sum of end-of-day balances in paise over the days start..end; `opening`
+    is the balance going in and `legs` are (day, balance after) oldest first.
+    """
+    total = 0
+    balance, day = opening, start
+    for leg_day, balance_after in legs:
+        if leg_day > day:
+            total += max(balance, 0) * (leg_day - day).days
+            day = leg_day
+        balance = balance_after
+    return total + max(balance, 0) * ((end - day).days + 1)
+
+
+def _paise(amount):
+    return int(amount * 100)
+
+
+def _last_balance(model, before):
+    return Subquery(
+        model.objects.filter(account_id=OuterRef('pk'), created_at__lt=before)
+        .order_by('-created_at', '-id').values('balance_after_transaction')[:1]
+    )
+
+
+def _periods(account_ids, day):
+    """{account_id: period start} for the accounts with days left to accrue"""
+    periods = {}
+    rows = Account.objects.filter(id__in=account_ids, account_type='Saving', is_active=True).order_by().values_list(
+        'id', 'created_at').annotate(last_end=Max('interest_accruals__period_end'))
+    for account_id, created_at, last_end in rows:
+        start = last_end + timedelta(days=1) if last_end else timezone.localdate(created_at)
+        if start <= day:
+            periods[account_id] = start
+    return periods
+
+
+def _openings(periods):
+    """{account_id: balance in paise going into its period}"""
+    by_start = defaultdict(list)
+    for account_id, start in periods.items():
+        by_start[start].append(account_id)
+    openings = {}
+    for start, account_ids in by_start.items():
+        before = day_start(start)
+        # Accounts opened on or after the start have nothing before it
+        rows = Account.objects.filter(id__in=account_ids, created_at__lt=before).order_by().values_list('id').annotate(
+            hot=_last_balance(Transaction, before), archived=_last_balance(ArchivedTransaction, before))
+        for account_id, hot, archived in rows:
+            balance = hot if hot is not None else archived
+            if balance is not None:
+                openings[account_id] = _paise(balance)
+    return openings
+
+
+def _legs(periods, day):
+    """{account_id: [(day, balance after in paise)]} for the legs inside each account's period"""
+    first = min(periods.values())
+    legs = defaultdict(list)
+    # Archived legs are older than hot ones, so per account this stays in order
+    for rows in archive.legs(account_id__in=list(periods), created_at__gte=day_start(first),
+                             created_at__lt=day_start(day + timedelta(days=1))):
+        for account_id, created_at, balance_after in rows.order_by('account_id', 'created_at', 'id').values_list(
+                'account_id', 'created_at', 'balance_after_transaction'):
+            leg_day = timezone.localdate(created_at)
+            if leg_day >= periods[account_id]:
+                legs[account_id].append((leg_day, _paise(balance_after)))
+    return legs
+
+
+def accrue_chunk(account_ids, day):
+    """
+    Accrue interest up to `day` for a chunk of accounts. Returns (accounts
+    accrued, credited, total, skipped); skipped is True when a concurrent
+    run accrued part of the chunk first and this one rolled back.
+    """
+    try:
+        periods = _periods(account_ids, day)
+        if not periods:
+            return 0, 0, Decimal('0.00'), False
+        openings = _openings(periods)
+        legs = _legs(periods, day)
+        rate, days_in_year = annual_rate(), day_count()
+
+        accruals = {}
+        for account_id, start in periods.items():
+            total = paise_days(openings.get(account_id, 0), legs.get(account_id, ()), start, day)
+            days = (day - start).days + 1
+            amount = (Decimal(total) * rate / days_in_year / 100).quantize(CENT, rounding=ROUND_DOWN)
+            accruals[account_id] = InterestAccrual(
+                account_id=account_id, period_start=start, period_end=day, annual_rate=rate, amount=amount,
+                average_balance=(Decimal(total) / days / 100).quantize(CENT),
+            )
+
+        try:
+            with transaction.atomic():
+                earning = [account_id for account_id, accrual in accruals.items() if accrual.amount > 0]
+                rows, deltas, totals = [], {}, {}
+                for account in (Account.objects.select_for_update().filter(id__in=earning).order_by('id')
+                                .only('id', 'balance', 'account_type')):
+                    accrual = accruals[account.id]
+                    accrual.transaction_id = new_transaction_id()
+                    deltas[account.id] = accrual.amount
+                    totals[(account.id, account.account_type, 'Deposit')] = (accrual.amount, 1)
+                    rows.append(Transaction(
+                        transaction_id=accrual.transaction_id,
+                        account_id=account.id,
+                        transaction_type='Deposit',
+                        amount=accrual.amount,
+                        balance_after_transaction=account.balance + accrual.amount,
+                        signed_amount=accrual.amount,
+                        description=f'Interest {accrual.period_start:%d %b %Y} - {day:%d %b %Y}',
+                    ))
+                # First, so a chunk another run has already accrued fails before posting
+                InterestAccrual.objects.bulk_create(accruals.values(), batch_size=1000)
+                ledger.apply_deltas(deltas)
+                rollups.record_many(totals)
+                pagecache.bump_on_commit(*deltas)
+                Transaction.objects.bulk_create(rows, batch_size=1000)
+                outbox.record(*rows)
+        except IntegrityError:
+            # Another run holds accruals for some of these accounts
+            return 0, 0, Decimal('0.00'), True
+        return len(accruals), len(rows), sum(deltas.values(), Decimal('0.00')), False
+    finally:
+        connection.close()
+
+
+def accrue(day, chunk_size=INTEREST_CHUNK_SIZE, workers=4, account_ids=None, progress=None):
+    """
+    Accrue interest up to and including `day` for every active Saving
+    account (or the given ones) in chunks, on `workers` processes (one runs
+    them in this process). progress(accounts accrued) is called after each
+    chunk. Returns a dict of totals.
+    """
+    check_date(day)
+    accounts = Account.objects.filter(account_type='Saving', is_active=True)
+    if account_ids is not None:
+        accounts = accounts.filter(id__in=account_ids)
+    ids = list(accounts.order_by('id').values_list('id', flat=True))
+    chunks = [ids[start:start + chunk_size] for start in range(0, len(ids), chunk_size)]
+    result = {'accounts': len(ids), 'accrued': 0, 'credited': 0, 'interest': Decimal('0.00'), 'skipped_chunks': 0}
+
+    def add(outcomes):
+        for accrued, credited, interest, skipped in outcomes:
+            result['accrued'] += accrued
+            result['credited'] += credited
+            result['interest'] += interest
+            result['skipped_chunks'] += skipped
+            if progress is not None:
+                progress(result['accrued'])
+
+    if workers <= 1:
+        add(accrue_chunk(chunk, day) for chunk in chunks)
+        return result
+    # Workers are forked: close connections first so none is shared
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        add(pool.map(accrue_chunk, chunks, [day] * len(chunks)))
+    return result
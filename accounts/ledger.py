@@ -0,0 +1,178 @@
+"""
+Ledger posting service.
+
+Every balance change goes through this module. Accounts are row-locked in
+ascending id order, balances are moved with single-column ``F()`` UPDATEs
+(guarded by ``balance >= amount`` for debits) and the resulting balance is
+computed from the locked value instead of being read back. Each leg also
+gets an outbox event in the same transaction (see ``outbox``), and the
+idempotency key of the request being served, if any, is marked done in it
+too (see ``idempotency``). Debits are
+checked against the account type's velocity limits (see ``velocity``)
+after the balance check and before the balance moves. Batch postings move
+many balances at once with ``apply_deltas()``.
+"""
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from .models import Account, Transaction
+from . import idempotency, outbox, pagecache, rollups, velocity
+
+
+# Accounts per CASE UPDATE statement in apply_deltas()
+UPDATE_BATCH_SIZE = 500
+
+
+class PostingError(Exception):
+    """Base class for ledger posting failures"""
+
+
+class InsufficientBalance(PostingError):
+    """Raised when a debit would take an account below zero"""
+
+
+class AccountNotFound(PostingError):
+    """Raised when an account to be posted against does not exist"""
+
+
+class VelocityLimitExceeded(PostingError):
+    """Raised when a debit would exceed the account's velocity limits"""
+
+
+def lock_accounts(*account_ids):
+    """Lock the given account rows in id order and return {id: account}"""
+    accounts = {
+        account.id: account
+        for account in Account.objects.select_for_update()
+        .filter(id__in=account_ids)
+        .order_by('id')
+        .only('id', 'balance', 'account_type')
+    }
+    if len(accounts) != len(set(account_ids)):
+        raise AccountNotFound('Account not found.')
+    return accounts
+
+
+def apply_delta(account_id, delta):
+    """Apply a balance delta with one conditional UPDATE of the balance column"""
+    rows = Account.objects.filter(id=account_id)
+    if delta < 0:
+        rows = rows.filter(balance__gte=-delta)
+    if not rows.update(balance=F('balance') + delta):
+        raise InsufficientBalance('Insufficient balance!')
+
+
+def apply_deltas(deltas):
+    """
+    Apply {account_id: net delta} with one CASE UPDATE per UPDATE_BATCH_SIZE
+    accounts, for batch postings (ingest, group commit, standing
+    instructions, interest). Unlike apply_delta() nothing is guarded: call it
+    inside the posting's transaction with the accounts locked and the
+    resulting balances already checked. Zero deltas are skipped.
+    """
+    items = [(account_id, delta) for account_id, delta in deltas.items() if delta]
+    for start in range(0, len(items), UPDATE_BATCH_SIZE):
+        batch = items[start:start + UPDATE_BATCH_SIZE]
+        delta = Case(
+            *[When(id=account_id, then=Value(amount)) for account_id, amount in batch],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        Account.objects.filter(id__in=[account_id for account_id, _ in batch]).update(
+            balance=F('balance') + delta
+        )
+
+
+@contextmanager
+def velocity_limits(account_id, account_type, amount):
+    """Count a debit against its velocity limits, taking it back if the posting fails"""
+    breach, undo = velocity.reserve(account_id, account_type, amount)
+    if breach:
+        raise VelocityLimitExceeded(breach)
+    try:
+        yield
+    except BaseException:
+        undo()
+        raise
+
+
+def deposit(account_id, amount, description='Deposit'):
+    """Credit an account and return the posted Transaction"""
+    with transaction.atomic():
+        locked = lock_accounts(account_id)[account_id]
+        apply_delta(account_id, amount)
+        rollups.record(account_id, locked.account_type, 'Deposit', amount)
+        pagecache.bump_on_commit(account_id)
+        posted = Transaction.objects.create(
+            account_id=account_id,
+            transaction_type='Deposit',
+            amount=amount,
+            balance_after_transaction=locked.balance + amount,
+            description=description
+        )
+        outbox.record(posted)
+        idempotency.record_posting()
+        return posted
+
+
+def withdraw(account_id, amount, description='Withdrawal'):
+    """Debit an account and return the posted Transaction"""
+    with transaction.atomic():
+        locked = lock_accounts(account_id)[account_id]
+        if amount > locked.balance:
+            raise InsufficientBalance('Insufficient balance!')
+        with velocity_limits(account_id, locked.account_type, amount):
+            apply_delta(account_id, -amount)
+            rollups.record(account_id, locked.account_type, 'Withdraw', amount)
+            pagecache.bump_on_commit(account_id)
+            posted = Transaction.objects.create(
+                account_id=account_id,
+                transaction_type='Withdraw',
+                amount=amount,
+                balance_after_transaction=locked.balance - amount,
+                description=description
+            )
+            outbox.record(posted)
+            idempotency.record_posting()
+            return posted
+
+
+def transfer(from_account, to_account, amount, description='Transfer'):
+    """
+    Move money between two accounts.
+
+    Both legs are locked in account-id order so opposing transfers cannot
+    deadlock. Only ``id`` and ``account_number`` are read from the account
+    arguments. Returns the (debit, credit) Transaction pair.
+    """
+    with transaction.atomic():
+        locked = lock_accounts(from_account.id, to_account.id)
+        if amount > locked[from_account.id].balance:
+            raise InsufficientBalance('Insufficient balance!')
+        with velocity_limits(from_account.id, locked[from_account.id].account_type, amount):
+            apply_delta(from_account.id, -amount)
+            apply_delta(to_account.id, amount)
+            for leg in (from_account.id, to_account.id):
+                rollups.record(leg, locked[leg].account_type, 'Transfer', amount)
+            pagecache.bump_on_commit(from_account.id, to_account.id)
+
+            debit = Transaction.objects.create(
+                account_id=from_account.id,
+                transaction_type='Transfer',
+                amount=amount,
+                balance_after_transaction=locked[from_account.id].balance - amount,
+                signed_amount=-amount,
+                description=f'Transfer to {to_account.account_number} - {description}',
+                to_account_id=to_account.id
+            )
+            credit = Transaction.objects.create(
+                account_id=to_account.id,
+                transaction_type='Transfer',
+                amount=amount,
+                balance_after_transaction=locked[to_account.id].balance + amount,
+                signed_amount=amount,
+                description=f'Transfer from {from_account.account_number} - {description}',
+                to_account_id=from_account.id
+            )
+            outbox.record(debit, credit)
+            idempotency.record_posting()
+            return debit, credit
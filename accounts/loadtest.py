@@ -0,0 +1,105 @@
+"""
+HTTP load generator used by ``manage.py loadtest``.
+
+Compares running servers, typically the same code under a WSGI server and
+under an ASGI server (where ``ASYNC_VIEWS`` is on), by driving each with
+the same set of concurrent logged-in clients and reporting throughput and
+latency percentiles. The servers must share this process's database: the
+clients are benchmark customers with sessions created directly in it.
+"""
+import http.client
+import random
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.test import Client
+from django.utils.crypto import get_random_string
+from .benchmarks import BENCH_PREFIX, bulk_customers, percentile
+
+
+def create_sessions(count):
+    """Create `count` approved benchmark customers and return their session keys"""
+    bulk_customers(count)
+    keys = []
+    for user in User.objects.filter(username__startswith=BENCH_PREFIX)[:count]:
+        client = Client()
+        client.force_login(user)
+        keys.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+    return keys
+
+
+def remove_sessions(keys):
+    Session.objects.filter(session_key__in=keys).delete()
+
+
+class LoadClient:
+    """One simulated customer issuing requests back to back"""
+
+    def __init__(self, base_url, session_key, deposit_ratio):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.deposit_ratio = deposit_ratio
+        # Any token works for CSRF as long as cookie and header agree
+        self.csrf_token = get_random_string(32)
+        self.cookie = (f'{settings.SESSION_COOKIE_NAME}={session_key}; '
+                       f'{settings.CSRF_COOKIE_NAME}={self.csrf_token}')
+        self.latencies = []
+        self.errors = 0
+
+    def request(self):
+        headers = {'Cookie': self.cookie}
+        if random.random() < self.deposit_ratio:
+            method, path = 'POST', '/deposit/'
+            body = urlencode({'amount': '1.00', 'description': 'Load test'})
+            headers.update({'Content-Type': 'application/x-www-form-urlencoded',
+                            'X-CSRFToken': self.csrf_token})
+            expected = 302
+        else:
+            method, path, body = 'GET', random.choice(('/dashboard/', '/transactions/')), None
+            expected = 200
+
+        start = time.perf_counter()
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == expected
+        except (OSError, http.client.HTTPException):
+            ok = False
+        finally:
+            connection.close()
+        if ok:
+            self.latencies.append(time.perf_counter() - start)
+        else:
+            self.errors += 1
+
+    def run(self, deadline):
+        while time.perf_counter() < deadline:
+            self.request()
+
+
+def run_load(base_url, session_keys, duration, deposit_ratio=0.2):
+    """Drive one server with a client per session for `duration` seconds"""
+    clients = [LoadClient(base_url, key, deposit_ratio) for key in session_keys]
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client.run, args=(deadline,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    return {
+        'requests': len(latencies),
+        'errors': sum(client.errors for client in clients),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+    }
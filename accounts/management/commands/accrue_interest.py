@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts import interest
+
+
+class Command(BaseCommand):
+    help = 'Credit interest on Saving accounts for the days since their last accrual (run e.g. monthly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Last day to accrue for (YYYY-MM-DD, default: yesterday)')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Worker processes accruing chunks in parallel, each on its own connection')
+        parser.add_argument('--chunk-size', type=int, default=interest.INTEREST_CHUNK_SIZE,
+                            help='Accounts per chunk and transaction')
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else timezone.localdate() - timedelta(days=1)
+            interest.check_date(day)
+        except ValueError as exc:
+            raise CommandError(f'Invalid --date: {exc}')
+
+        def progress(accrued):
+            self.stdout.write(f'Accrued {accrued} accounts...')
+
+        result = interest.accrue(day, options['chunk_size'], options['workers'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Accrued interest up to {day} for {result["accrued"]} of {result["accounts"]} Saving accounts; '
+            f'credited ₹{result["interest"]} to {result["credited"]}'
+        ))
+        if result['skipped_chunks']:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {result["skipped_chunks"]} chunk(s) another run was accruing; '
+                f'run again to pick up any account they left out'
+            ))
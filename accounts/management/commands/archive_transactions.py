@@ -0,0 +1,42 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from accounts import archive
+from accounts.models import Transaction
+from accounts.statements import day_start
+
+
+class Command(BaseCommand):
+    help = 'Move ledger entries posted before a date to the archive table, in short batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help='Archive entries posted before this date (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=archive.ARCHIVE_BATCH_SIZE,
+                            help='Entries moved per transaction')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches, e.g. to let replicas catch up')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the entries that would move')
+
+    def handle(self, *args, **options):
+        try:
+            cutoff = day_start(date.fromisoformat(options['before']))
+            archive.check_cutoff(cutoff)
+        except ValueError as exc:
+            raise CommandError(f'Invalid --before: {exc}')
+
+        if options['dry_run']:
+            count = Transaction.objects.filter(created_at__lt=cutoff).count()
+            self.stdout.write(f'{count} ledger entries would be archived')
+            return
+
+        def progress(moved):
+            self.stdout.write(f'Archived {moved} ledger entries...')
+
+        try:
+            moved = archive.archive_before(cutoff, options['batch_size'], options['pause'], progress)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        stats = archive.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} ledger entries; {stats["hot"]["rows"]} remain in the hot table, '
+            f'{stats["archived"]["rows"]} are archived'
+        ))
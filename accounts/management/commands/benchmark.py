@@ -0,0 +1,29 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from accounts.benchmarks import SCENARIOS, cleanup, require_benchmark_database
+
+
+class Command(BaseCommand):
+    help = 'Run a performance benchmark scenario against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--size', type=int, default=10000,
+                            help='Number of rows to generate for data-size driven scenarios')
+
+    def handle(self, *args, **options):
+        try:
+            require_benchmark_database()
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        try:
+            results = SCENARIOS[options['scenario']](options)
+        except Exception as exc:
+            raise CommandError(f'Benchmark failed: {exc}')
+        finally:
+            cleanup()
+
+        for key, value in results.items():
+            self.stdout.write(f'{key}: {value}')
@@ -0,0 +1,57 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from accounts.benchsuite import compare, run_suite
+
+
+class Command(BaseCommand):
+    help = 'Time every view and the posting paths at several data sizes and save the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000',
+                            help='Comma-separated numbers of seeded postings, one run per size')
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per case')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Earlier results file to check for regressions')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed median slowdown against the baseline (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as fileobj:
+                    baseline = json.load(fileobj)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read baseline: {exc}')
+
+        try:
+            results = run_suite(sizes, options['customers'], options['iterations'])
+        except Exception as exc:
+            raise CommandError(f'Benchmark suite failed: {exc}')
+
+        for size, sections in results['sizes'].items():
+            self.stdout.write(f"{size} postings ({sections['ledger_entries']} ledger entries, "
+                              f"seeded in {sections['seed_seconds']}s)")
+            for section in ('views', 'postings'):
+                for case, result in sections[section].items():
+                    queries = f", {result['queries']} queries" if 'queries' in result else ''
+                    self.stdout.write(f"  {case}: median {result['median_ms']} ms, "
+                                      f"p95 {result['p95_ms']} ms{queries}")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fileobj:
+                json.dump(results, fileobj, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(baseline, results, options['tolerance'])
+            for size, case, old_ms, new_ms in regressions:
+                self.stderr.write(f'{size} / {case}: median {old_ms} ms -> {new_ms} ms')
+            if regressions:
+                raise CommandError(f'{len(regressions)} cases slowed down by more than '
+                                   f"{options['tolerance']:.0%} against the baseline")
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
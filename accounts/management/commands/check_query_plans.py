@@ -0,0 +1,40 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from accounts.benchmarks import bulk_transactions, cleanup, make_account, require_benchmark_database
+from accounts.queryplans import explain_all
+
+
+class Command(BaseCommand):
+    help = 'Seed transactions, EXPLAIN the view queries and fail on full scans or sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=20000,
+                            help='Number of transactions to seed before explaining')
+        parser.add_argument('--show-plans', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            require_benchmark_database()
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        try:
+            accounts = [make_account() for _ in range(50)]
+            bulk_transactions(accounts, options['size'])
+            try:
+                results = explain_all(accounts[0])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+        finally:
+            cleanup()
+
+        failed = 0
+        for name, plan, problems in results:
+            if problems:
+                failed += 1
+                self.stderr.write(f'{name}: {", ".join(problems)}')
+            else:
+                self.stdout.write(f'{name}: ok')
+            if problems or options['show_plans']:
+                self.stdout.write(plan)
+        if failed:
+            raise CommandError(f'{failed} queries have regressed query plans')
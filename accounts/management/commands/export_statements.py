@@ -0,0 +1,40 @@
+import os
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from accounts import statements
+from accounts.models import Account
+
+
+class Command(BaseCommand):
+    help = 'Stream account statements as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_numbers', nargs='+', metavar='account_number')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD)')
+        parser.add_argument('--format', choices=sorted(statements.FORMATS), default='csv')
+        parser.add_argument('--output-dir',
+                            help='Write one file per account here instead of to stdout')
+
+    def handle(self, *args, **options):
+        start, end, fmt = options['start'], options['end'], options['format']
+        if start and end and start > end:
+            raise CommandError('--start is after --end')
+
+        accounts = dict(Account.objects.filter(
+            account_number__in=options['account_numbers']).values_list('account_number', 'id'))
+        missing = [number for number in options['account_numbers'] if number not in accounts]
+        if missing:
+            raise CommandError(f'Unknown account numbers: {", ".join(missing)}')
+
+        for account_number in options['account_numbers']:
+            chunks = statements.render(statements.statement_lines(accounts[account_number], start, end), fmt)
+            if options['output_dir'] is None:
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending='')
+                continue
+
+            path = os.path.join(options['output_dir'], statements.filename(account_number, fmt, start, end))
+            with open(path, 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+            self.stderr.write(f'Wrote {path}')
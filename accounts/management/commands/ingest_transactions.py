@@ -0,0 +1,28 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from accounts.ingest import DEFAULT_CHUNK_SIZE, post_batch, read_records
+
+
+class Command(BaseCommand):
+    help = 'Post a CSV or JSON Lines batch file of deposits, withdrawals and transfers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if os.path.splitext(path)[1] in ('.jsonl', '.json') else 'csv')
+        try:
+            with open(path, newline='', encoding='utf-8') as fileobj:
+                result = post_batch(read_records(fileobj, fmt), options['chunk_size'])
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for line_no, reason in sorted(result.rejected):
+            self.stderr.write(f'line {line_no}: {reason}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Posted {result.posted} records, rejected {len(result.rejected)}'
+        ))
@@ -0,0 +1,40 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from accounts.benchmarks import cleanup, require_benchmark_database
+from accounts.loadtest import create_sessions, remove_sessions, run_load
+
+
+class Command(BaseCommand):
+    help = 'Compare request throughput and latency of running servers (e.g. WSGI vs ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                            help='Server to load, e.g. wsgi=http://127.0.0.1:8000 (repeatable)')
+        parser.add_argument('--clients', type=int, default=200,
+                            help='Concurrent logged-in clients')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds to run against each target')
+        parser.add_argument('--deposit-ratio', type=float, default=0.2,
+                            help='Fraction of requests that post a deposit')
+
+    def handle(self, *args, **options):
+        try:
+            require_benchmark_database()
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep or not url.startswith('http://'):
+                raise CommandError(f'Invalid target {target!r}; expected NAME=http://host:port')
+            targets.append((name, url.rstrip('/')))
+
+        session_keys = create_sessions(options['clients'])
+        try:
+            for name, url in targets:
+                results = run_load(url, session_keys, options['duration'], options['deposit_ratio'])
+                for key, value in results.items():
+                    self.stdout.write(f'{name}.{key}: {value}')
+        finally:
+            remove_sessions(session_keys)
+            cleanup()
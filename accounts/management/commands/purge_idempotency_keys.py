@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from accounts.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys (run periodically)'
+
+    def handle(self, *args, **options):
+        removed = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired idempotency keys'))
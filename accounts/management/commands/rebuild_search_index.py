@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from accounts.models import Customer
+from accounts.search import index_customers
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the customer search terms from Customer, User and Account rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        customers = Customer.objects.select_related('user', 'account').order_by('id')
+        last_id = 0
+        indexed = 0
+        while True:
+            chunk = list(customers.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            index_customers(chunk)
+            indexed += len(chunk)
+            last_id = chunk[-1].id
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} customers'))
@@ -0,0 +1,40 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from accounts import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Reconcile every account balance with its ledger entries in parallel processes (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', default='reconcile.jsonl', help='JSON Lines report to write')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4,
+                            help='Worker processes, each with its own database connection')
+        parser.add_argument('--partition-size', type=int, default=reconcile.PARTITION_SIZE,
+                            help='Account ids per partition')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted report, skipping completed partitions')
+
+    def handle(self, *args, **options):
+        if options['resume'] and not os.path.exists(options['report']):
+            raise CommandError(f'No report to resume at {options["report"]}')
+
+        def progress(done, total):
+            if done % 10 == 0 or done == total:
+                self.stdout.write(f'{done}/{total} partitions reconciled...')
+
+        start = time.perf_counter()
+        try:
+            result = reconcile.reconcile(options['report'], options['workers'], options['partition_size'],
+                                         options['resume'], progress)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - start
+
+        rate = result['accounts'] / elapsed if elapsed else 0
+        self.stdout.write(f'Checked {result["accounts"]} accounts in {elapsed:.1f}s ({rate:.0f} accounts/s); '
+                          f'{result["skipped"]} partitions already done')
+        if result['mismatches']:
+            raise CommandError(f'{result["mismatches"]} accounts do not reconcile; see {options["report"]}')
+        self.stdout.write(self.style.SUCCESS(f'All accounts reconcile; report in {options["report"]}'))
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from accounts import outbox
+
+
+class Command(BaseCommand):
+    help = 'Publish ledger posting events from the outbox to a sink, in id order, from the consumer\'s offset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', default=getattr(settings, 'OUTBOX_SINK', 'jsonl:outbox.jsonl'),
+                            help='jsonl:PATH, socket:HOST:PORT, socket:/path.sock, broker:FACTORY or local')
+        parser.add_argument('--consumer', default=outbox.DEFAULT_CONSUMER,
+                            help='Name the offset is tracked under; one per downstream system')
+        parser.add_argument('--batch-size', type=int, default=outbox.OUTBOX_BATCH_SIZE,
+                            help='Events published per batch')
+        parser.add_argument('--follow', action='store_true', help='Keep polling for new events')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls with --follow')
+        parser.add_argument('--replay-from', type=int, metavar='EVENT_ID',
+                            help='Move the consumer back to this event id before relaying')
+        parser.add_argument('--purge', action='store_true',
+                            help='Afterwards, delete events every consumer has published and that are older than '
+                                 'OUTBOX_RETENTION_DAYS')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            sink = outbox.make_sink(options['sink'])
+        except (ValueError, ImportError, OSError) as exc:
+            raise CommandError(f'Invalid --sink: {exc}')
+
+        if options['replay_from'] is not None:
+            outbox.replay(options['consumer'], options['replay_from'])
+
+        def progress(published):
+            self.stdout.write(f'Published {published} events...')
+
+        try:
+            published = outbox.relay(sink, options['consumer'], options['batch_size'], options['follow'],
+                                     options['interval'], progress)
+        finally:
+            sink.close()
+        self.stdout.write(self.style.SUCCESS(f'Published {published} events for {options["consumer"]}'))
+        if options['purge']:
+            self.stdout.write(f'Purged {outbox.purge()} published events')
@@ -0,0 +1,27 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from accounts import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the daily transaction summaries from raw Transaction rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help='Only rebuild/check days on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--check', action='store_true',
+                            help='Report mismatches instead of rebuilding')
+
+    def handle(self, *args, **options):
+        since = options['since']
+        if options['check']:
+            mismatches = rollups.find_mismatches(since)
+            for key, stored, expected in mismatches:
+                self.stderr.write(f'{key}: stored {stored}, expected {expected}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} summary rows out of step')
+            self.stdout.write(self.style.SUCCESS('Daily summaries match transaction rows'))
+            return
+
+        count = rollups.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} summary rows'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts import standing
+
+
+class Command(BaseCommand):
+    help = 'Execute the standing instructions that are due, in batches (run from cron or with --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=standing.STANDING_BATCH_SIZE,
+                            help='Instructions executed per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep running, checking for due instructions')
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help='Seconds between checks with --loop')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        def progress(totals):
+            self.stdout.write(f'Executed {totals["picked"]} instructions...')
+
+        if options['loop']:
+            standing.run_forever(options['interval'], options['batch_size'], progress)
+        result = standing.run_due(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Executed {result["picked"]} standing instructions: {result["posted"]} posted, '
+            f'{result["retried"]} to retry, {result["skipped"]} skipped after retries, '
+            f'{result["stopped"]} stopped (account inactive)'
+        ))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from accounts import seeding
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic customers, accounts and transaction history for load tests and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--transactions', type=int, default=100000,
+                            help='Postings after the opening deposits (a transfer writes two rows)')
+        parser.add_argument('--days', type=int, default=365, help='Spread the history over this many days')
+        parser.add_argument('--seed', type=int, help='Random seed, for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per bulk INSERT')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded data first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f'Deleted {seeding.clear()} seeded customers')
+        start = time.perf_counter()
+        counts = seeding.seed(options['customers'], options['transactions'], days=options['days'],
+                              random_seed=options['seed'], batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['customers']} customers, {counts['transactions']} ledger entries and "
+            f"{counts['snapshots']} balance snapshots in {elapsed:.1f}s "
+            f"(password for every seeded user: {seeding.SEED_PASSWORD})"
+        ))
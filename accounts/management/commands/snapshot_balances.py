@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts import balances
+from accounts.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Record balance snapshots so historical balance lookups stay cheap (run periodically)'
+
+    def handle(self, *args, **options):
+        if Transaction.objects.filter(signed_amount__isnull=True).exists():
+            raise CommandError('Some ledger entries have no signed amount; run verify_ledger --backfill first')
+        added = balances.take_snapshots()
+        self.stdout.write(self.style.SUCCESS(f'Added {added} balance snapshots'))
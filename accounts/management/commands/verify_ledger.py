@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts import balances
+
+
+class Command(BaseCommand):
+    help = 'Re-derive every account balance from its ledger entries and report mismatches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Chunks verified in parallel, each on its own connection')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Accounts per chunk')
+        parser.add_argument('--backfill', action='store_true',
+                            help='First fill signed amounts on entries posted before they were recorded')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            updated = balances.backfill_signed_amounts()
+            self.stdout.write(f'Backfilled {updated} ledger entries')
+
+        checked, problems = balances.verify_ledger(options['chunk_size'], options['workers'])
+        for account_id, stored, derived, unsigned in problems:
+            detail = f'stored {stored}, derived {derived}'
+            if unsigned:
+                detail += f', {unsigned} entries without a signed amount (run with --backfill)'
+            self.stderr.write(f'account {account_id}: {detail}')
+        if problems:
+            raise CommandError(f'{len(problems)} of {checked} accounts do not match the ledger')
+        self.stdout.write(self.style.SUCCESS(f'All {checked} account balances match the ledger'))
@@ -0,0 +1,308 @@
+"""
+Request, query and posting metrics in the Prometheus text format.
+
+``MetricsMiddleware`` times every request per view. For a sampled share of
+requests (``settings.METRICS_SAMPLE_RATE``) it also counts the queries the
+request runs and the time spent in them, through an execute wrapper that is
+installed on every database connection when it opens. Posting views time
+their ledger calls with ``posting('deposit')`` etc. ``GET /metrics``
+renders everything, plus the connection pool counters, for the worker
+process that serves the scrape.
+
+Queries slower than ``settings.SLOW_QUERY_MS`` are logged to the
+``accounts.slow_queries`` logger with their SQL, duration and view.
+
+Hot-path updates take no locks: each thread increments its own shard of
+the counters and a scrape adds the shards up, so a scrape may miss updates
+made while it runs but never loses them. When a thread exits, its shard is
+folded into the totals of retired threads, so short-lived threads (thread
+pools, group commit, async executors) do not pile up shards.
+"""
+import bisect
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+import weakref
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from . import dbpool, ledger
+
+
+slow_query_logger = logging.getLogger('accounts.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+# Counters of threads that have exited
+_retired = {}
+_metrics = []
+
+
+class _ShardOwner:
+    """Lives in a thread's locals; collected, and its shard retired, when the thread exits"""
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+def _merge(totals, shard):
+    for (metric, labelvalues), entry in list(shard.items()):
+        key = (metric, labelvalues)
+        totals[key] = metric.merge(totals.get(key), entry)
+
+
+def _retire(shard):
+    with _shards_lock:
+        _shards.remove(shard)
+        _merge(_retired, shard)
+
+
+def _shard():
+    """This thread's counters, registered for scrapes on first use"""
+    try:
+        return _local.owner.shard
+    except AttributeError:
+        shard = {}
+        _local.owner = _ShardOwner(shard)
+        weakref.finalize(_local.owner, _retire, shard)
+        with _shards_lock:
+            _shards.append(shard)
+        return shard
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _metrics.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        shard = _shard()
+        key = (self, labelvalues)
+        shard[key] = shard.get(key, 0) + amount
+
+    def merge(self, totals, entry):
+        return (totals or 0) + entry
+
+    def samples(self, labelvalues, total):
+        yield self.name, _labels(self.labelnames, labelvalues), total
+
+
+class Histogram(Counter):
+    """Histogram with fixed buckets and labels"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, *labelvalues):
+        shard = _shard()
+        key = (self, labelvalues)
+        entry = shard.get(key)
+        if entry is None:
+            # One count per bucket, then +Inf, then the sum
+            entry = shard[key] = [0] * (len(self.buckets) + 1) + [0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def merge(self, totals, entry):
+        return list(entry) if totals is None else [a + b for a, b in zip(totals, entry)]
+
+    def samples(self, labelvalues, entry):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), entry[:-1]):
+            cumulative += count
+            yield (f'{self.name}_bucket',
+                   _labels(self.labelnames, labelvalues, f'le="{bound}"'), cumulative)
+        yield f'{self.name}_sum', _labels(self.labelnames, labelvalues), entry[-1]
+        yield f'{self.name}_count', _labels(self.labelnames, labelvalues), cumulative
+
+
+REQUEST_LATENCY = Histogram(
+    'bank_request_duration_seconds', 'Time to produce a response, per view', ('view', 'method'))
+RESPONSES = Counter(
+    'bank_responses_total', 'Responses per view and status code', ('view', 'status'))
+REQUEST_QUERIES = Histogram(
+    'bank_request_queries', 'Database queries per sampled request', ('view',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram(
+    'bank_request_db_seconds', 'Time spent in database queries per sampled request', ('view',))
+SLOW_QUERIES = Counter(
+    'bank_slow_queries_total', 'Queries slower than SLOW_QUERY_MS', ('view',))
+POSTING_LATENCY = Histogram(
+    'bank_posting_duration_seconds', 'Ledger posting latency', ('operation', 'outcome'))
+
+
+class RequestStats:
+    """Per-request query counters read by the execute wrapper"""
+    __slots__ = ('view', 'sampled', 'queries', 'db_seconds')
+
+    def __init__(self, sampled):
+        self.view = 'unmatched'
+        self.sampled = sampled
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def _slow_threshold():
+    slow_ms = getattr(settings, 'SLOW_QUERY_MS', None)
+    return None if slow_ms is None else slow_ms / 1000
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper: time queries of sampled requests and log slow ones"""
+    stats = _current.get()
+    threshold = _slow_threshold()
+    if threshold is None and (stats is None or not stats.sampled):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        if stats is not None and stats.sampled:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        if threshold is not None and elapsed >= threshold:
+            view = stats.view if stats is not None else None
+            SLOW_QUERIES.inc(view or '')
+            slow_query_logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, view or '-', sql)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created receiver adding record_query to the connection"""
+    if record_query not in connection.execute_wrappers:
+        # First, so execute_wrapper() blocks opened earlier still pop their own
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextlib.contextmanager
+def posting(operation):
+    """Time a ledger posting (deposit, withdraw or transfer)"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    except ledger.PostingError:
+        # Insufficient balance and the like: the ledger refused the posting
+        outcome = 'rejected'
+        raise
+    finally:
+        POSTING_LATENCY.observe(time.perf_counter() - start, operation, outcome)
+
+
+class MetricsMiddleware:
+    """Record latency per view, and query counts and DB time for sampled requests"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _current.get()
+        if stats is not None:
+            stats.view = request.resolver_match.view_name
+
+    def start(self):
+        sampled = random.random() < getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        stats = RequestStats(sampled)
+        return stats, _current.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, start):
+        # Streaming responses are timed to their first byte
+        REQUEST_LATENCY.observe(time.perf_counter() - start, stats.view, request.method)
+        RESPONSES.inc(stats.view, response.status_code)
+        if stats.sampled:
+            REQUEST_QUERIES.observe(stats.queries, stats.view)
+            REQUEST_DB_TIME.observe(stats.db_seconds, stats.view)
+
+
+def _pool_samples():
+    """Connection pool counters (see accounts/dbpool.py) as metric lines"""
+    pools = dbpool.stats()['pools']
+    name = 'bank_db_pool_connections'
+    lines = [f'# HELP {name} Open pooled connections by state', f'# TYPE {name} gauge']
+    for alias, stats in pools.items():
+        for state in ('in_use', 'idle'):
+            lines.append(f'{name}{_labels(("alias", "state"), (alias, state))} {stats[state]}')
+    for counter in ('checkouts', 'waits', 'timeouts', 'created', 'reconnects', 'expired', 'discarded'):
+        name = f'bank_db_pool_{counter}_total'
+        lines += [f'# HELP {name} Connection pool {counter}', f'# TYPE {name} counter']
+        for alias, stats in pools.items():
+            lines.append(f'{name}{_labels(("alias",), (alias,))} {stats[counter]}')
+    return lines
+
+
+def render():
+    """All metrics of this process in the Prometheus text exposition format"""
+    merged = {}
+    # Held while adding up, so a shard retiring meanwhile is counted exactly once
+    with _shards_lock:
+        _merge(merged, _retired)
+        for shard in _shards:
+            _merge(merged, shard)
+    totals = {metric: {} for metric in _metrics}
+    for (metric, labelvalues), total in merged.items():
+        totals[metric][labelvalues] = total
+
+    lines = []
+    for metric in _metrics:
+        lines += [f'# HELP {metric.name} {metric.documentation}', f'# TYPE {metric.name} {metric.kind}']
+        for labelvalues, total in sorted(totals[metric].items(), key=lambda item: tuple(map(str, item[0]))):
+            lines += [f'{name}{labels} {_format(value)}'
+                      for name, labels, value in metric.samples(labelvalues, total)]
+    lines += _pool_samples()
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,150 @@
+"""
+Request-scoped customer/account lookup.
+
+``CustomerContextMiddleware`` attaches ``request.customer_context``. Its
+attributes load on first use:
+
+* ``ref`` - an AccountRef with the ids, account number and status flags.
+  These rarely change, so they are cached (``ACCOUNT_REF_CACHE``) and
+  invalidated by the views and admin actions that change them. Posting and
+  history views need nothing more, so on a cache hit they skip the
+  customer/account lookups entirely.
+* ``customer`` / ``account`` - full rows, fetched together in one joined
+  query when a view needs the live balance or profile fields.
+
+Async views use ``await aref()`` / ``await aaccount()``, which resolve the
+same values through the async cache and ORM APIs.
+"""
+from collections import namedtuple
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from .models import Customer, Account
+
+
+AccountRef = namedtuple('AccountRef', ['id', 'account_number', 'is_active', 'customer_id', 'is_approved'])
+
+
+def _cache():
+    return caches[getattr(settings, 'ACCOUNT_REF_CACHE', 'default')]
+
+
+def _cache_key(user_id):
+    return f'account_ref:{user_id}'
+
+
+def get_account_ref(user):
+    """Return the AccountRef for a user, or None if they have no customer account"""
+    key = _cache_key(user.pk)
+    cached = _cache().get(key)
+    if cached is not None:
+        return AccountRef(*cached)
+    row = Account.objects.filter(customer__user=user).values_list(
+        'id', 'account_number', 'is_active', 'customer_id', 'customer__is_approved'
+    ).first()
+    if row is None:
+        return None
+    ref = AccountRef(*row)
+    _cache().set(key, tuple(ref), getattr(settings, 'ACCOUNT_REF_CACHE_TIMEOUT', 300))
+    return ref
+
+
+async def aget_account_ref(user):
+    """Async variant of get_account_ref()"""
+    key = _cache_key(user.pk)
+    cached = await _cache().aget(key)
+    if cached is not None:
+        return AccountRef(*cached)
+    row = await Account.objects.filter(customer__user_id=user.pk).values_list(
+        'id', 'account_number', 'is_active', 'customer_id', 'customer__is_approved'
+    ).afirst()
+    if row is None:
+        return None
+    ref = AccountRef(*row)
+    await _cache().aset(key, tuple(ref), getattr(settings, 'ACCOUNT_REF_CACHE_TIMEOUT', 300))
+    return ref
+
+
+def invalidate_account_ref(user_id):
+    """Drop a user's cached AccountRef after approval, activation or profile changes"""
+    _cache().delete(_cache_key(user_id))
+
+
+class CustomerContext:
+    """Lazily resolved customer and account for the requesting user"""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def ref(self):
+        if not self.user.is_authenticated:
+            return None
+        if 'account' in self.__dict__ and self.account is not None:
+            account = self.account
+            return AccountRef(account.id, account.account_number, account.is_active,
+                              account.customer_id, account.customer.is_approved)
+        return get_account_ref(self.user)
+
+    @cached_property
+    def account(self):
+        if not self.user.is_authenticated:
+            return None
+        try:
+            account = Account.objects.select_related('customer').get(customer__user=self.user)
+        except Account.DoesNotExist:
+            return None
+        # The user row is already loaded by the auth middleware
+        account.customer.user = self.user
+        return account
+
+    @cached_property
+    def customer(self):
+        if self.account is not None:
+            return self.account.customer
+        if not self.user.is_authenticated:
+            return None
+        return Customer.objects.filter(user=self.user).first()
+
+    # Async accessors; they fill the same cache slots as the properties above.
+    # The user must already be resolved (see async_views.async_login_required).
+
+    async def aref(self):
+        if 'ref' not in self.__dict__:
+            self.__dict__['ref'] = (
+                await aget_account_ref(self.user) if self.user.is_authenticated else None
+            )
+        return self.ref
+
+    async def aaccount(self):
+        if 'account' not in self.__dict__:
+            account = None
+            if self.user.is_authenticated:
+                try:
+                    account = await Account.objects.select_related('customer').aget(
+                        customer__user_id=self.user.pk)
+                    account.customer.user = self.user
+                except Account.DoesNotExist:
+                    pass
+            self.__dict__['account'] = account
+        return self.account
+
+
+class CustomerContextMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.customer_context = CustomerContext(request.user)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
@@ -1,9 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
-import random
-import string
+from .ids import new_account_number, new_transaction_id
 
 
 class Customer(models.Model):
@@ -23,6 +23,10 @@ class Customer(models.Model):
     class Meta:
         verbose_name = "Customer"
         verbose_name_plural = "Customers"
+        indexes = [
+            # Keyset pagination in manage_customers
+            models.Index(fields=['created_at'], name='customer_created_idx'),
+        ]
 
 
 class Account(models.Model):
@@ -42,12 +46,7 @@ class Account(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.account_number:
-            # Generate unique account number
-            while True:
-                account_num = ''.join(random.choices(string.digits, k=12))
-                if not Account.objects.filter(account_number=account_num).exists():
-                    self.account_number = account_num
-                    break
+            self.account_number = new_account_number()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -72,6 +71,10 @@ class Transaction(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2, 
                                 validators=[MinValueValidator(Decimal('0.01'))])
     balance_after_transaction = models.DecimalField(max_digits=12, decimal_places=2)
+    # The balance change this leg makes to `account` (negative for debits).
+    # Balances are derived from these; null only on rows from before the
+    # column existed, until `verify_ledger --backfill` fills them in.
+    signed_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, editable=False)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -80,13 +83,13 @@ class Transaction(models.Model):
                                    related_name='received_transactions')
     
     def save(self, *args, **kwargs):
+        # Ledger entries are append-only; corrections are new postings
+        if not self._state.adding:
+            raise ValueError('Transactions are immutable once posted.')
         if not self.transaction_id:
-            # Generate unique transaction ID
-            while True:
-                trans_id = 'TXN' + ''.join(random.choices(string.digits, k=10))
-                if not Transaction.objects.filter(transaction_id=trans_id).exists():
-                    self.transaction_id = trans_id
-                    break
+            self.transaction_id = new_transaction_id()
+        if self.signed_amount is None and self.transaction_type in ('Deposit', 'Withdraw'):
+            self.signed_amount = self.amount if self.transaction_type == 'Deposit' else -self.amount
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -96,4 +99,255 @@ class Transaction(models.Model):
         verbose_name = "Transaction"
         verbose_name_plural = "Transactions"
         ordering = ['-created_at']
+        indexes = [
+            # Per-account history and dashboard
+            models.Index(fields=['account', 'created_at'], name='txn_account_created_idx'),
+            # Admin listings and reports filtered by type
+            models.Index(fields=['transaction_type', 'created_at'], name='txn_type_created_idx'),
+            # Incoming transfers
+            models.Index(fields=['to_account', 'created_at'], name='txn_to_account_created_idx'),
+            # Unfiltered all_transactions listing
+            models.Index(fields=['created_at'], name='txn_created_idx'),
+        ]
 
+
+class ArchivedTransaction(models.Model):
+    """A Transaction row moved out of the hot table by `archive_transactions`"""
+    # Same id and columns as the row had in Transaction. No foreign key or
+    # unique constraints, so MySQL can range-partition the table by month.
+    id = models.BigIntegerField(primary_key=True)
+    transaction_id = models.CharField(max_length=20, db_index=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, db_constraint=False,
+                                related_name='archived_transactions')
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPE_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    balance_after_transaction = models.DecimalField(max_digits=12, decimal_places=2)
+    signed_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    to_account = models.ForeignKey(Account, on_delete=models.SET_NULL, db_constraint=False, null=True,
+                                   blank=True, related_name='+')
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.transaction_id} - {self.transaction_type} - ₹{self.amount} (archived)"
+    
+    class Meta:
+        verbose_name = "Archived Transaction"
+        verbose_name_plural = "Archived Transactions"
+        ordering = ['-created_at']
+        # id is spelled out: the keyset order is (created_at, id), and not
+        # every backend appends the primary key to secondary indexes
+        indexes = [
+            models.Index(fields=['account', 'created_at', 'id'], name='archived_account_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='archived_created_idx'),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    """An account's balance after every ledger entry up to (entry_created_at, last_entry_id)"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_snapshots')
+    entry_created_at = models.DateTimeField()
+    last_entry_id = models.BigIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    entry_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.account_id} @ {self.entry_created_at} - ₹{self.balance}"
+    
+    class Meta:
+        verbose_name = "Balance Snapshot"
+        verbose_name_plural = "Balance Snapshots"
+        unique_together = [('account', 'entry_created_at', 'last_entry_id')]
+        ordering = ['-entry_created_at']
+
+
+class InterestAccrual(models.Model):
+    """Interest credited to a Saving account for a period; recorded even when it comes to zero"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='interest_accruals')
+    period_start = models.DateField()
+    period_end = models.DateField()
+    average_balance = models.DecimalField(max_digits=14, decimal_places=2)
+    annual_rate = models.DecimalField(max_digits=6, decimal_places=4)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # The posted Deposit leg; blank when no interest was due
+    transaction_id = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.account_id} {self.period_start} - {self.period_end} - ₹{self.amount}"
+    
+    class Meta:
+        verbose_name = "Interest Accrual"
+        verbose_name_plural = "Interest Accruals"
+        # One accrual per account and period end: a rerun cannot credit twice
+        unique_together = [('account', 'period_end')]
+        ordering = ['-period_end']
+
+
+class StandingInstruction(models.Model):
+    """A recurring transfer executed by `manage.py run_standing_instructions`"""
+    FREQUENCY_CHOICES = [
+        ('Daily', 'Daily'),
+        ('Weekly', 'Weekly'),
+        ('Monthly', 'Monthly'),
+    ]
+    
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='standing_instructions')
+    to_account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='incoming_standing_instructions')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, 
+                                 validators=[MinValueValidator(Decimal('0.01'))])
+    description = models.CharField(max_length=100, blank=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='Monthly')
+    # First occurrence; monthly instructions keep its day of the month
+    starts_at = models.DateTimeField()
+    ends_on = models.DateField(null=True, blank=True)
+    # The occurrence being executed; retries leave it alone
+    scheduled_for = models.DateTimeField()
+    # When the scheduler next picks the instruction up: the occurrence itself
+    # or, after an insufficient balance, the next retry; null once inactive
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_transaction_id = models.CharField(max_length=20, blank=True)
+    last_error = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def save(self, *args, **kwargs):
+        if self.scheduled_for is None:
+            self.scheduled_for = self.starts_at
+        if not self.is_active:
+            self.next_run_at = None
+        elif self.next_run_at is None:
+            self.next_run_at = self.scheduled_for
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.account_id} -> {self.to_account_id} - ₹{self.amount} {self.frequency}"
+    
+    class Meta:
+        verbose_name = "Standing Instruction"
+        verbose_name_plural = "Standing Instructions"
+        ordering = ['next_run_at']
+        indexes = [
+            # Due instructions in the order the scheduler runs them. Inactive
+            # ones have no next run, so the index holds no flag to filter on
+            models.Index(fields=['next_run_at', 'id'], name='standing_due_idx'),
+        ]
+        constraints = [
+            # A transfer to the paying account would post two legs that cancel out
+            models.CheckConstraint(
+                check=~models.Q(account=models.F('to_account')),
+                name='standing_distinct_accounts',
+                violation_error_message='Source and destination accounts must differ.',
+            ),
+        ]
+
+
+class DailyTransactionSummary(models.Model):
+    """Per-day totals by transaction type and account type, kept up to date on every posting"""
+    date = models.DateField()
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPE_CHOICES)
+    account_type = models.CharField(max_length=10, choices=Account.ACCOUNT_TYPE_CHOICES)
+    # Postings spread over several rows per day so concurrent writers don't
+    # queue on a single counter row; readers sum across buckets.
+    bucket = models.PositiveSmallIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    transaction_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date} - {self.transaction_type} - {self.account_type} - ₹{self.total_amount}"
+    
+    class Meta:
+        verbose_name = "Daily Transaction Summary"
+        verbose_name_plural = "Daily Transaction Summaries"
+        unique_together = [('date', 'transaction_type', 'account_type', 'bucket')]
+        ordering = ['-date']
+
+
+class CustomerSearchTerm(models.Model):
+    """Denormalized, lower-cased search tokens for a customer (name, username, phone, email, account number)"""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=150)
+    weight = models.PositiveSmallIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.term} -> {self.customer_id}"
+    
+    class Meta:
+        verbose_name = "Customer Search Term"
+        verbose_name_plural = "Customer Search Terms"
+        indexes = [
+            # Prefix lookups are index range scans on term
+            models.Index(fields=['term', 'customer'], name='search_term_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """A client-supplied key for a posting request and the response to replay for retries"""
+    PENDING = 'pending'
+    DONE = 'done'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DONE, 'Done'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    response_location = models.CharField(max_length=200, blank=True)
+    message_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the request running the posting claimed the key; see idempotency.CLAIM_LEASE
+    claimed_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.key} - {self.status}"
+    
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        unique_together = [('user', 'key')]
+        indexes = [
+            # TTL purge
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """A posted ledger leg waiting to be relayed downstream, written in the posting's transaction"""
+    event_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPE_CHOICES)
+    # Plain columns rather than foreign keys: nothing to check on insert, and
+    # an event stays as it was published when its leg is archived
+    account_id = models.BigIntegerField()
+    transaction_id = models.CharField(max_length=20)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.id} - {self.event_type} - {self.transaction_id}"
+    
+    class Meta:
+        verbose_name = "Outbox Event"
+        verbose_name_plural = "Outbox Events"
+        # Relayed in id order, straight off the primary key
+        ordering = ['id']
+
+
+class OutboxOffset(models.Model):
+    """How far a relay consumer has published the outbox; reset it to replay"""
+    consumer = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.consumer} @ {self.last_event_id}"
+    
+    class Meta:
+        verbose_name = "Outbox Offset"
+        verbose_name_plural = "Outbox Offsets"
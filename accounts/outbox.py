@@ -0,0 +1,248 @@
+"""
+Transactional outbox of ledger postings (``manage.py relay_outbox``).
+
+Every leg a posting writes (through ``ledger``, group commit, batch files,
+interest or standing instructions) gets an ``OutboxEvent`` inserted in the
+same database transaction, so downstream systems (notifications, fraud
+checks, the warehouse) see exactly the postings that committed without
+scanning ``Transaction`` by ``created_at``. ``OUTBOX_ENABLED`` turns the
+outbox off.
+
+``relay()`` reads events in id order from a consumer's ``OutboxOffset``,
+publishes them to a sink in batches and only then moves the offset, so
+delivery is at-least-once: after a crash the last batch is published again
+and consumers drop event ids they have already seen. Moving an offset back
+(``replay()``) publishes the stream again from there.
+
+Ids are handed out when a row is inserted, not when it commits, so an event
+can become visible after a higher id has been relayed. The relay therefore
+only moves past a gap in the ids once the event after it is
+``OUTBOX_SETTLE_SECONDS`` old; by then the gap is a rolled-back posting.
+
+Sinks take a list of event dicts and return once the events are handed
+over: ``JsonlSink`` (appends to a file), ``SocketSink`` (newline-delimited
+JSON over TCP or a Unix socket) and ``BrokerSink``, an adapter for
+Kafka-style producers with ``send()`` and ``flush()``. ``LocalBroker`` is an
+in-process producer that stands in for a broker in development.
+"""
+import json
+import os
+import socket
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import OutboxEvent, OutboxOffset
+
+
+OUTBOX_BATCH_SIZE = 1000
+DEFAULT_CONSUMER = 'default'
+
+
+def enabled():
+    return getattr(settings, 'OUTBOX_ENABLED', True)
+
+
+def settle_time():
+    return timedelta(seconds=getattr(settings, 'OUTBOX_SETTLE_SECONDS', 10))
+
+
+def _money(amount):
+    # Callers may pass any scale; events carry the column's two places
+    return f'{amount:.2f}'
+
+
+def _event(leg):
+    return OutboxEvent(
+        event_type=leg.transaction_type,
+        account_id=leg.account_id,
+        transaction_id=leg.transaction_id,
+        payload={
+            'transaction_id': leg.transaction_id,
+            'account_id': leg.account_id,
+            'transaction_type': leg.transaction_type,
+            'amount': _money(leg.amount),
+            'signed_amount': _money(leg.signed_amount),
+            'balance_after': _money(leg.balance_after_transaction),
+            'description': leg.description,
+            'to_account_id': leg.to_account_id,
+            'posted_at': leg.created_at.isoformat(),
+        },
+    )
+
+
+def record(*legs):
+    """Add events for Transaction legs just inserted; call inside the posting's transaction"""
+    if legs and enabled():
+        OutboxEvent.objects.bulk_create([_event(leg) for leg in legs], batch_size=1000)
+
+
+def _publishable(rows, offset, now):
+    """The leading rows (in id order) that no uncommitted event can still precede"""
+    cutoff = now - settle_time()
+    expected = offset + 1
+    for index, row in enumerate(rows):
+        if row['id'] != expected and row['created_at'] > cutoff:
+            return rows[:index]
+        expected = row['id'] + 1
+    return rows
+
+
+def relay_batch(sink, consumer=DEFAULT_CONSUMER, batch_size=OUTBOX_BATCH_SIZE):
+    """Publish the consumer's next batch of events and move its offset; returns events published"""
+    # The locked offset row keeps two relays of one consumer from publishing the same batch
+    with transaction.atomic():
+        offset, _ = OutboxOffset.objects.select_for_update().get_or_create(consumer=consumer)
+        rows = list(OutboxEvent.objects.filter(id__gt=offset.last_event_id).order_by('id').values(
+            'id', 'payload', 'created_at')[:batch_size])
+        rows = _publishable(rows, offset.last_event_id, timezone.now())
+        if not rows:
+            return 0
+        sink.publish([{'event_id': row['id'], **row['payload']} for row in rows])
+        offset.last_event_id = rows[-1]['id']
+        offset.save(update_fields=['last_event_id', 'updated_at'])
+    return len(rows)
+
+
+def relay(sink, consumer=DEFAULT_CONSUMER, batch_size=OUTBOX_BATCH_SIZE, follow=False, interval=1.0,
+          progress=None):
+    """
+    Publish the consumer's events until none is ready; with follow, keep
+    polling every `interval` seconds instead. progress(published) is called
+    after each batch. Returns the number of events published.
+    """
+    published = 0
+    while True:
+        count = relay_batch(sink, consumer, batch_size)
+        published += count
+        if count and progress is not None:
+            progress(published)
+        if not count:
+            if not follow:
+                return published
+            time.sleep(interval)
+
+
+def replay(consumer, from_event_id):
+    """Move a consumer's offset back (or forward) so its next relay starts at from_event_id"""
+    OutboxOffset.objects.update_or_create(consumer=consumer, defaults={'last_event_id': from_event_id - 1})
+
+
+def purge(retention=None, batch_size=10000):
+    """
+    Delete events every consumer has published that are older than
+    `retention` (default: OUTBOX_RETENTION_DAYS), in batches. Returns the
+    number deleted.
+    """
+    if retention is None:
+        retention = timedelta(days=getattr(settings, 'OUTBOX_RETENTION_DAYS', 7))
+    published = OutboxOffset.objects.aggregate(low=Min('last_event_id'))['low']
+    if published is None:
+        return 0
+    old = OutboxEvent.objects.filter(id__lte=published, created_at__lt=timezone.now() - retention)
+    deleted = 0
+    while True:
+        ids = list(old.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += OutboxEvent.objects.filter(id__in=ids).delete()[0]
+
+
+def _line(event):
+    return json.dumps(event, separators=(',', ':')) + '\n'
+
+
+class JsonlSink:
+    """Append events to a JSON Lines file, fsynced after every batch"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def publish(self, events):
+        self.file.write(''.join(_line(event) for event in events))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class SocketSink:
+    """
+    Stream events as JSON lines to a TCP ("host:port") or Unix-domain (path)
+    socket. The listener does not acknowledge them; use a broker when
+    delivery has to be confirmed.
+    """
+
+    def __init__(self, address, timeout=10):
+        if address.startswith('/') or ':' not in address:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        else:
+            host, port = address.rsplit(':', 1)
+            self.sock = socket.create_connection((host, int(port)), timeout)
+
+    def publish(self, events):
+        self.sock.sendall(''.join(_line(event) for event in events).encode())
+
+    def close(self):
+        self.sock.close()
+
+
+class BrokerSink:
+    """
+    Adapter for a Kafka-style producer: one send(topic, key=, value=) per
+    event, keyed by account so each account's events stay in order, then a
+    flush() that returns once the broker has them.
+    """
+
+    def __init__(self, producer, topic='ledger.postings'):
+        self.producer = producer
+        self.topic = topic
+
+    def publish(self, events):
+        for event in events:
+            self.producer.send(self.topic, key=str(event['account_id']).encode(),
+                               value=json.dumps(event, separators=(',', ':')).encode())
+        self.producer.flush()
+
+    def close(self):
+        if hasattr(self.producer, 'close'):
+            self.producer.close()
+
+
+class LocalBroker:
+    """In-process stand-in for a broker producer; keeps (key, value) messages per topic"""
+
+    def __init__(self):
+        self.topics = defaultdict(list)
+
+    def send(self, topic, key=None, value=None):
+        self.topics[topic].append((key, value))
+
+    def flush(self):
+        pass
+
+
+def make_sink(spec):
+    """
+    Build a sink from a spec: ``jsonl:PATH``, ``socket:HOST:PORT``,
+    ``socket:/path/to.sock``, ``broker:dotted.path.to.producer_factory`` or
+    ``local`` (a LocalBroker).
+    """
+    kind, _, target = spec.partition(':')
+    topic = getattr(settings, 'OUTBOX_TOPIC', 'ledger.postings')
+    if kind == 'jsonl' and target:
+        return JsonlSink(target)
+    if kind == 'socket' and target:
+        return SocketSink(target)
+    if kind == 'broker' and target:
+        return BrokerSink(import_string(target)(), topic)
+    if kind == 'local':
+        return BrokerSink(LocalBroker(), topic)
+    raise ValueError(f'Unknown outbox sink: {spec!r}')
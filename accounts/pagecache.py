@@ -0,0 +1,102 @@
+"""
+Versioned page and fragment caching.
+
+Each account has a cache version token. Every change to what its dashboard
+shows (postings, profile and status changes) replaces the token once the
+change commits, and the dashboard's balance cards and recent-transactions
+table are cached as template fragments keyed on (account id, version). A
+stale fragment is therefore never served and never has to be deleted; it
+simply stops being looked up and ages out of the cache.
+
+Version tokens live in ``settings.PAGE_VERSION_CACHE``, which must be
+shared by every worker process (and never culled) for a bump to reach
+them all; the fragments themselves can stay in a per-process cache.
+
+The anonymous home page has no per-user content and is cached whole by
+``cache_anonymous_page``. Its key is the path alone, so query strings
+(tracking parameters, cache-busting junk) neither split nor flood the
+cache; views it decorates must not depend on the query string.
+"""
+import functools
+import uuid
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+
+def _cache():
+    return caches[getattr(settings, 'PAGE_CACHE', 'default')]
+
+
+def _versions():
+    return caches[getattr(settings, 'PAGE_VERSION_CACHE', 'default')]
+
+
+def _version_key(account_id):
+    return f'account_version:{account_id}'
+
+
+def _new_version():
+    # Random rather than a counter, so a version lost with an evicted key
+    # can never be handed out again
+    return uuid.uuid4().hex[:16]
+
+
+def account_version(account_id):
+    """Return the account's current cache version, creating one if needed"""
+    version = _versions().get(_version_key(account_id))
+    if version is None:
+        version = _new_version()
+        if not _versions().add(_version_key(account_id), version, None):
+            version = _versions().get(_version_key(account_id), version)
+    return version
+
+
+async def aaccount_version(account_id):
+    """Async variant of account_version()"""
+    version = await _versions().aget(_version_key(account_id))
+    if version is None:
+        version = _new_version()
+        if not await _versions().aadd(_version_key(account_id), version, None):
+            version = await _versions().aget(_version_key(account_id), version)
+    return version
+
+
+def bump_account_versions(account_ids):
+    """Give the accounts new cache versions, so pages cached for them are not reused"""
+    _versions().set_many({_version_key(account_id): _new_version() for account_id in account_ids}, None)
+
+
+def bump_on_commit(*account_ids):
+    """bump_account_versions() once the current transaction commits"""
+    transaction.on_commit(lambda: bump_account_versions(account_ids))
+
+
+def dashboard_context(version):
+    """Template context the dashboard's {% cache %} tags read"""
+    return {
+        'cache_alias': getattr(settings, 'PAGE_CACHE', 'default'),
+        'cache_timeout': getattr(settings, 'DASHBOARD_FRAGMENT_TIMEOUT', 3600),
+        'cache_version': version,
+    }
+
+
+def cache_anonymous_page(view):
+    """Serve a page from the cache to anonymous visitors without pending messages"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated or len(messages.get_messages(request)):
+            return view(request, *args, **kwargs)
+        key = f'anonymous_page:{request.path}'
+        cached = _cache().get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            _cache().set(key, (response.content, response['Content-Type']),
+                         getattr(settings, 'HOME_PAGE_CACHE_TIMEOUT', 300))
+        return response
+    return wrapper
@@ -0,0 +1,134 @@
+"""
+Keyset (cursor) pagination for long, time-ordered listings.
+
+Pages are fetched with ``WHERE (created_at, id) < (cursor)`` instead of
+``OFFSET``, so page 10,000 costs the same as page 1. The comparison is
+spelled ``created_at <= c AND (created_at < c OR id < pk)`` so every
+backend can use it as an index range bound. The exact total count is only
+computed when asked for. Cursors are opaque URL-safe strings carrying the
+boundary row's key and the direction of travel.
+
+``older`` querysets extend a listing past its main queryset, e.g. with
+archived rows (see accounts/archive.py). Each must hold only rows older
+than every row of the querysets before it; a page that runs past the end
+of one continues into the next.
+"""
+import base64
+import json
+from datetime import datetime
+from django.db.models import Q
+
+
+def encode_cursor(created_at, pk, direction):
+    payload = json.dumps([created_at.isoformat(), pk, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, pk, direction), or None for a missing or malformed cursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('next', 'prev'):
+            return None
+        return datetime.fromisoformat(created_at), int(pk), direction
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of results, newest first"""
+
+    def __init__(self, object_list, has_next, has_previous, total_count=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.total_count = total_count
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return ''
+        last = self.object_list[-1]
+        return encode_cursor(last.created_at, last.pk, 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous:
+            return ''
+        first = self.object_list[0]
+        return encode_cursor(first.created_at, first.pk, 'prev')
+
+
+class KeysetPaginator:
+    """Paginate a queryset (then any older querysets) by (created_at, id) descending"""
+
+    def __init__(self, queryset, per_page, count_total=False, older=()):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_total = count_total
+        self.older = list(older)
+
+    def _tiers(self, key):
+        tiers = [self.queryset, *self.older]
+        # Going back towards newer rows starts from the oldest tier
+        return tiers[::-1] if key is not None and key[2] == 'prev' else tiers
+
+    def _rows(self, queryset, key, limit):
+        if key is None:
+            return queryset.order_by('-created_at', '-id')[:limit]
+        created_at, pk, direction = key
+        if direction == 'next':
+            return (
+                queryset.filter(created_at__lte=created_at)
+                .filter(Q(created_at__lt=created_at) | Q(id__lt=pk))
+                .order_by('-created_at', '-id')[:limit]
+            )
+        return (
+            queryset.filter(created_at__gte=created_at)
+            .filter(Q(created_at__gt=created_at) | Q(id__gt=pk))
+            .order_by('created_at', 'id')[:limit]
+        )
+
+    def _page(self, key, rows, total_count):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if key is None:
+            return KeysetPage(rows, more, False, total_count)
+        if key[2] == 'next':
+            return KeysetPage(rows, more, True, total_count)
+        return KeysetPage(rows[::-1], True, more, total_count)
+
+    def get_page(self, cursor=None):
+        key = decode_cursor(cursor)
+        total_count = sum(queryset.count() for queryset in self._tiers(None)) if self.count_total else None
+        rows = []
+        for queryset in self._tiers(key):
+            rows += self._rows(queryset, key, self.per_page + 1 - len(rows))
+            if len(rows) > self.per_page:
+                break
+        return self._page(key, rows, total_count)
+
+    async def aget_page(self, cursor=None):
+        """Async variant of get_page()"""
+        key = decode_cursor(cursor)
+        total_count = None
+        if self.count_total:
+            total_count = sum([await queryset.acount() for queryset in self._tiers(None)])
+        rows = []
+        for queryset in self._tiers(key):
+            rows += [row async for row in self._rows(queryset, key, self.per_page + 1 - len(rows))]
+            if len(rows) > self.per_page:
+                break
+        return self._page(key, rows, total_count)
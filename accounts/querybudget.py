@@ -0,0 +1,66 @@
+"""
+Per-view query budgets.
+
+``@query_budget(n)`` counts the database queries a view runs (template
+rendering included) and reacts when the count exceeds ``n``, which is how a
+reintroduced N+1 shows up. ``settings.QUERY_BUDGET_MODE`` selects the
+reaction: ``'raise'`` (CI and tests), ``'warn'`` (log a warning) or
+``'off'``.
+"""
+import contextlib
+import functools
+import logging
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in 'raise' mode when a view runs more queries than its budget"""
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries and keeps their SQL"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+
+def query_budget(max_queries):
+    """Decorate a view with the maximum number of queries it may run"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+            if mode == 'off':
+                return view(request, *args, **kwargs)
+
+            counter = QueryCounter()
+            with contextlib.ExitStack() as stack:
+                # Replica reads count too
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                response = view(request, *args, **kwargs)
+                # Lazy querysets in templates run during rendering
+                if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                    response.render()
+            if counter.count > max_queries:
+                message = (f'{view.__name__} ran {counter.count} queries '
+                           f'(budget {max_queries}):\n' + '\n'.join(counter.queries))
+                if mode == 'raise':
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
@@ -0,0 +1,80 @@
+"""
+Query plan regression checks for the Transaction and ArchivedTransaction
+access paths.
+
+Each entry in ``planned_queries()`` mirrors a query issued by a view. The
+plans are captured with ``QuerySet.explain()`` and rejected when they show
+a full table scan or a sort that the composite indexes on Transaction
+should have made unnecessary. Run with ``manage.py check_query_plans``.
+"""
+import re
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from .models import Transaction, ArchivedTransaction, StandingInstruction
+
+
+def _sqlite_problems(plan):
+    problems = []
+    for line in plan.splitlines():
+        if 'USE TEMP B-TREE' in line:
+            problems.append('sort')
+        elif re.search(r'\bSCAN \w+\s*$', line):
+            problems.append('full scan')
+    return problems
+
+
+def _mysql_problems(plan):
+    problems = []
+    if re.search(r'"using_filesort":\s*true', plan):
+        problems.append('sort')
+    if re.search(r'"access_type":\s*"ALL"', plan):
+        problems.append('full scan')
+    return problems
+
+
+def _postgresql_problems(plan):
+    problems = []
+    if re.search(r'^\s*(->\s*)?Sort\b', plan, re.MULTILINE):
+        problems.append('sort')
+    if 'Seq Scan on accounts_transaction' in plan:
+        problems.append('full scan')
+    return problems
+
+
+PLAN_CHECKERS = {
+    'sqlite': (_sqlite_problems, {}),
+    'mysql': (_mysql_problems, {'format': 'JSON'}),
+    'postgresql': (_postgresql_problems, {}),
+}
+
+
+def planned_queries(account, transaction_type='Deposit'):
+    """Return {name: queryset} for the Transaction queries issued by the views (and the scheduler)"""
+    now = timezone.now()
+    return {
+        'dashboard': Transaction.objects.filter(account=account)[:5],
+        'transaction_history': Transaction.objects.filter(account=account).order_by('-created_at', '-id')[:11],
+        'transaction_history_deep': Transaction.objects.filter(account=account, created_at__lte=now).filter(
+            Q(created_at__lt=now) | Q(id__lt=0)).order_by('-created_at', '-id')[:11],
+        'all_transactions': Transaction.objects.order_by('-created_at', '-id')[:21],
+        'transactions_by_type': Transaction.objects.filter(
+            transaction_type=transaction_type).order_by('-created_at')[:20],
+        'incoming_transfers': Transaction.objects.filter(to_account=account).order_by('-created_at')[:20],
+        'archived_history': ArchivedTransaction.objects.filter(account=account).order_by('-created_at', '-id')[:11],
+        'archived_all_transactions': ArchivedTransaction.objects.order_by('-created_at', '-id')[:21],
+        'standing_instructions_due': StandingInstruction.objects.filter(
+            next_run_at__lte=now).order_by('next_run_at', 'id')[:1000],
+    }
+
+
+def explain_all(account):
+    """Return [(name, plan, problems)] for every planned query"""
+    if connection.vendor not in PLAN_CHECKERS:
+        raise ValueError(f'No plan checker for database vendor {connection.vendor!r}')
+    checker, explain_options = PLAN_CHECKERS[connection.vendor]
+    results = []
+    for name, queryset in planned_queries(account).items():
+        plan = queryset.explain(**explain_options)
+        results.append((name, plan, checker(plan)))
+    return results
@@ -0,0 +1,164 @@
+"""
+End-of-day reconciliation (``manage.py reconcile``).
+
+Checks that every account's stored ``Account.balance`` equals both the sum
+of its legs' signed amounts and the ``balance_after_transaction`` of its
+latest leg, archived legs included. ``verify_ledger`` only does the first
+check, on threads; this is the nightly job that covers the whole book.
+
+Accounts are split into id ranges of ``partition_size`` ids and each range
+is checked by a worker process with its own database connection, so
+building and comparing results is not limited to one core. Each range is
+one statement: stored and derived values cannot disagree because of a
+posting that commits in between.
+
+Results are streamed to a JSON Lines report as partitions finish: a
+``run`` header, one ``mismatch`` line per account that does not reconcile
+and a ``partition`` line per completed range, written after its
+mismatches. ``resume`` re-reads an interrupted report and only checks the
+ranges it has no ``partition`` line for.
+"""
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from django.db import connection, connections
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from .models import Account, Transaction, ArchivedTransaction
+
+
+PARTITION_SIZE = 5000
+
+
+def _archived_sum():
+    return Subquery(
+        ArchivedTransaction.objects.filter(account_id=OuterRef('pk')).order_by().values('account_id')
+        .annotate(total=Sum('signed_amount')).values('total')
+    )
+
+
+def _latest_balance(model):
+    return Subquery(
+        model.objects.filter(account_id=OuterRef('pk')).order_by('-created_at', '-id')
+        .values('balance_after_transaction')[:1]
+    )
+
+
+def partitions(partition_size=PARTITION_SIZE):
+    """[(first id, last id)] ranges covering every account, aligned to multiples of partition_size"""
+    bounds = Account.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    first = bounds['low'] // partition_size * partition_size
+    return [(low, low + partition_size - 1) for low in range(first, bounds['high'] + 1, partition_size)]
+
+
+def check_partition(bounds):
+    """Reconcile the accounts with ids in bounds; returns (bounds, accounts checked, [mismatch])"""
+    low, high = bounds
+    try:
+        rows = Account.objects.filter(id__gte=low, id__lte=high).order_by().values_list(
+            'id', 'account_number', 'balance').annotate(
+            derived=Sum('transactions__signed_amount'),
+            unsigned=Count('transactions', filter=Q(transactions__signed_amount__isnull=True)),
+            archived=_archived_sum(),
+            latest=_latest_balance(Transaction),
+            latest_archived=_latest_balance(ArchivedTransaction),
+        )
+        checked = 0
+        mismatches = []
+        for account_id, number, stored, derived, unsigned, archived, latest, latest_archived in rows:
+            checked += 1
+            # SQLite sums decimals as floats; round back to the column's scale
+            derived = ((derived or Decimal('0.00')) + (archived or Decimal('0.00'))).quantize(Decimal('0.01'))
+            latest = latest if latest is not None else latest_archived
+            latest = Decimal('0.00') if latest is None else latest
+            problems = []
+            if stored != derived:
+                problems.append('sum')
+            if stored != latest:
+                problems.append('latest')
+            if unsigned:
+                problems.append('unsigned')
+            if problems:
+                mismatches.append({
+                    'type': 'mismatch', 'account_id': account_id, 'account_number': number,
+                    'stored': str(stored), 'derived': str(derived), 'latest': str(latest),
+                    'unsigned': unsigned, 'problems': problems,
+                })
+        return bounds, checked, mismatches
+    finally:
+        connection.close()
+
+
+def read_report(path):
+    """Return (partition size, completed ranges, mismatches so far) from an existing report"""
+    partition_size, done, mismatches = None, set(), 0
+    with open(path) as report:
+        for line in report:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short when the run was interrupted
+                continue
+            if entry.get('type') == 'run':
+                partition_size = entry['partition_size']
+            elif entry.get('type') == 'partition':
+                done.add(tuple(entry['bounds']))
+                mismatches += entry['mismatches']
+    if partition_size is None:
+        raise ValueError(f'{path} is not a reconciliation report')
+    return partition_size, done, mismatches
+
+
+def _lines(*entries):
+    return ''.join(json.dumps(entry) + '\n' for entry in entries)
+
+
+def _ends_mid_line(path):
+    with open(path, 'rb') as report:
+        report.seek(0, 2)
+        if not report.tell():
+            return False
+        report.seek(-1, 2)
+        return report.read(1) != b'\n'
+
+
+def reconcile(report_path, workers=4, partition_size=PARTITION_SIZE, resume=False, progress=None):
+    """
+    Reconcile every account, writing the report to report_path; with resume,
+    continue an interrupted report instead. progress(partitions done,
+    partitions) is called as partitions finish. Returns a dict of totals.
+    """
+    done, mismatches, cut = set(), 0, False
+    if resume:
+        partition_size, done, mismatches = read_report(report_path)
+        cut = _ends_mid_line(report_path)
+    todo = [bounds for bounds in partitions(partition_size) if bounds not in done]
+    result = {'partitions': len(todo) + len(done), 'skipped': len(done), 'accounts': 0, 'mismatches': mismatches}
+
+    with open(report_path, 'a' if resume else 'w') as report:
+        if cut:
+            # Leave the line the interruption cut short on a line of its own
+            report.write('\n')
+        if not resume:
+            report.write(_lines({'type': 'run', 'partition_size': partition_size,
+                                 'started_at': timezone.now().isoformat()}))
+            report.flush()
+        # Workers are forked: close connections first so none is shared
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(check_partition, bounds) for bounds in todo]
+            for finished, future in enumerate(as_completed(futures), start=len(done) + 1):
+                bounds, checked, found = future.result()
+                # A partition's mismatches only count once its own line is
+                # written after them
+                report.write(_lines(*found, {'type': 'partition', 'bounds': list(bounds), 'accounts': checked,
+                                             'mismatches': len(found)}))
+                report.flush()
+                result['accounts'] += checked
+                result['mismatches'] += len(found)
+                if progress is not None:
+                    progress(finished, result['partitions'])
+    return result
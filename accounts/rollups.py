@@ -0,0 +1,134 @@
+"""
+Daily transaction rollups used by the admin dashboard and reports.
+
+Postings add to DailyTransactionSummary inside their own database
+transaction, so the summaries stay in step with the Transaction table
+without a full-table aggregate on every page load. ``rebuild()`` recomputes
+days from raw rows (catch-up after a bulk load, or repair) and
+``find_mismatches()`` is the consistency check behind
+``manage.py rollup_transactions --check``.
+"""
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Mod, TruncDate
+from django.utils import timezone
+from .models import Transaction, DailyTransactionSummary
+from . import archive
+
+
+SUMMARY_BUCKETS = 8
+
+
+def bucket_for(account_id):
+    return account_id % SUMMARY_BUCKETS
+
+
+def _add(day, transaction_type, account_type, bucket, amount, count):
+    rows = DailyTransactionSummary.objects.filter(
+        date=day, transaction_type=transaction_type, account_type=account_type, bucket=bucket
+    )
+    if rows.update(total_amount=F('total_amount') + amount, transaction_count=F('transaction_count') + count):
+        return
+    try:
+        with transaction.atomic():
+            DailyTransactionSummary.objects.create(
+                date=day, transaction_type=transaction_type, account_type=account_type,
+                bucket=bucket, total_amount=amount, transaction_count=count
+            )
+    except IntegrityError:
+        # Another posting created the row first
+        rows.update(total_amount=F('total_amount') + amount, transaction_count=F('transaction_count') + count)
+
+
+def record(account_id, account_type, transaction_type, amount):
+    """Add one posting to today's summary; call inside the posting's atomic block"""
+    _add(timezone.localdate(), transaction_type, account_type, bucket_for(account_id), amount, 1)
+
+
+def record_many(totals, day=None):
+    """Add {(account_id, account_type, transaction_type): (amount, count)} to a day's summary"""
+    day = day or timezone.localdate()
+    merged = {}
+    for (account_id, account_type, transaction_type), (amount, count) in totals.items():
+        key = (transaction_type, account_type, bucket_for(account_id))
+        total, seen = merged.get(key, (Decimal('0.00'), 0))
+        merged[key] = (total + amount, seen + count)
+    for (transaction_type, account_type, bucket), (amount, count) in merged.items():
+        _add(day, transaction_type, account_type, bucket, amount, count)
+
+
+def totals_by_type():
+    """Return {transaction_type: total amount} across all days"""
+    totals = {transaction_type: Decimal('0.00') for transaction_type, _ in Transaction.TRANSACTION_TYPE_CHOICES}
+    for row in DailyTransactionSummary.objects.order_by().values('transaction_type').annotate(
+            total=Sum('total_amount')):
+        totals[row['transaction_type']] = row['total'] or Decimal('0.00')
+    return totals
+
+
+def _raw_daily_totals(since=None, buckets=None):
+    """Recompute {(date, type, account_type, bucket): (amount, count)} from hot and archived rows"""
+    totals = {}
+    for rows in archive.legs():
+        rows = rows.order_by().annotate(day=TruncDate('created_at'), bucket=Mod('account_id', SUMMARY_BUCKETS))
+        if since:
+            rows = rows.filter(created_at__date__gte=since)
+        if buckets is not None:
+            rows = rows.filter(bucket__in=buckets)
+        for row in rows.values(
+                'day', 'transaction_type', 'account__account_type', 'bucket').annotate(
+                total=Sum('amount'), count=Count('id')):
+            key = (row['day'], row['transaction_type'], row['account__account_type'], int(row['bucket']))
+            amount, count = totals.get(key, (Decimal('0.00'), 0))
+            totals[key] = (amount + row['total'], count + row['count'])
+    return totals
+
+
+def _stored_daily_totals(since=None):
+    rows = DailyTransactionSummary.objects.all()
+    if since:
+        rows = rows.filter(date__gte=since)
+    return {
+        (row.date, row.transaction_type, row.account_type, row.bucket): (row.total_amount, row.transaction_count)
+        for row in rows
+    }
+
+
+def rebuild(since=None, buckets=None):
+    """
+    Replace summaries (from `since` onwards, or all) with totals recomputed
+    from raw rows, optionally only the rows of the given buckets. Safe on a live database: the summary rows are locked
+    before the raw rows are read, so a posting either commits before the
+    recount (and is counted in it) or waits to add to the rebuilt rows. On
+    MySQL the locking range read also blocks the insert of a new row in it.
+    """
+    with transaction.atomic():
+        stale = DailyTransactionSummary.objects.all()
+        if since:
+            stale = stale.filter(date__gte=since)
+        if buckets is not None:
+            stale = stale.filter(bucket__in=buckets)
+        list(stale.select_for_update().order_by('id').values_list('id', flat=True))
+        totals = _raw_daily_totals(since, buckets)
+        stale.delete()
+        DailyTransactionSummary.objects.bulk_create([
+            DailyTransactionSummary(
+                date=day, transaction_type=transaction_type, account_type=account_type,
+                bucket=bucket, total_amount=amount, transaction_count=count
+            )
+            for (day, transaction_type, account_type, bucket), (amount, count) in totals.items()
+        ], batch_size=1000)
+    return len(totals)
+
+
+def find_mismatches(since=None):
+    """Return [(key, stored, expected)] where summaries disagree with raw rows"""
+    expected = _raw_daily_totals(since)
+    stored = _stored_daily_totals(since)
+    empty = (Decimal('0.00'), 0)
+    return [
+        (key, stored.get(key, empty), expected.get(key, empty))
+        for key in sorted(set(expected) | set(stored), key=str)
+        if stored.get(key, empty) != expected.get(key, empty)
+    ]
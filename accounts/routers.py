@@ -0,0 +1,177 @@
+"""
+Read-replica routing.
+
+Reads go to the primary (``default``) unless the code runs inside
+``replica_reads()``; the read-heavy views (transaction history, statements,
+reports, admin listings and search) opt in with ``@use_replica``. Each
+scope picks one replica as it starts, round-robin over
+``settings.DATABASE_REPLICAS``, and every read in it goes there, so a page
+never mixes replicas that lag by different amounts. Replicas that failed a
+connection check within the last ``REPLICA_RETRY_AFTER`` seconds are
+skipped, and the scope reads from the primary when none is available.
+Writes, and every posting path, always use the primary.
+
+Replicas lag the primary, so after a client makes a non-GET request,
+``ReplicaPinMiddleware`` sets a short-lived cookie and that client's reads
+stay on the primary for ``REPLICA_PIN_SECONDS`` (read-your-writes).
+"""
+import contextlib
+import contextvars
+import functools
+import itertools
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+PIN_COOKIE = 'primary_pin'
+HEALTH_CHECK_INTERVAL = 5
+REPLICA_RETRY_AFTER = 30
+
+# The alias the current replica_reads() scope reads from, or None
+_replica = contextvars.ContextVar('replica', default=None)
+_down_until = {}
+_checked_at = {}
+_cycle_lock = threading.Lock()
+_cycle = None
+_cycle_aliases = None
+
+
+def _replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def _healthy(alias):
+    """
+    Check a replica's connection at most every HEALTH_CHECK_INTERVAL seconds,
+    remembering failures for REPLICA_RETRY_AFTER seconds.
+    """
+    now = time.monotonic()
+    if _down_until.get(alias, 0) > now:
+        return False
+    if now - _checked_at.get(alias, float('-inf')) < HEALTH_CHECK_INTERVAL:
+        return True
+    connection = connections[alias]
+    try:
+        if connection.connection is None or not connection.is_usable():
+            connection.close()
+            connection.ensure_connection()
+    except DatabaseError:
+        _down_until[alias] = now + REPLICA_RETRY_AFTER
+        return False
+    _checked_at[alias] = now
+    return True
+
+
+def choose_replica():
+    """Return the next healthy replica alias, or the primary if there is none"""
+    global _cycle, _cycle_aliases
+    aliases = _replicas()
+    if not aliases:
+        return DEFAULT_DB_ALIAS
+    with _cycle_lock:
+        if _cycle_aliases != aliases:
+            _cycle, _cycle_aliases = itertools.cycle(range(len(aliases))), aliases
+        start = next(_cycle)
+    # Each call starts one replica further on, trying the rest in order after it
+    for alias in aliases[start:] + aliases[:start]:
+        if _healthy(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+@contextlib.contextmanager
+def _reads_on(alias):
+    token = _replica.set(alias)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def replica_reads(enabled=True):
+    """Send ORM reads inside the block to one replica, picked as the block starts"""
+    # Nested scopes keep the replica of the outer one
+    return _reads_on((_replica.get() or choose_replica()) if enabled else None)
+
+
+def iter_on_replica(iterable):
+    """
+    Iterate with replica reads, for StreamingHttpResponse content that is
+    consumed after the view (and its replica_reads() block) has returned.
+    Every item is read from the same replica.
+    """
+    iterator = iter(iterable)
+    alias = choose_replica()
+    while True:
+        with _reads_on(alias):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def use_replica(view):
+    """Serve a read-only view from a replica unless the client recently wrote"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_reads(not is_pinned(request)):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(not is_pinned(request)):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Database router: primary for writes, replicas for reads inside replica_reads()"""
+
+    def db_for_read(self, model, **hints):
+        # Reads inside a primary transaction must see its own writes
+        alias = _replica.get()
+        if alias and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+class ReplicaPinMiddleware:
+    """Keep a client's reads on the primary for a short window after it writes"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and _replicas():
+            response.set_cookie(PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,152 @@
+"""
+Indexed customer and transaction search.
+
+Customers are searched through CustomerSearchTerm, a table of lower-cased
+tokens (names, username, email, phone, account number) kept in step by the
+views and admin actions that change them. Each query word must be a prefix
+of one of a customer's tokens; matches are ranked by token weight, with
+exact token matches counting double. The database intersects the words
+before anything is read back, and at most CANDIDATE_LIMIT index entries of
+customers matching every word are ranked (the first ones in term order of
+the longest word, so exact matches of it come first). Prefixes are looked
+up as ``term >= 'abc' AND term < 'abc\\uffff'`` so they are index range
+scans on every backend, unlike ``LIKE '%abc%'``.
+
+Transactions are matched by transaction-id prefix on its unique index, or
+by every customer matching the words (unranked, so without a cap).
+"""
+import re
+from django.db import transaction
+from django.db.models import Q
+from .models import Customer, Account, CustomerSearchTerm
+
+
+MAX_RESULTS = 100
+MAX_WORDS = 5
+# Index entries of customers matching every query word that are ranked
+CANDIDATE_LIMIT = 1000
+# Sorts after every character that can appear in a token
+HIGH_CHAR = '\uffff'
+
+WEIGHTS = {
+    'account_number': 5,
+    'username': 4,
+    'phone': 3,
+    'last_name': 2,
+    'first_name': 2,
+    'email': 1,
+}
+
+_word_re = re.compile(r'[\w@.+-]+')
+
+
+def query_words(query):
+    """Split a search string into lower-cased words"""
+    return _word_re.findall(query.lower())[:MAX_WORDS]
+
+
+def _prefix(field, word):
+    return Q(**{f'{field}__gte': word, f'{field}__lt': word + HIGH_CHAR})
+
+
+def customer_terms(customer, user, account_number=None):
+    """Return the {term: weight} tokens for a customer"""
+    values = {
+        'account_number': [account_number or ''],
+        'username': [user.username],
+        'phone': [re.sub(r'\D', '', customer.phone)],
+        'last_name': user.last_name.split(),
+        'first_name': user.first_name.split(),
+        'email': [user.email, user.email.split('@')[0]],
+    }
+    terms = {}
+    for field, tokens in values.items():
+        for token in tokens:
+            token = token.lower()[:150]
+            if token:
+                terms[token] = max(terms.get(token, 0), WEIGHTS[field])
+    return terms
+
+
+def index_customers(customers):
+    """(Re)build search terms for customers; each needs user and account loaded or loadable"""
+    customers = list(customers)
+    rows = []
+    for customer in customers:
+        try:
+            account_number = customer.account.account_number
+        except Account.DoesNotExist:
+            account_number = None
+        rows.extend(
+            CustomerSearchTerm(customer_id=customer.id, term=term, weight=weight)
+            for term, weight in customer_terms(customer, customer.user, account_number).items()
+        )
+    with transaction.atomic():
+        CustomerSearchTerm.objects.filter(customer_id__in=[customer.id for customer in customers]).delete()
+        CustomerSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+
+def index_customer(customer_id):
+    """Re-index one customer after a write that changes searchable fields"""
+    index_customers(Customer.objects.select_related('user', 'account').filter(id=customer_id))
+
+
+def _matching_terms(words):
+    """Search terms matching the first word, of customers with a term matching each of the other words"""
+    terms = CustomerSearchTerm.objects.filter(_prefix('term', words[0]))
+    for word in words[1:]:
+        terms = terms.filter(customer_id__in=CustomerSearchTerm.objects.filter(_prefix('term', word)).values(
+            'customer_id'))
+    return terms
+
+
+def matching_customer_ids(query, limit=MAX_RESULTS):
+    """Return customer ids matching every word of the query, best match first"""
+    # The longest word is usually the most selective one to walk the index from
+    words = sorted(set(query_words(query)), key=len, reverse=True)
+    if not words:
+        return []
+    best = {}
+
+    def add(customer_id, word, term, weight):
+        score = weight * 2 if term == word else weight
+        best[customer_id, word] = max(best.get((customer_id, word), 0), score)
+
+    for customer_id, term, weight in _matching_terms(words).order_by('term', 'customer_id').values_list(
+            'customer_id', 'term', 'weight')[:CANDIDATE_LIMIT]:
+        add(customer_id, words[0], term, weight)
+    if best and len(words) > 1:
+        # Score the other words for the candidates only
+        condition = Q()
+        for word in words[1:]:
+            condition |= _prefix('term', word)
+        rows = CustomerSearchTerm.objects.filter(condition, customer_id__in={key[0] for key in best})
+        for customer_id, term, weight in rows.values_list('customer_id', 'term', 'weight'):
+            for word in words[1:]:
+                if term.startswith(word):
+                    add(customer_id, word, term, weight)
+    scores = {}
+    for (customer_id, word), score in best.items():
+        scores[customer_id] = scores.get(customer_id, 0) + score
+    return sorted(scores, key=lambda customer_id: (-scores[customer_id], -customer_id))[:limit]
+
+
+def search_customers(query, queryset=None, limit=MAX_RESULTS):
+    """Return a ranked list of customers matching the query"""
+    ids = matching_customer_ids(query, limit)
+    queryset = Customer.objects.all() if queryset is None else queryset
+    by_id = queryset.in_bulk(ids)
+    return [by_id[customer_id] for customer_id in ids if customer_id in by_id]
+
+
+def filter_transactions(queryset, query):
+    """Restrict a Transaction queryset to a transaction-id prefix or matching customers"""
+    query = query.strip()
+    if not query:
+        return queryset
+    condition = _prefix('transaction_id', query.upper())
+    words = query_words(query)
+    if words:
+        condition |= Q(account_id__in=Account.objects.filter(
+            customer_id__in=_matching_terms(words).values('customer_id')).values('id'))
+    return queryset.filter(condition)
@@ -0,0 +1,217 @@
+"""
+Synthetic bank data for load tests and benchmarks (``manage.py seed_bank``).
+
+Generates customers with accounts and a ledger history that is internally
+consistent: every account opens with an initial deposit, postings are
+spread in time order over the last ``days`` days, withdrawals and transfers
+never overdraw, transfer legs carry the same descriptions and
+counter-accounts ``ledger.transfer()`` writes, and each account's stored
+balance equals the sum of its legs, so ``verify_ledger`` passes. Daily
+summaries, search terms and balance snapshots are rebuilt afterwards.
+
+Rows are written with ``bulk_create`` in batches; transaction ids and
+account numbers come straight from the id generator instead of per-row
+``save()``. Seeded users are named ``<prefix><n>`` (default ``seed_``) and
+all share the password ``SEED_PASSWORD``.
+"""
+import collections
+import contextlib
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import Min
+from django.utils import timezone
+from .models import Customer, Account, Transaction
+from .ids import new_account_number, new_transaction_id
+from . import archive, balances, rollups, search
+
+
+SEED_PREFIX = 'seed_'
+SEED_PASSWORD = 'seed-password'
+CENT = Decimal('0.01')
+
+FIRST_NAMES = ('Aarav', 'Priya', 'Rahul', 'Anita', 'Vikram', 'Sneha', 'Kiran', 'Meera',
+               'Rohan', 'Divya', 'Arjun', 'Kavya', 'Sanjay', 'Pooja', 'Nikhil', 'Lakshmi')
+LAST_NAMES = ('Sharma', 'Iyer', 'Patel', 'Reddy', 'Nair', 'Gupta', 'Das', 'Khan',
+              'Menon', 'Joshi', 'Rao', 'Singh', 'Mehta', 'Pillai', 'Bose', 'Kulkarni')
+CITIES = (('Mumbai', 'Maharashtra', '400001'), ('Bengaluru', 'Karnataka', '560001'),
+          ('Chennai', 'Tamil Nadu', '600001'), ('Kolkata', 'West Bengal', '700001'),
+          ('Hyderabad', 'Telangana', '500001'), ('Pune', 'Maharashtra', '411001'),
+          ('New Delhi', 'Delhi', '110001'), ('Kochi', 'Kerala', '682001'))
+DEPOSIT_DESCRIPTIONS = ('Salary credit', 'Cash deposit', 'Cheque deposit', 'Refund', 'Interest')
+WITHDRAW_DESCRIPTIONS = ('ATM withdrawal', 'Card payment', 'Bill payment', 'Rent', 'Groceries')
+TRANSFER_DESCRIPTIONS = ('Rent share', 'Loan repayment', 'Gift', 'Dinner', 'Fees')
+# Share of postings that are deposits and withdrawals; the rest are transfers
+DEPOSIT_SHARE = 0.45
+WITHDRAW_SHARE = 0.35
+
+
+@contextlib.contextmanager
+def explicit_created_at(*models):
+    """Let bulk_create() keep the created_at values set on the rows"""
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _amount(rng, mu, sigma, cap):
+    return min(Decimal(str(round(rng.lognormvariate(mu, sigma), 2))), cap).quantize(CENT) or CENT
+
+
+def create_customers(count, start, end, rng, prefix=SEED_PREFIX, batch_size=5000):
+    """
+    Bulk-create approved customers with accounts opened between start and
+    end; returns [(account_id, account_number, opened_at)].
+    """
+    offset = User.objects.filter(username__startswith=prefix).count()
+    password = make_password(SEED_PASSWORD)
+    span = (end - start).total_seconds()
+    created = []
+    for batch_start in range(0, count, batch_size):
+        numbers = range(offset + batch_start, offset + min(batch_start + batch_size, count))
+        opened = sorted(start + timedelta(seconds=rng.uniform(0, span)) for _ in numbers)
+        users = []
+        for n, opened_at in zip(numbers, opened):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            users.append(User(
+                username=f'{prefix}{n}', first_name=first, last_name=last, password=password,
+                email=f'{first.lower()}.{last.lower()}.{n}@example.com', date_joined=opened_at,
+            ))
+        User.objects.bulk_create(users)
+        # Not every backend returns bulk-inserted primary keys, so read them back
+        users = list(User.objects.filter(username__in=[user.username for user in users]).order_by('date_joined'))
+
+        customers = []
+        for user in users:
+            city, state, pincode = rng.choice(CITIES)
+            customers.append(Customer(
+                user=user, phone=f'9{rng.randrange(10 ** 9):09d}', address=f'{rng.randint(1, 999)} Main Road',
+                city=city, state=state, pincode=pincode, is_approved=rng.random() < 0.97,
+                created_at=user.date_joined,
+            ))
+        with explicit_created_at(Customer, Account):
+            Customer.objects.bulk_create(customers)
+            customers = list(Customer.objects.filter(user__in=users).select_related('user'))
+            Account.objects.bulk_create([
+                Account(customer=customer, account_number=new_account_number(),
+                        account_type='Current' if rng.random() < 0.2 else 'Saving',
+                        created_at=customer.created_at)
+                for customer in customers
+            ])
+        search.index_customers(Customer.objects.filter(user__in=users).select_related('user', 'account'))
+        created.extend(Account.objects.filter(customer__in=customers).values_list(
+            'id', 'account_number', 'created_at'))
+    return created
+
+
+def create_transactions(accounts, count, start, end, rng, batch_size=10000):
+    """
+    Post an opening deposit per account, then `count` random postings
+    between start and end. Returns the number of ledger rows written and
+    the final balance per account id.
+    """
+    balance = {}
+    rows = []
+    written = 0
+
+    def leg(account_id, transaction_type, amount, signed, created_at, description, to_account_id=None):
+        nonlocal rows, written
+        balance[account_id] += signed
+        rows.append(Transaction(
+            transaction_id=new_transaction_id(), account_id=account_id, transaction_type=transaction_type,
+            amount=amount, signed_amount=signed, balance_after_transaction=balance[account_id],
+            description=description, created_at=created_at, to_account_id=to_account_id,
+        ))
+        if len(rows) >= batch_size:
+            Transaction.objects.bulk_create(rows, batch_size=batch_size)
+            written += len(rows)
+            rows = []
+
+    opening = collections.deque(sorted(accounts, key=lambda account: account[2]))
+    numbers = {account_id: number for account_id, number, _ in accounts}
+    if opening:
+        # No postings before the first account opens
+        start = max(start, opening[0][2])
+    # Exponential gaps give `count` postings in time order on average over the span
+    rate = count / max((end - start).total_seconds(), 1)
+    at = start
+    opened = []
+
+    with explicit_created_at(Transaction):
+        for _ in range(count):
+            at = min(at + timedelta(seconds=rng.expovariate(rate)), end)
+            # Open every account whose opening date has passed
+            while opening and opening[0][2] <= at:
+                account_id, _, opened_at = opening.popleft()
+                balance[account_id] = Decimal('0.00')
+                amount = _amount(rng, 8, 0.8, Decimal('100000.00')).max(Decimal('500.00'))
+                leg(account_id, 'Deposit', amount, amount, opened_at, 'Initial deposit')
+                opened.append(account_id)
+            if not opened:
+                continue
+
+            account_id = rng.choice(opened)
+            kind = rng.random()
+            if kind < DEPOSIT_SHARE or balance[account_id] < 1:
+                amount = _amount(rng, 8, 1.1, Decimal('500000.00'))
+                leg(account_id, 'Deposit', amount, amount, at, rng.choice(DEPOSIT_DESCRIPTIONS))
+                continue
+            amount = min(_amount(rng, 7, 1.2, Decimal('200000.00')), balance[account_id])
+            if kind < DEPOSIT_SHARE + WITHDRAW_SHARE or len(opened) < 2:
+                leg(account_id, 'Withdraw', amount, -amount, at, rng.choice(WITHDRAW_DESCRIPTIONS))
+                continue
+            to_id = rng.choice(opened)
+            while to_id == account_id:
+                to_id = rng.choice(opened)
+            description = rng.choice(TRANSFER_DESCRIPTIONS)
+            leg(account_id, 'Transfer', amount, -amount, at, f'Transfer to {numbers[to_id]} - {description}', to_id)
+            leg(to_id, 'Transfer', amount, amount, at, f'Transfer from {numbers[account_id]} - {description}',
+                account_id)
+
+        # Accounts opened after the last posting
+        for account_id, _, opened_at in opening:
+            balance[account_id] = Decimal('0.00')
+            amount = _amount(rng, 8, 0.8, Decimal('100000.00')).max(Decimal('500.00'))
+            leg(account_id, 'Deposit', amount, amount, opened_at, 'Initial deposit')
+        Transaction.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    return written, balance
+
+
+def seed(customers, transactions, days=365, prefix=SEED_PREFIX, random_seed=None, batch_size=10000):
+    """
+    Generate `customers` customers and `transactions` postings over the last
+    `days` days. Returns a dict of row counts.
+    """
+    rng = random.Random(random_seed)
+    end = timezone.now()
+    start = end - timedelta(days=days)
+    accounts = create_customers(customers, start, start + (end - start) / 2, rng, prefix)
+    rows, final = create_transactions(accounts, transactions, start, end, rng, batch_size)
+
+    updated = [Account(id=account_id, balance=amount) for account_id, amount in final.items()]
+    Account.objects.bulk_update(updated, ['balance'], batch_size=1000)
+    rollups.rebuild(since=timezone.localdate(start))
+    snapshots = balances.take_snapshots(list(final))
+    return {'customers': len(accounts), 'transactions': rows, 'snapshots': snapshots}
+
+
+def clear(prefix=SEED_PREFIX):
+    """Delete seeded users and everything hanging off them; returns users deleted"""
+    users = User.objects.filter(username__startswith=prefix)
+    earliest = min(filter(None, (
+        legs.aggregate(earliest=Min('created_at'))['earliest']
+        for legs in archive.legs(account__customer__user__in=users)
+    )), default=None)
+    deleted = users.count()
+    users.delete()
+    if earliest is not None:
+        rollups.rebuild(since=timezone.localdate(earliest))
+    return deleted
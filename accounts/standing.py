@@ -0,0 +1,223 @@
+"""
+Standing instructions: recurring transfers (``manage.py run_standing_instructions``).
+
+A ``StandingInstruction`` is due once its ``next_run_at`` has passed. The
+scheduler picks due instructions through the ``(next_run_at, id)`` index
+(inactive ones have none), ``STANDING_BATCH_SIZE`` at a time, and executes each batch in
+one transaction the way batch files are posted: one locking read of every
+account the batch touches (in id order, like ``ledger``), instructions
+applied per source account against the balances read, a few ``CASE``
+UPDATEs for the net deltas and a ``bulk_create`` of the transfer legs.
+Instruction rows are locked with ``SKIP LOCKED`` where the database
+supports it, so several schedulers can run side by side without picking
+the same instructions.
+
+An instruction that finds too little money is retried every
+``STANDING_RETRY_MINUTES`` up to ``STANDING_MAX_ATTEMPTS`` attempts; after
+that the occurrence is skipped and the next one scheduled. Instructions
+whose accounts have been deactivated, or that would pay the account they
+draw on, are switched off. An occurrence missed
+while the scheduler was down still runs, one batch pass per occurrence.
+Like batch files, standing instructions are authorised up front and are not
+counted against velocity limits.
+"""
+import calendar
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Account, Transaction, StandingInstruction
+from .ids import new_transaction_id
+from . import ledger, outbox, pagecache, rollups
+
+
+STANDING_BATCH_SIZE = 1000
+# Instructions per schedule UPDATE statement
+UPDATE_BATCH_SIZE = 500
+UPDATED_FIELDS = ('scheduled_for', 'next_run_at', 'attempts', 'is_active', 'last_run_at',
+                  'last_transaction_id', 'last_error')
+
+
+def retry_delay():
+    return timedelta(minutes=getattr(settings, 'STANDING_RETRY_MINUTES', 60))
+
+
+def max_attempts():
+    return getattr(settings, 'STANDING_MAX_ATTEMPTS', 3)
+
+
+def next_occurrence(frequency, starts_at, scheduled_for):
+    """The occurrence after scheduled_for, at the same local time of day"""
+    local = timezone.localtime(scheduled_for)
+    if frequency == 'Daily':
+        following = local + timedelta(days=1)
+    elif frequency == 'Weekly':
+        following = local + timedelta(days=7)
+    elif frequency == 'Monthly':
+        year, month = (local.year + 1, 1) if local.month == 12 else (local.year, local.month + 1)
+        # The 31st of every month falls on the 30th in April, not on the 30th for ever after
+        day = min(timezone.localtime(starts_at).day, calendar.monthrange(year, month)[1])
+        following = local.replace(year=year, month=month, day=day)
+    else:
+        raise ValueError(f'Unknown frequency: {frequency!r}')
+    return timezone.make_aware(following.replace(tzinfo=None))
+
+
+def _advance(instruction):
+    instruction.scheduled_for = next_occurrence(instruction.frequency, instruction.starts_at,
+                                                instruction.scheduled_for)
+    instruction.next_run_at = instruction.scheduled_for
+    instruction.attempts = 0
+    if instruction.ends_on and timezone.localdate(instruction.scheduled_for) > instruction.ends_on:
+        instruction.is_active = False
+        instruction.next_run_at = None
+
+
+def _save_schedules(instructions):
+    """
+    Write UPDATED_FIELDS back for every instruction with one CASE UPDATE per
+    UPDATE_BATCH_SIZE rows. bulk_update() produces the same statement but
+    resolves an expression per row and field, which costs more than the
+    postings themselves.
+    """
+    meta = StandingInstruction._meta
+    quote = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in UPDATED_FIELDS]
+    for start in range(0, len(instructions), UPDATE_BATCH_SIZE):
+        batch = instructions[start:start + UPDATE_BATCH_SIZE]
+        whens = ' '.join(['WHEN %s THEN %s'] * len(batch))
+        assignments, params = [], []
+        for field in fields:
+            assignments.append(f'{quote(field.column)} = CASE {quote(meta.pk.column)} {whens} END')
+            for instruction in batch:
+                params += [instruction.pk, field.get_db_prep_save(getattr(instruction, field.attname), connection)]
+        placeholders = ', '.join(['%s'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {quote(meta.db_table)} SET {", ".join(assignments)} '
+                f'WHERE {quote(meta.pk.column)} IN ({placeholders})',
+                params + [instruction.pk for instruction in batch],
+            )
+
+
+def run_batch(now, batch_size=STANDING_BATCH_SIZE):
+    """
+    Execute up to batch_size instructions due at `now` in one transaction.
+    Returns a dict counting them as picked, posted, retried, skipped (out of
+    retries) and stopped (an account was deactivated, or the instruction pays
+    its own account).
+    """
+    result = {'picked': 0, 'posted': 0, 'retried': 0, 'skipped': 0, 'stopped': 0}
+    with transaction.atomic():
+        due = list(
+            StandingInstruction.objects.select_for_update(skip_locked=True)
+            .filter(next_run_at__lte=now)
+            .order_by('next_run_at', 'id')[:batch_size]
+        )
+        if not due:
+            return result
+        result['picked'] = len(due)
+        account_ids = {account_id for instruction in due for account_id in (instruction.account_id,
+                                                                           instruction.to_account_id)}
+        accounts = {
+            account.id: account
+            for account in Account.objects.select_for_update()
+            .filter(id__in=account_ids)
+            .order_by('id')
+            .only('id', 'account_number', 'account_type', 'balance', 'is_active')
+        }
+        balances = {account_id: account.balance for account_id, account in accounts.items()}
+        deltas = {}
+        totals = {}
+        rows = []
+
+        def post(account, amount, delta, description, to_account):
+            balances[account.id] += delta
+            deltas[account.id] = deltas.get(account.id, Decimal('0.00')) + delta
+            key = (account.id, account.account_type, 'Transfer')
+            total, count = totals.get(key, (Decimal('0.00'), 0))
+            totals[key] = (total + amount, count + 1)
+            row = Transaction(
+                transaction_id=new_transaction_id(),
+                account_id=account.id,
+                transaction_type='Transfer',
+                amount=amount,
+                balance_after_transaction=balances[account.id],
+                signed_amount=delta,
+                description=description,
+                to_account_id=to_account.id,
+            )
+            rows.append(row)
+            return row
+
+        # Per source account, oldest occurrence first
+        for instruction in sorted(due, key=lambda item: (item.account_id, item.scheduled_for, item.id)):
+            instruction.last_run_at = now
+            source, target = accounts[instruction.account_id], accounts[instruction.to_account_id]
+            amount = instruction.amount
+            if source.id == target.id:
+                # Rows from before standing_distinct_accounts existed
+                instruction.is_active = False
+                instruction.next_run_at = None
+                instruction.last_error = 'Source and destination are the same account'
+                result['stopped'] += 1
+                continue
+            if not (source.is_active and target.is_active):
+                instruction.is_active = False
+                instruction.next_run_at = None
+                instruction.last_error = 'Account inactive'
+                result['stopped'] += 1
+                continue
+            if balances[source.id] < amount:
+                instruction.attempts += 1
+                if instruction.attempts < max_attempts():
+                    instruction.next_run_at = now + retry_delay()
+                    instruction.last_error = 'Insufficient balance, will retry'
+                    result['retried'] += 1
+                else:
+                    _advance(instruction)
+                    instruction.last_error = 'Insufficient balance, occurrence skipped'
+                    result['skipped'] += 1
+                continue
+            description = instruction.description or 'Standing instruction'
+            debit = post(source, amount, -amount, f'Transfer to {target.account_number} - {description}', target)
+            post(target, amount, amount, f'Transfer from {source.account_number} - {description}', source)
+            instruction.last_transaction_id = debit.transaction_id
+            instruction.last_error = ''
+            _advance(instruction)
+            result['posted'] += 1
+
+        ledger.apply_deltas(deltas)
+        rollups.record_many(totals)
+        pagecache.bump_on_commit(*deltas)
+        Transaction.objects.bulk_create(rows, batch_size=1000)
+        outbox.record(*rows)
+        _save_schedules(due)
+    return result
+
+
+def run_due(now=None, batch_size=STANDING_BATCH_SIZE, progress=None):
+    """
+    Execute every instruction due at `now` (default: the current time),
+    batch by batch, until none is left. progress(totals) is called after
+    each batch. Returns the totals.
+    """
+    now = now or timezone.now()
+    totals = {'picked': 0, 'posted': 0, 'retried': 0, 'skipped': 0, 'stopped': 0}
+    while True:
+        result = run_batch(now, batch_size)
+        if not result['picked']:
+            return totals
+        for key, value in result.items():
+            totals[key] += value
+        if progress is not None:
+            progress(totals)
+
+
+def run_forever(interval=60, batch_size=STANDING_BATCH_SIZE, progress=None):
+    """Run due instructions every `interval` seconds; never returns"""
+    while True:
+        run_due(batch_size=batch_size, progress=progress)
+        time.sleep(interval)
@@ -0,0 +1,157 @@
+"""
+Account statement export.
+
+Statements are streamed: rows are read in keyset batches of
+``EXPORT_BATCH_SIZE`` ordered by (created_at, id) on the per-account index,
+formatted and yielded one at a time, so memory stays flat however many
+years are exported. Keyset batches are used instead of
+``QuerySet.iterator()`` because the MySQL driver buffers a whole result set
+client-side. Archived rows (see accounts/archive.py) are older than every
+hot row, so they are read first. The running balance is carried forward
+from the opening balance, derived from the ledger as of the start of the
+range.
+"""
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils import timezone
+from .balances import balance_at
+from . import archive
+
+
+EXPORT_BATCH_SIZE = 2000
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+COLUMNS = ['date', 'transaction_id', 'type', 'description', 'debit', 'credit', 'balance']
+
+
+def parse_params(params):
+    """Return (start, end, fmt) from request parameters; raises ValueError if invalid"""
+    fmt = params.get('format') or 'csv'
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt!r}.')
+    start = date.fromisoformat(params['start']) if params.get('start') else None
+    end = date.fromisoformat(params['end']) if params.get('end') else None
+    if start and end and start > end:
+        raise ValueError('Start date is after end date.')
+    return start, end, fmt
+
+
+def day_start(day):
+    """Return the aware datetime at which a local date begins"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _in_range(queryset, start, end):
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=day_start(start))
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=day_start(end + timedelta(days=1)))
+    return queryset
+
+
+def opening_balance(account_id, start):
+    """Balance before the first transaction on or after `start`, derived from the ledger"""
+    if start is None:
+        return Decimal('0.00')
+    return balance_at(account_id, day_start(start) - timedelta(microseconds=1))
+
+
+def iter_transactions(account_id, start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield (id, created_at, transaction_id, type, description, amount, signed_amount, balance_after) oldest first"""
+    for legs in archive.legs(account_id=account_id):
+        rows = _in_range(legs, start, end).values_list(
+            'id', 'created_at', 'transaction_id', 'transaction_type', 'description',
+            'amount', 'signed_amount', 'balance_after_transaction',
+        ).order_by('created_at', 'id')
+        batch = list(rows[:batch_size])
+        while batch:
+            yield from batch
+            if len(batch) < batch_size:
+                break
+            pk, created_at = batch[-1][0], batch[-1][1]
+            batch = list(
+                rows.filter(created_at__gte=created_at)
+                .filter(Q(created_at__gt=created_at) | Q(id__gt=pk))[:batch_size]
+            )
+
+
+def statement_lines(account_id, start=None, end=None):
+    """Yield statement entries as dicts with a running balance"""
+    balance = opening_balance(account_id, start)
+    for _, created_at, transaction_id, transaction_type, description, amount, signed_amount, balance_after in (
+            iter_transactions(account_id, start, end)):
+        if signed_amount is not None:
+            debit = signed_amount < 0
+        elif transaction_type == 'Deposit':
+            debit = False
+        elif transaction_type == 'Withdraw':
+            debit = True
+        else:
+            # Legacy transfer legs: the stored balance tells which side this is
+            debit = balance_after == balance - amount
+        balance = balance - amount if debit else balance + amount
+        yield {
+            'date': timezone.localtime(created_at).isoformat(),
+            'transaction_id': transaction_id,
+            'type': transaction_type,
+            'description': description,
+            'debit': str(amount) if debit else '',
+            'credit': '' if debit else str(amount),
+            'balance': str(balance),
+        }
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(lines):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for line in lines:
+        yield writer.writerow([line[column] for column in COLUMNS])
+
+
+def render_jsonl(lines):
+    for line in lines:
+        yield json.dumps(line, ensure_ascii=False) + '\n'
+
+
+def render(lines, fmt):
+    """Return an iterator of text chunks for the statement in the given format"""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown statement format {fmt!r}')
+    return render_csv(lines) if fmt == 'csv' else render_jsonl(lines)
+
+
+def filename(account_number, fmt, start=None, end=None):
+    period = f'_{start or "start"}_{end or "today"}' if start or end else ''
+    return f'statement_{account_number}{period}.{FORMATS[fmt][1]}'
+
+
+def _take(iterator, count):
+    return [part for _, part in zip(range(count), iterator)]
+
+
+async def astream(chunks, block_size=500):
+    """
+    Async iterator over a sync statement iterator, for StreamingHttpResponse
+    under ASGI (which would otherwise read a sync iterator to the end before
+    sending anything). Pulls `block_size` chunks per thread hop.
+    """
+    iterator = iter(chunks)
+    while True:
+        block = await sync_to_async(_take)(iterator, block_size)
+        if not block:
+            return
+        for part in block:
+            yield part
@@ -0,0 +1,26 @@
+"""Fixtures shared by the accounts test modules"""
+from decimal import Decimal
+from django.contrib.auth.models import User
+from accounts.middleware import invalidate_account_ref
+from accounts.models import Customer, Account
+
+
+# A valid registration form submission
+REGISTRATION = {
+    'username': 'carol', 'first_name': 'Carol', 'last_name': 'Doe', 'email': 'carol@example.com',
+    'password1': 'a-long-test-password', 'password2': 'a-long-test-password', 'phone': '9000000000',
+    'address': 'Test', 'city': 'Test', 'state': 'Test', 'pincode': '000000', 'account_type': 'Saving',
+    'initial_deposit': '750.00',
+}
+
+
+def create_account(username, balance=Decimal('0.00'), account_type='Saving', is_approved=True):
+    """An approved customer with one account holding `balance`"""
+    user = User.objects.create_user(username=username, password='pass-for-tests')
+    customer = Customer.objects.create(
+        user=user, phone='9000000000', address='Test', city='Test', state='Test', pincode='000000',
+        is_approved=is_approved,
+    )
+    # Ids are reused once a test's transaction rolls back; drop a ref cached under this one
+    invalidate_account_ref(user.id)
+    return Account.objects.create(customer=customer, account_type=account_type, balance=balance)
@@ -0,0 +1,35 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from accounts.routers import PIN_COOKIE
+from .helpers import create_account
+
+
+class CustomerAdminActionTests(TestCase):
+    def setUp(self):
+        self.account = create_account('alice', Decimal('100.00'), is_approved=False)
+        self.customer = self.account.customer
+        self.client.force_login(User.objects.create_user('staff', password='pass-for-tests', is_staff=True))
+
+    def test_actions_refuse_get(self):
+        for name in ('approve_customer', 'deactivate_customer', 'activate_customer'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name, args=[self.customer.id]))
+                self.assertEqual(response.status_code, 405)
+        self.customer.refresh_from_db()
+        self.assertFalse(self.customer.is_approved)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_actions_write_and_pin_reads_to_the_primary(self):
+        response = self.client.post(reverse('approve_customer', args=[self.customer.id]))
+        self.assertRedirects(response, reverse('manage_customers'), fetch_redirect_response=False)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.client.post(reverse('deactivate_customer', args=[self.customer.id]))
+        self.customer.refresh_from_db()
+        self.account.refresh_from_db()
+        self.assertTrue(self.customer.is_approved)
+        self.assertFalse(self.account.is_active)
+        self.client.post(reverse('activate_customer', args=[self.customer.id]))
+        self.account.refresh_from_db()
+        self.assertTrue(self.account.is_active)
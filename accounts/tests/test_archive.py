@@ -0,0 +1,52 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase
+from django.utils import timezone
+from accounts import archive
+from accounts.models import ArchivedTransaction, Transaction
+from .helpers import create_account
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.account = create_account('alice', Decimal('100.00'))
+        self.now = timezone.now()
+        # Pairs of rows share a timestamp, so batches and pages must break ties on id
+        for index in range(20):
+            row = Transaction.objects.create(account=self.account, transaction_type='Deposit',
+                                             amount=Decimal('1.00'), balance_after_transaction=Decimal('1.00'),
+                                             signed_amount=Decimal('1.00'))
+            Transaction.objects.filter(pk=row.pk).update(created_at=self.now - timedelta(days=20 - index // 2))
+        self.cutoff = self.now - timedelta(days=15)
+        self.old = set(Transaction.objects.filter(created_at__lt=self.cutoff).values_list('id', flat=True))
+        self.recent = set(Transaction.objects.filter(created_at__gte=self.cutoff).values_list('id', flat=True))
+
+    def walk(self, per_page=3):
+        """Every leg of the account, paging forward through its history and then back"""
+        paginator = archive.history(self.account.id, per_page)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        back = [pages[-1]]
+        while back[-1].has_previous:
+            back.append(paginator.get_page(back[-1].previous_cursor))
+        forward = [row.pk for page in pages for row in page]
+        backward = [row.pk for page in reversed(back) for row in page]
+        return forward, backward
+
+    def test_rows_move_exactly_once(self):
+        # An interrupted run leaves the first batches archived; the next run picks up the rest
+        self.assertEqual(archive.archive_batch(self.cutoff, batch_size=3)[0], 3)
+        self.assertEqual(archive.archive_before(self.cutoff, batch_size=4), len(self.old) - 3)
+        self.assertEqual(archive.archive_before(self.cutoff, batch_size=4), 0)
+        self.assertEqual(set(ArchivedTransaction.objects.values_list('id', flat=True)), self.old)
+        self.assertEqual(ArchivedTransaction.objects.count(), len(self.old))
+        self.assertEqual(set(Transaction.objects.values_list('id', flat=True)), self.recent)
+
+    def test_history_is_continuous_across_the_tiers(self):
+        before = self.walk()
+        self.assertEqual(before[0], before[1])
+        archive.archive_before(self.cutoff, batch_size=4)
+        # Pages of 3 over 10 recent rows: the fourth page holds the newest archived rows too
+        self.assertEqual(self.walk(), before)
+        self.assertEqual(len(before[0]), len(self.old) + len(self.recent))
@@ -0,0 +1,98 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from accounts import groupcommit, idempotency, ledger
+from accounts.models import IdempotencyKey, Transaction
+from .helpers import create_account
+
+
+@override_settings(VELOCITY_LIMITS={})
+class GroupCommitTests(TestCase):
+    def setUp(self):
+        self.account = create_account('alice', Decimal('100.00'))
+
+    def posting(self, transaction_type, amount):
+        return groupcommit._Posting(self.account.id, transaction_type, Decimal(amount), transaction_type)
+
+    def test_batch_resolves_each_posting(self):
+        committer = groupcommit.GroupCommitter()
+        batch = [self.posting('Deposit', '10.00'), self.posting('Withdraw', '500.00'),
+                 self.posting('Withdraw', '30.00')]
+        committer.commit(batch)
+        self.assertEqual(batch[0].future.result().balance_after_transaction, Decimal('110.00'))
+        self.assertIsInstance(batch[1].future.exception(), ledger.InsufficientBalance)
+        self.assertEqual(batch[2].future.result().balance_after_transaction, Decimal('80.00'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('80.00'))
+
+    def test_cancelled_postings_are_skipped(self):
+        committer = groupcommit.GroupCommitter()
+        posting = self.posting('Deposit', '10.00')
+        posting.future.cancel()
+        committer.commit([posting])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_failure_outside_the_batch_fails_its_postings_and_the_thread_carries_on(self):
+        committer = groupcommit.GroupCommitter(window_ms=0)
+        calls = []
+
+        def commit(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise RuntimeError('connection lost')
+            for posting in batch:
+                posting.future.set_result('posted')
+
+        with mock.patch.object(committer, 'commit', side_effect=commit), \
+                self.assertLogs('accounts.groupcommit', 'ERROR'):
+            first = committer.enqueue(self.account.id, 'Deposit', Decimal('1.00'), 'Deposit')
+            with self.assertRaisesMessage(RuntimeError, 'connection lost'):
+                first.result(timeout=5)
+            second = committer.enqueue(self.account.id, 'Deposit', Decimal('1.00'), 'Deposit')
+            self.assertEqual(second.result(timeout=5), 'posted')
+        self.assertFalse(committer.dead)
+
+    def test_stuck_committer_is_abandoned_for_direct_postings(self):
+        committer = groupcommit.GroupCommitter(timeout=0.05)
+        release = threading.Event()
+        with mock.patch.object(committer, 'commit', side_effect=lambda batch: release.wait(5)), \
+                self.assertLogs('accounts.groupcommit', 'ERROR'):
+            # The first posting's batch hangs; the second waits behind it
+            committer.enqueue(self.account.id, 'Deposit', Decimal('1.00'), 'Deposit')
+            posted = committer.submit(self.account.id, 'Deposit', Decimal('5.00'), 'Deposit')
+            self.assertTrue(committer.dead)
+            again = committer.submit(self.account.id, 'Deposit', Decimal('5.00'), 'Deposit')
+            release.set()
+        self.assertEqual(posted.balance_after_transaction, Decimal('105.00'))
+        self.assertEqual(again.balance_after_transaction, Decimal('110.00'))
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_stopped_thread_fails_over_to_direct_postings(self):
+        committer = groupcommit.GroupCommitter()
+        with mock.patch.object(groupcommit, 'close_old_connections', side_effect=SystemExit):
+            future = committer.enqueue(self.account.id, 'Deposit', Decimal('1.00'), 'Deposit')
+            with self.assertRaises(groupcommit.CommitterStopped):
+                future.result(timeout=5)
+            committer._thread.join(5)
+        self.assertTrue(committer.dead)
+        posted = committer.submit(self.account.id, 'Deposit', Decimal('2.00'), 'Deposit')
+        self.assertEqual(posted.balance_after_transaction, Decimal('102.00'))
+
+    def test_idempotency_keys_are_marked_in_the_batch(self):
+        user_id = self.account.customer.user_id
+        posted, _ = idempotency.claim(user_id, 'key-1', 'hash')
+        lost, _ = idempotency.claim(user_id, 'key-2', 'hash')
+        IdempotencyKey.objects.filter(pk=lost.pk).update(claimed_at=timezone.now() + timedelta(seconds=1))
+        batch = []
+        for record in (posted, lost):
+            token = idempotency._claim.set(record)
+            batch.append(self.posting('Withdraw', '10.00'))
+            idempotency._claim.reset(token)
+        groupcommit.GroupCommitter().commit(batch)
+        self.assertEqual(batch[0].future.result().balance_after_transaction, Decimal('90.00'))
+        self.assertIsInstance(batch[1].future.exception(), idempotency.ClaimLost)
+        self.assertEqual(dict(IdempotencyKey.objects.values_list('key', 'status')),
+                         {'key-1': IdempotencyKey.DONE, 'key-2': IdempotencyKey.PENDING})
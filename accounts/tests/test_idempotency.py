@@ -0,0 +1,102 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts import idempotency, ledger
+from accounts.middleware import invalidate_account_ref
+from accounts.models import IdempotencyKey, Transaction
+from .helpers import create_account
+
+
+@override_settings(VELOCITY_LIMITS={})
+class IdempotentPostingTests(TestCase):
+    def setUp(self):
+        self.account = create_account('alice', Decimal('100.00'))
+        self.client.force_login(self.account.customer.user)
+
+    def deposit(self, amount='5.00', key='key-1', **extra):
+        return self.client.post(reverse('deposit'), {'amount': amount, 'description': 'Test'},
+                                HTTP_IDEMPOTENCY_KEY=key, **extra)
+
+    def test_retry_replays_the_first_response_without_posting(self):
+        first = self.deposit()
+        retry = self.deposit(follow=True)
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(retry.redirect_chain[0], (first['Location'], 302))
+        self.assertContains(retry, 'Successfully deposited ₹5.00. New balance: ₹105.00')
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 1)
+        record = IdempotencyKey.objects.get(key='key-1')
+        self.assertEqual(record.status, IdempotencyKey.DONE)
+
+    def test_replayed_response_is_marked(self):
+        self.deposit()
+        self.assertEqual(self.deposit()['Idempotent-Replayed'], 'true')
+
+    def test_key_reused_for_a_different_request(self):
+        self.deposit()
+        self.assertEqual(self.deposit(amount='6.00').status_code, 422)
+
+    def test_pending_claim_gets_409(self):
+        request = self.client.post(reverse('deposit'), {'amount': '5.00', 'description': 'Test'}).wsgi_request
+        idempotency.claim(self.account.customer.user.pk, 'key-1', idempotency.fingerprint(request))
+        with mock.patch.object(idempotency, 'WAIT_TIMEOUT', 0):
+            response = self.deposit()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 1)
+
+    def test_rejected_posting_releases_the_key(self):
+        response = self.client.post(reverse('withdraw'), {'amount': '500.00'}, HTTP_IDEMPOTENCY_KEY='key-2')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(IdempotencyKey.objects.filter(key='key-2').exists())
+
+    def test_redirect_without_a_posting_is_not_cached(self):
+        self.account.customer.is_approved = False
+        self.account.customer.save()
+        invalidate_account_ref(self.account.customer.user_id)
+        response = self.deposit(key='key-3')
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertFalse(IdempotencyKey.objects.filter(key='key-3').exists())
+
+    def test_expired_key_runs_again(self):
+        self.deposit()
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertNotIn('Idempotent-Replayed', self.deposit())
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 2)
+        self.assertEqual(idempotency.purge_expired(), 0)
+
+    def test_key_commits_with_the_posting(self):
+        # The process dies after the posting committed, before the response was stored
+        with mock.patch.object(idempotency, 'complete', side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                self.deposit()
+        self.assertEqual(IdempotencyKey.objects.get(key='key-1').status, IdempotencyKey.DONE)
+        retry = self.deposit(follow=True)
+        self.assertRedirects(retry, reverse('dashboard'))
+        self.assertContains(retry, idempotency.ALREADY_POSTED)
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 1)
+
+    def test_abandoned_claim_is_taken_over_after_its_lease(self):
+        request = self.client.post(reverse('deposit'), {'amount': '5.00', 'description': 'Test'}).wsgi_request
+        idempotency.claim(self.account.customer.user.pk, 'key-1', idempotency.fingerprint(request))
+        IdempotencyKey.objects.update(
+            claimed_at=timezone.now() - timedelta(seconds=idempotency.CLAIM_LEASE + 1))
+        with mock.patch.object(idempotency, 'WAIT_TIMEOUT', 0):
+            response = self.deposit()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(IdempotencyKey.objects.get(key='key-1').status, IdempotencyKey.DONE)
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 2)
+
+    def test_posting_of_a_taken_over_claim_rolls_back(self):
+        record, _ = idempotency.claim(self.account.customer.user.pk, 'key-1', 'hash')
+        IdempotencyKey.objects.update(claimed_at=timezone.now() + timedelta(seconds=1))
+        token = idempotency._claim.set(record)
+        try:
+            with self.assertRaises(idempotency.ClaimLost):
+                ledger.deposit(self.account.id, Decimal('5.00'))
+        finally:
+            idempotency._claim.reset(token)
+        self.assertFalse(Transaction.objects.filter(account=self.account).exists())
+        self.assertEqual(IdempotencyKey.objects.get(key='key-1').status, IdempotencyKey.PENDING)
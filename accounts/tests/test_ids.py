@@ -0,0 +1,47 @@
+import os
+import tempfile
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from accounts.ids import SnowflakeIdGenerator, claim_slot
+
+
+class NodeSlotTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def test_each_generator_on_a_host_gets_its_own_node(self):
+        with override_settings(ID_NODE=3, ID_HOST_BITS=4, ID_SLOT_DIR=self.directory):
+            first, second = SnowflakeIdGenerator(), SnowflakeIdGenerator()
+        self.assertEqual(first.node >> 6, 3)
+        self.assertEqual(second.node >> 6, 3)
+        self.assertNotEqual(first.node, second.node)
+
+    def test_released_slot_is_reused(self):
+        slot, handle = claim_slot(self.directory, 2)
+        handle.close()
+        self.assertEqual(claim_slot(self.directory, 2)[0], slot)
+
+    def test_full_host_fails_instead_of_sharing_a_node(self):
+        held = [claim_slot(self.directory, 2) for _ in range(2)]
+        with self.assertRaises(ImproperlyConfigured):
+            claim_slot(self.directory, 2)
+        for _, handle in held:
+            handle.close()
+
+    def test_host_number_must_fit(self):
+        with override_settings(ID_NODE=16, ID_HOST_BITS=4, ID_SLOT_DIR=self.directory):
+            with self.assertRaises(ImproperlyConfigured):
+                SnowflakeIdGenerator()
+
+    def test_forked_child_claims_another_slot(self):
+        with override_settings(ID_NODE=0, ID_SLOT_DIR=self.directory):
+            generator = SnowflakeIdGenerator()
+            read, write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                generator.next_id()
+                os.write(write, str(generator.node).encode())
+                os._exit(0)
+            os.waitpid(pid, 0)
+            child_node = int(os.read(read, 16))
+        self.assertNotEqual(child_node, generator.node)
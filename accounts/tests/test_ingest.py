@@ -0,0 +1,78 @@
+import io
+from decimal import Decimal
+from django.test import SimpleTestCase, TestCase
+from accounts import ingest
+from accounts.models import Transaction
+from .helpers import create_account
+
+
+def record(account_number, transaction_type, amount, to_account_number=''):
+    return {'account_number': account_number, 'transaction_type': transaction_type, 'amount': amount,
+            'to_account_number': to_account_number}
+
+
+class ParseTests(SimpleTestCase):
+    def assertRejected(self, amount):
+        with self.assertRaisesMessage(ValueError, 'Invalid amount'):
+            ingest._parse(record('1001', 'Deposit', amount))
+
+    def test_valid_lines(self):
+        self.assertEqual(ingest._parse(record('1001', 'deposit', '12.5')),
+                         ('1001', 'Deposit', Decimal('12.50'), '', 'Deposit'))
+        self.assertEqual(ingest._parse(record('1001', 'Transfer', 7, '1002'))[2], Decimal('7.00'))
+
+    def test_amounts_the_deposit_form_rejects(self):
+        for amount in ('10.005', '99999999999.99', '0', '-5', 'NaN', 'abc', '', None):
+            with self.subTest(amount=amount):
+                self.assertRejected(amount)
+
+    def test_malformed_lines(self):
+        for bad, message in [
+            (None, 'Malformed line'),
+            (record('', 'Deposit', '1'), 'Missing account_number'),
+            (record('1001', 'Refund', '1'), 'Invalid transaction_type'),
+            (record('1001', 'Transfer', '1'), 'Missing to_account_number'),
+            (record('1001', 'Transfer', '1', '1001'), 'Cannot transfer to the same account'),
+        ]:
+            with self.subTest(message=message), self.assertRaisesMessage(ValueError, message):
+                ingest._parse(bad)
+
+    def test_read_records_flags_bad_json(self):
+        lines = io.StringIO('{"account_number": "1"}\n\nnot json\n')
+        self.assertEqual(list(ingest.read_records(lines, 'jsonl')),
+                         [(1, {'account_number': '1'}), (3, None)])
+
+
+class PostBatchTests(TestCase):
+    def setUp(self):
+        self.account = create_account('alice', Decimal('100.00'))
+        self.other = create_account('bob', Decimal('9999999990.00'))
+
+    def test_rejected_lines_do_not_stop_the_chunk(self):
+        number, other = self.account.account_number, self.other.account_number
+        result = ingest.post_batch(enumerate([
+            record(number, 'Deposit', '10.00'),
+            record(number, 'Deposit', '10.005'),
+            record(number, 'Withdraw', '500.00'),
+            record(number, 'Transfer', '20.00', other),
+            record(number, 'Deposit', '5.00'),
+            record('does-not-exist', 'Deposit', '5.00'),
+            record(number, 'Withdraw', '15.00'),
+        ], start=1), chunk_size=3)
+        self.assertEqual(result.posted, 3)
+        self.assertEqual([line_no for line_no, _ in result.rejected], [2, 3, 4, 6])
+        self.assertIn('Invalid amount', result.rejected[0][1])
+        self.assertEqual(result.rejected[1][1], 'Insufficient balance')
+        self.assertEqual(result.rejected[2][1], "Recipient's balance would exceed the account limit")
+        self.account.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('100.00'))
+        self.assertEqual(self.other.balance, Decimal('9999999990.00'))
+        self.assertEqual(list(Transaction.objects.filter(account=self.account)
+                              .order_by('id').values_list('balance_after_transaction', flat=True)),
+                         [Decimal('110.00'), Decimal('115.00'), Decimal('100.00')])
+
+    def test_deposit_past_the_balance_limit_is_rejected(self):
+        result = ingest.post_batch([(1, record(self.other.account_number, 'Deposit', '10.00'))])
+        self.assertEqual(result.rejected, [(1, 'Balance would exceed the account limit')])
+        self.assertFalse(Transaction.objects.exists())
@@ -0,0 +1,59 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import TransactionTestCase
+from django.utils import timezone
+from accounts import interest
+from accounts.models import Account, InterestAccrual, Transaction
+from accounts.statements import day_start
+from .helpers import create_account
+
+
+class AccrualTests(TransactionTestCase):
+    def setUp(self):
+        self.day = timezone.localdate() - timedelta(days=1)
+        self.opened = day_start(self.day - timedelta(days=9))
+        self.account = self.open_account('alice')
+
+    def open_account(self, username):
+        account = create_account(username, Decimal('1000.00'))
+        Account.objects.filter(pk=account.pk).update(created_at=self.opened)
+        opening = Transaction.objects.create(account=account, transaction_type='Deposit', amount=Decimal('1000.00'),
+                                             balance_after_transaction=Decimal('1000.00'))
+        Transaction.objects.filter(pk=opening.pk).update(created_at=self.opened)
+        return account
+
+    def test_ten_days_on_a_steady_balance(self):
+        result = interest.accrue(self.day, workers=1)
+        self.assertEqual((result['accrued'], result['credited'], result['skipped_chunks']), (1, 1, 0))
+        # 1000.00 * 10 days * 3.5% / 365, rounded down
+        self.assertEqual(result['interest'], Decimal('0.95'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1000.95'))
+        self.assertEqual(interest.accrue(self.day, workers=1)['accrued'], 0)
+
+    def test_inactive_accounts_are_skipped(self):
+        Account.objects.filter(pk=self.account.pk).update(is_active=False)
+        result = interest.accrue(self.day, workers=1)
+        self.assertEqual((result['accounts'], result['accrued']), (0, 0))
+        self.assertFalse(InterestAccrual.objects.exists())
+
+    def test_chunk_accrued_by_a_concurrent_run_is_skipped(self):
+        other = self.open_account('bob')
+        real_periods = interest._periods
+        stale_periods = real_periods([self.account.id], self.day)
+
+        def periods(account_ids, day):
+            # The run read its periods before the other run's accruals committed
+            return stale_periods if self.account.id in account_ids else real_periods(account_ids, day)
+
+        InterestAccrual.objects.create(account=self.account, period_start=self.day, period_end=self.day,
+                                       annual_rate=Decimal('0.035'), amount=Decimal('0.00'),
+                                       average_balance=Decimal('0.00'))
+        with mock.patch.object(interest, '_periods', side_effect=periods):
+            result = interest.accrue(self.day, chunk_size=1, workers=1)
+        self.assertEqual((result['accrued'], result['credited'], result['skipped_chunks']), (1, 1, 1))
+        self.account.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1000.00'))
+        self.assertEqual(other.balance, Decimal('1000.95'))
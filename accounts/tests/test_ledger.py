@@ -0,0 +1,93 @@
+import threading
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.db.models import Sum
+from accounts import ledger
+from accounts.models import Account, Transaction
+from .helpers import create_account
+
+
+@override_settings(VELOCITY_LIMITS={})
+class PostingTests(TestCase):
+    def setUp(self):
+        self.account = create_account('alice', Decimal('100.00'))
+        self.other = create_account('bob', Decimal('50.00'))
+
+    def assertBalance(self, account, expected):
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal(expected))
+
+    def test_postings_use_locked_balance_not_callers_copy(self):
+        stale = Account.objects.get(pk=self.account.pk)
+        ledger.deposit(self.account.id, Decimal('10.00'))
+        ledger.withdraw(self.account.id, Decimal('30.00'))
+        # `stale` still says 100.00; transfers only read its id and number
+        debit, credit = ledger.transfer(stale, self.other, Decimal('20.00'))
+        self.assertEqual(debit.balance_after_transaction, Decimal('60.00'))
+        self.assertEqual(credit.balance_after_transaction, Decimal('70.00'))
+        self.assertBalance(self.account, '60.00')
+        self.assertBalance(self.other, '70.00')
+
+    def test_signed_amounts_sum_to_balance(self):
+        ledger.deposit(self.account.id, Decimal('5.00'))
+        ledger.withdraw(self.account.id, Decimal('2.50'))
+        ledger.transfer(self.account, self.other, Decimal('1.25'))
+        legs = Transaction.objects.filter(account=self.account).aggregate(total=Sum('signed_amount'))['total']
+        self.assertEqual(Decimal('100.00') + legs, Decimal('101.25'))
+
+    def test_overdraft_withdraw_is_rejected_without_side_effects(self):
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.withdraw(self.account.id, Decimal('100.01'))
+        self.assertBalance(self.account, '100.00')
+        self.assertFalse(Transaction.objects.filter(account=self.account).exists())
+
+    def test_overdraft_transfer_is_rejected_without_side_effects(self):
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.transfer(self.account, self.other, Decimal('150.00'))
+        self.assertBalance(self.account, '100.00')
+        self.assertBalance(self.other, '50.00')
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_whole_balance_can_be_withdrawn(self):
+        posted = ledger.withdraw(self.account.id, Decimal('100.00'))
+        self.assertEqual(posted.balance_after_transaction, Decimal('0.00'))
+        self.assertBalance(self.account, '0.00')
+
+    def test_guarded_update_refuses_to_go_negative(self):
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.apply_delta(self.account.id, Decimal('-100.01'))
+        self.assertBalance(self.account, '100.00')
+
+    def test_missing_account(self):
+        with self.assertRaises(ledger.AccountNotFound):
+            ledger.deposit(0, Decimal('1.00'))
+
+
+@override_settings(VELOCITY_LIMITS={})
+class ConcurrentPostingTests(TransactionTestCase):
+    # SQLite has no row locks and serialises writers, so this needs MySQL
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_postings_lose_no_updates(self):
+        account = create_account('carol', Decimal('1000.00'))
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(20):
+                    ledger.deposit(account.id, Decimal('2.00'))
+                    ledger.withdraw(account.id, Decimal('1.00'))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal('1160.00'))
+        self.assertEqual(Transaction.objects.filter(account=account).count(), 320)
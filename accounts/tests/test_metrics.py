@@ -0,0 +1,53 @@
+import gc
+import threading
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from accounts import metrics
+
+TEST_COUNTER = metrics.Counter('bank_test_events_total', 'Events counted by the tests', ('source',))
+
+
+class ShardTests(SimpleTestCase):
+    def sample(self, source):
+        line = f'bank_test_events_total{{source="{source}"}} '
+        return next(int(row[len(line):]) for row in metrics.render().splitlines() if row.startswith(line))
+
+    def test_exited_threads_are_folded_into_the_totals(self):
+        shards = len(metrics._shards)
+
+        def work():
+            for _ in range(5):
+                TEST_COUNTER.inc('worker')
+
+        threads = [threading.Thread(target=work) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        gc.collect()
+        self.assertEqual(len(metrics._shards), shards)
+        self.assertEqual(self.sample('worker'), 100)
+
+    def test_live_threads_are_counted(self):
+        TEST_COUNTER.inc('main', amount=3)
+        self.assertEqual(self.sample('main'), 3)
+
+
+@override_settings(METRICS_TOKEN='scrape-secret', METRICS_ALLOWED_IPS=[])
+class ScrapeAccessTests(TestCase):
+    def test_token(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE bank_request_duration_seconds histogram', response.content)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    def test_localhost_is_not_trusted_by_default(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=['10.0.0.5'])
+    def test_allowed_address_and_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', password='pass-for-tests', is_staff=True))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts import ledger, outbox
+from accounts.models import OutboxEvent, OutboxOffset, Transaction
+from .helpers import REGISTRATION, create_account
+
+
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, events):
+        self.events += events
+
+
+class PublishableTests(SimpleTestCase):
+    def rows(self, *ids, age=0):
+        created_at = timezone.now() - timedelta(seconds=age)
+        return [{'id': event_id, 'created_at': created_at} for event_id in ids]
+
+    def test_contiguous_ids_are_published(self):
+        rows = self.rows(4, 5, 6)
+        self.assertEqual(outbox._publishable(rows, 3, timezone.now()), rows)
+
+    def test_stops_at_a_fresh_gap(self):
+        rows = self.rows(4, 5, 7, 8)
+        self.assertEqual(outbox._publishable(rows, 3, timezone.now()), rows[:2])
+        self.assertEqual(outbox._publishable(self.rows(5, 6), 3, timezone.now()), [])
+
+    def test_settled_gap_is_a_rollback(self):
+        rows = self.rows(4, 7, age=60)
+        self.assertEqual(outbox._publishable(rows, 3, timezone.now()), rows)
+
+
+@override_settings(VELOCITY_LIMITS={}, OUTBOX_ENABLED=True)
+class RelayTests(TestCase):
+    def setUp(self):
+        self.account = create_account('alice', Decimal('100.00'))
+        self.other = create_account('bob')
+
+    def relay_all(self, sink, consumer='tests'):
+        # A new consumer starts at the first event rather than waiting out the settle time
+        first = OutboxEvent.objects.order_by('id').values_list('id', flat=True).first()
+        if first and not OutboxOffset.objects.filter(consumer=consumer).exists():
+            outbox.replay(consumer, first)
+        return outbox.relay(sink, consumer, batch_size=2)
+
+    def test_events_follow_commit_order_once_each(self):
+        ledger.deposit(self.account.id, Decimal('10.00'))
+        ledger.transfer(self.account, self.other, Decimal('30.00'))
+        ledger.withdraw(self.account.id, Decimal('5.00'))
+        sink = ListSink()
+        self.assertEqual(self.relay_all(sink), 4)
+        self.assertEqual(self.relay_all(sink), 0)
+        self.assertEqual([event['event_id'] for event in sink.events],
+                         sorted(event['event_id'] for event in sink.events))
+        legs = list(Transaction.objects.order_by('id').values_list('transaction_id', flat=True))
+        self.assertEqual([event['transaction_id'] for event in sink.events], legs)
+        self.assertEqual([event['balance_after'] for event in sink.events if event['account_id'] == self.account.id],
+                         ['110.00', '80.00', '75.00'])
+
+    def test_rejected_posting_writes_no_event(self):
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.transfer(self.account, self.other, Decimal('500.00'))
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_replay_publishes_again_from_an_event(self):
+        ledger.deposit(self.account.id, Decimal('1.00'))
+        ledger.deposit(self.account.id, Decimal('2.00'))
+        sink = ListSink()
+        self.relay_all(sink)
+        outbox.replay('tests', sink.events[1]['event_id'])
+        self.relay_all(sink)
+        self.assertEqual([event['amount'] for event in sink.events], ['1.00', '2.00', '2.00'])
+
+    def test_jsonl_sink_appends_lines(self):
+        ledger.deposit(self.account.id, Decimal('1.00'))
+        ledger.withdraw(self.account.id, Decimal('2.00'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'outbox.jsonl')
+            sink = outbox.make_sink(f'jsonl:{path}')
+            self.relay_all(sink)
+            sink.close()
+            with open(path, encoding='utf-8') as lines:
+                events = [json.loads(line) for line in lines]
+        self.assertEqual([event['transaction_type'] for event in events], ['Deposit', 'Withdraw'])
+
+
+@override_settings(OUTBOX_ENABLED=True)
+class RegisterEventTests(TestCase):
+    def test_opening_deposit_event_commits_with_the_account(self):
+        with mock.patch('accounts.search.index_customers', side_effect=RuntimeError('index down')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('register'), REGISTRATION)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+        self.client.post(reverse('register'), REGISTRATION)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.transaction_id, Transaction.objects.get().transaction_id)
+        self.assertEqual(event.payload['amount'], '750.00')
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from accounts import ledger, pagecache
+from accounts.models import Account
+from .helpers import create_account
+
+
+class VersionTests(TestCase):
+    def test_versions_live_in_the_shared_cache(self):
+        version = pagecache.account_version(41)
+        self.assertEqual(caches['shared'].get(pagecache._version_key(41)), version)
+        self.assertEqual(pagecache.account_version(41), version)
+        pagecache.bump_account_versions([41])
+        self.assertNotEqual(pagecache.account_version(41), version)
+
+    def test_bump_waits_for_commit(self):
+        version = pagecache.account_version(42)
+        with self.captureOnCommitCallbacks(execute=True):
+            pagecache.bump_on_commit(42)
+            self.assertEqual(pagecache.account_version(42), version)
+        self.assertNotEqual(pagecache.account_version(42), version)
+
+
+@override_settings(PAGE_CACHE='page-tests', CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared-tests'},
+    'page-tests': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'page-tests'},
+})
+class AnonymousPageTests(TestCase):
+    def test_query_strings_share_the_cached_page(self):
+        first = self.client.get(reverse('home'))
+        for query in ('?utm_source=mail', '?x=1&y=2', '?'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('home') + query)
+                self.assertEqual(response.content, first.content)
+        cache = caches['page-tests']
+        self.assertIsNotNone(cache.get('anonymous_page:/'))
+        self.assertEqual(len(cache._cache), 1)
+
+
+class DashboardFragmentTests(TestCase):
+    def setUp(self):
+        for cache in caches.all(initialized_only=False):
+            cache.clear()
+        self.account = create_account('alice', Decimal('100.00'))
+        self.client.force_login(self.account.customer.user)
+
+    def test_fragments_are_served_until_a_posting_commits(self):
+        self.assertContains(self.client.get(reverse('dashboard')), '₹100.00')
+        # Not a posting: nothing bumps the version, so the cached fragments stay
+        Account.objects.filter(pk=self.account.pk).update(balance=Decimal('999.00'))
+        self.assertContains(self.client.get(reverse('dashboard')), '₹100.00')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            posted = ledger.deposit(self.account.id, Decimal('5.00'))
+        # Until the posting commits, the old version and fragments are still in use
+        self.assertNotContains(self.client.get(reverse('dashboard')), posted.transaction_id)
+        for callback in callbacks:
+            callback()
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, '₹1004.00')
+        self.assertContains(response, posted.transaction_id)
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from accounts.models import ArchivedTransaction, Transaction
+from accounts.pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .helpers import create_account
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        created_at = datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        cursor = encode_cursor(created_at, 42, 'prev')
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), (created_at, 42, 'prev'))
+
+    def test_missing_or_malformed_cursors_mean_the_first_page(self):
+        for cursor in (None, '', 'not-base64!', encode_cursor(datetime(2024, 1, 1), 1, 'up'), 'W10'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        self.account = create_account('alice', Decimal('100.00'))
+        base = timezone.now() - timedelta(days=30)
+        # Pairs of rows share a timestamp, so pages must break ties on id
+        for index in range(7):
+            row = Transaction.objects.create(account=self.account, transaction_type='Deposit',
+                                             amount=Decimal('1.00'), balance_after_transaction=Decimal('1.00'))
+            Transaction.objects.filter(pk=row.pk).update(created_at=base + timedelta(minutes=index // 2))
+        ArchivedTransaction.objects.bulk_create([
+            ArchivedTransaction(id=index, transaction_id=f'A{index}', account=self.account,
+                                transaction_type='Deposit', amount=Decimal('1.00'),
+                                balance_after_transaction=Decimal('1.00'), signed_amount=Decimal('1.00'),
+                                created_at=base - timedelta(days=1, minutes=index // 2))
+            for index in range(1, 6)
+        ])
+        self.hot = Transaction.objects.filter(account=self.account)
+        self.archived = ArchivedTransaction.objects.filter(account=self.account)
+        self.expected = ([(row.created_at, row.pk) for row in self.hot.order_by('-created_at', '-id')]
+                         + [(row.created_at, row.pk) for row in self.archived.order_by('-created_at', '-id')])
+
+    def keys(self, page):
+        return [(row.created_at, row.pk) for row in page]
+
+    def test_forward_and_back_across_tiers(self):
+        paginator = KeysetPaginator(self.hot, 5, count_total=True, older=[self.archived])
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        self.assertEqual(sum((self.keys(page) for page in pages), []), self.expected)
+        self.assertEqual(pages[0].total_count, 12)
+        self.assertFalse(pages[0].has_previous)
+        self.assertEqual(pages[-1].next_cursor, '')
+
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(self.keys(back), self.keys(pages[1]))
+        self.assertTrue(back.has_next)
+        first = paginator.get_page(back.previous_cursor)
+        self.assertEqual(self.keys(first), self.keys(pages[0]))
+        self.assertFalse(first.has_previous)
+
+    async def test_async_pages_match(self):
+        paginator = KeysetPaginator(self.hot, 4, older=[self.archived])
+        page = await paginator.aget_page()
+        following = await paginator.aget_page(page.next_cursor)
+        self.assertEqual(self.keys(page) + self.keys(following), self.expected[:8])
@@ -0,0 +1,63 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from accounts import ledger
+from .helpers import create_account
+
+
+# Not a TestCase: its per-test transaction would turn every atomic block in
+# the views into a savepoint and add queries production never runs
+@override_settings(QUERY_BUDGET_MODE='raise')
+class QueryBudgetTests(TransactionTestCase):
+    """Every budgeted view stays within its budget with cold and with warm caches"""
+
+    def setUp(self):
+        self.account = create_account('alice', Decimal('5000.00'))
+        self.recipient = create_account('bob', Decimal('100.00'), account_type='Current')
+        self.staff = User.objects.create_user(username='staff', password='pass-for-tests', is_staff=True)
+        self.client.force_login(self.account.customer.user)
+
+    def cold_and_warm(self, send):
+        """Send a request with every cache empty, then again with the caches it filled"""
+        for cache in caches.all(initialized_only=False):
+            cache.clear()
+        for state in ('cold', 'warm'):
+            with self.subTest(cache=state):
+                response = send()
+                self.assertLess(response.status_code, 400)
+
+    def test_postings(self):
+        # The first posting of the day also creates the day's summary rows
+        cases = {
+            'deposit': {'amount': '10.00', 'description': 'Cash'},
+            'withdraw': {'amount': '10.00', 'description': 'Cash'},
+            'transfer': {'to_account_number': self.recipient.account_number, 'amount': '10.00',
+                         'description': 'Rent'},
+        }
+        keys = iter(range(100))
+        for name, data in cases.items():
+            with self.subTest(view=name):
+                self.cold_and_warm(lambda: self.client.get(reverse(name)))
+                self.cold_and_warm(lambda: self.client.post(reverse(name), data,
+                                                            HTTP_IDEMPOTENCY_KEY=f'key-{next(keys)}'))
+
+    def test_customer_pages(self):
+        ledger.deposit(self.account.id, Decimal('10.00'))
+        for name, query in (('dashboard', ''), ('transaction_history', ''), ('export_transactions', ''),
+                            ('profile', '')):
+            with self.subTest(view=name):
+                self.cold_and_warm(lambda: self.client.get(reverse(name) + query))
+        self.cold_and_warm(lambda: self.client.post(reverse('profile'), {
+            'first_name': 'Alice', 'last_name': 'Doe', 'email': 'alice@example.com', 'phone': '9000000001',
+            'address': 'Test', 'city': 'Test', 'state': 'Test', 'pincode': '000000',
+        }))
+
+    def test_staff_pages(self):
+        ledger.transfer(self.account, self.recipient, Decimal('10.00'), 'Rent')
+        self.client.force_login(self.staff)
+        for name, query in (('admin_dashboard', ''), ('manage_customers', ''), ('manage_customers', '?search=alice'),
+                            ('all_transactions', ''), ('all_transactions', '?search=alice'), ('reports', '')):
+            with self.subTest(view=name, query=query):
+                self.cold_and_warm(lambda: self.client.get(reverse(name) + query))
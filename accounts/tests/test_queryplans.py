@@ -0,0 +1,15 @@
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+
+@skipUnless(connection.vendor == 'mysql', 'Query plans are checked against MySQL')
+@override_settings(BENCHMARK_DATABASE=True)
+class QueryPlanTests(TestCase):
+    def test_view_queries_use_their_indexes(self):
+        # Raises CommandError naming the queries that fall back to a full scan or a sort
+        out = StringIO()
+        call_command('check_query_plans', stdout=out, stderr=out)
+        self.assertNotIn('full scan', out.getvalue())
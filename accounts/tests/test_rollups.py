@@ -0,0 +1,76 @@
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from accounts import benchmarks, ledger, rollups
+from accounts.models import Account, DailyTransactionSummary, OutboxEvent, Transaction
+from .helpers import REGISTRATION, create_account
+
+
+class RegisterTests(TestCase):
+    def test_opening_deposit_is_counted_once(self):
+        self.client.post(reverse('register'), REGISTRATION)
+        account = Account.objects.get(customer__user__username='carol')
+        self.assertEqual(account.balance, Decimal('750.00'))
+        self.assertEqual(rollups.totals_by_type()['Deposit'], Decimal('750.00'))
+        self.assertEqual(OutboxEvent.objects.get().account_id, account.id)
+        self.assertEqual(rollups.find_mismatches(), [])
+
+    def test_failure_after_the_deposit_leaves_nothing_behind(self):
+        with mock.patch('accounts.outbox.record', side_effect=RuntimeError('outbox down')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('register'), REGISTRATION)
+        self.assertFalse(User.objects.filter(username='carol').exists())
+        self.assertFalse(Account.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(DailyTransactionSummary.objects.exists())
+
+
+@override_settings(VELOCITY_LIMITS={})
+class RebuildTests(TestCase):
+    def test_rebuild_matches_raw_rows(self):
+        account = create_account('alice', Decimal('100.00'))
+        ledger.deposit(account.id, Decimal('10.00'))
+        ledger.withdraw(account.id, Decimal('4.00'))
+        DailyTransactionSummary.objects.update(total_amount=Decimal('999.00'))
+        self.assertNotEqual(rollups.find_mismatches(), [])
+        self.assertEqual(rollups.rebuild(), 2)
+        self.assertEqual(rollups.find_mismatches(), [])
+        self.assertEqual(rollups.totals_by_type()['Withdraw'], Decimal('4.00'))
+
+    def test_rebuild_of_some_buckets_leaves_the_others_alone(self):
+        first = create_account('alice', Decimal('100.00'))
+        second = create_account('bob', Decimal('100.00'))
+        ledger.deposit(first.id, Decimal('10.00'))
+        ledger.deposit(second.id, Decimal('20.00'))
+        self.assertNotEqual(rollups.bucket_for(first.id), rollups.bucket_for(second.id))
+        DailyTransactionSummary.objects.update(total_amount=Decimal('999.00'))
+        rollups.rebuild(buckets={rollups.bucket_for(first.id)})
+        self.assertEqual(DailyTransactionSummary.objects.get(bucket=rollups.bucket_for(first.id)).total_amount,
+                         Decimal('10.00'))
+        self.assertEqual(DailyTransactionSummary.objects.get(bucket=rollups.bucket_for(second.id)).total_amount,
+                         Decimal('999.00'))
+
+
+class BenchmarkCleanupTests(TestCase):
+    def test_refuses_without_benchmark_database(self):
+        with override_settings(BENCHMARK_DATABASE=False):
+            with self.assertRaises(ImproperlyConfigured):
+                benchmarks.cleanup()
+
+    @override_settings(BENCHMARK_DATABASE=True, VELOCITY_LIMITS={})
+    def test_rebuilds_only_the_buckets_benchmark_postings_touched(self):
+        customer = create_account('alice', Decimal('100.00'))
+        bench = benchmarks.make_account(Decimal('100.00'))
+        while rollups.bucket_for(bench.id) == rollups.bucket_for(customer.id):
+            bench = benchmarks.make_account(Decimal('100.00'))
+        ledger.deposit(customer.id, Decimal('10.00'))
+        ledger.deposit(bench.id, Decimal('20.00'))
+        DailyTransactionSummary.objects.filter(bucket=rollups.bucket_for(customer.id)).update(
+            total_amount=Decimal('999.00'))
+        benchmarks.cleanup()
+        self.assertFalse(Account.objects.filter(id=bench.id).exists())
+        self.assertEqual(list(DailyTransactionSummary.objects.values_list('bucket', 'total_amount')),
+                         [(rollups.bucket_for(customer.id), Decimal('999.00'))])
@@ -0,0 +1,35 @@
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from accounts import routers
+from accounts.models import Transaction
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+@mock.patch.object(routers, '_healthy', lambda alias: True)
+class ReplicaRouterTests(SimpleTestCase):
+    router = routers.ReplicaRouter()
+
+    def reads(self, count=3):
+        return {self.router.db_for_read(Transaction) for _ in range(count)}
+
+    def test_reads_outside_a_scope_use_the_primary(self):
+        self.assertEqual(self.reads(), {'default'})
+        with routers.replica_reads(False):
+            self.assertEqual(self.reads(), {'default'})
+
+    def test_a_scope_reads_from_one_replica(self):
+        chosen = set()
+        for _ in range(2):
+            with routers.replica_reads():
+                reads = self.reads()
+                with routers.replica_reads():
+                    self.assertEqual(self.reads(), reads)
+            self.assertEqual(len(reads), 1)
+            chosen |= reads
+        # Consecutive scopes rotate over the replicas
+        self.assertEqual(chosen, {'replica1', 'replica2'})
+
+    def test_streamed_items_read_from_one_replica(self):
+        items = list(routers.iter_on_replica(self.router.db_for_read(Transaction) for _ in range(3)))
+        self.assertEqual(len(set(items)), 1)
+        self.assertNotEqual(items[0], 'default')
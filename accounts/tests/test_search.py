@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from accounts import search
+from accounts.models import Account, Customer, Transaction
+from .helpers import create_account
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        # More customers share the first name than are ever ranked
+        count = search.CANDIDATE_LIMIT + 20
+        User.objects.bulk_create([
+            User(username=f'user{i:05d}', first_name='Arjun', last_name='Sharma' if i < count - 1 else 'Zeller')
+            for i in range(count)
+        ])
+        users = User.objects.filter(username__startswith='user')
+        Customer.objects.bulk_create([
+            Customer(user=user, phone='9000000000', address='Test', city='Test', state='Test', pincode='000000')
+            for user in users
+        ])
+        search.index_customers(Customer.objects.filter(user__in=users).select_related('user'))
+        self.last = Customer.objects.get(user__username=f'user{count - 1:05d}')
+
+    def test_later_words_are_not_limited_to_the_first_words_candidates(self):
+        for query in ('arjun zeller', 'zel arjun', 'arj zel'):
+            with self.subTest(query=query):
+                self.assertEqual(search.matching_customer_ids(query), [self.last.id])
+
+    def test_only_customers_matching_every_word_are_capped(self):
+        ids = search.matching_customer_ids('arjun sharma', limit=search.CANDIDATE_LIMIT * 2)
+        self.assertEqual(len(ids), search.CANDIDATE_LIMIT)
+
+    def test_transactions_of_customers_past_the_ranked_results(self):
+        # Ties rank the newest customer first, so the oldest one is ranked last
+        first = Customer.objects.filter(user__username__startswith='user').order_by('id').first()
+        account = create_account('zed')
+        Account.objects.filter(id=account.id).update(customer=first)
+        Transaction.objects.create(account_id=account.id, transaction_type='Deposit', amount='5.00',
+                                   balance_after_transaction='5.00', signed_amount='5.00')
+        self.assertNotIn(first.id, search.matching_customer_ids('arjun'))
+        found = search.filter_transactions(Transaction.objects.all(), 'arjun')
+        self.assertEqual(list(found.values_list('account_id', flat=True)), [account.id])
@@ -0,0 +1,141 @@
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from accounts import standing
+from accounts.models import StandingInstruction
+from .helpers import create_account
+
+
+def local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class NextOccurrenceTests(TestCase):
+    def test_monthly_keeps_the_day_it_started_on(self):
+        starts_at = local(2023, 1, 31, 9, 30)
+        occurrences = [starts_at]
+        for _ in range(4):
+            occurrences.append(standing.next_occurrence('Monthly', starts_at, occurrences[-1]))
+        self.assertEqual([timezone.localtime(item).date().isoformat() for item in occurrences],
+                         ['2023-01-31', '2023-02-28', '2023-03-31', '2023-04-30', '2023-05-31'])
+        self.assertTrue(all(timezone.localtime(item).time().isoformat() == '09:30:00' for item in occurrences))
+
+    def test_monthly_leap_february_and_year_end(self):
+        starts_at = local(2023, 12, 30, 9, 0)
+        january = standing.next_occurrence('Monthly', starts_at, starts_at)
+        self.assertEqual(timezone.localtime(january).date().isoformat(), '2024-01-30')
+        february = standing.next_occurrence('Monthly', starts_at, january)
+        self.assertEqual(timezone.localtime(february).date().isoformat(), '2024-02-29')
+
+    def test_daily_and_weekly(self):
+        starts_at = local(2024, 2, 28, 9, 0)
+        self.assertEqual(standing.next_occurrence('Daily', starts_at, starts_at), local(2024, 2, 29, 9, 0))
+        self.assertEqual(standing.next_occurrence('Weekly', starts_at, starts_at), local(2024, 3, 6, 9, 0))
+
+
+@override_settings(STANDING_MAX_ATTEMPTS=3, STANDING_RETRY_MINUTES=60)
+class RunBatchTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.payee = create_account('payee', Decimal('0.00'))
+
+    def instruction(self, payer, amount='10.00', **kwargs):
+        kwargs.setdefault('starts_at', self.now - timedelta(hours=1))
+        return StandingInstruction.objects.create(account=payer, to_account=self.payee, amount=Decimal(amount),
+                                                  frequency='Daily', **kwargs)
+
+    def test_picks_due_instructions_oldest_first(self):
+        payer = create_account('payer', Decimal('100.00'))
+        newer = self.instruction(payer, starts_at=self.now - timedelta(minutes=5))
+        older = self.instruction(payer, starts_at=self.now - timedelta(hours=2))
+        future = self.instruction(payer, starts_at=self.now + timedelta(minutes=5))
+        stopped = self.instruction(payer, is_active=False)
+
+        self.assertEqual(standing.run_batch(self.now, batch_size=1)['posted'], 1)
+        older.refresh_from_db()
+        newer.refresh_from_db()
+        self.assertEqual(older.next_run_at, self.now - timedelta(hours=2) + timedelta(days=1))
+        self.assertEqual(newer.last_run_at, None)
+
+        self.assertEqual(standing.run_batch(self.now)['picked'], 1)
+        for instruction in (future, stopped):
+            instruction.refresh_from_db()
+            self.assertIsNone(instruction.last_run_at)
+        payer.refresh_from_db()
+        self.assertEqual(payer.balance, Decimal('80.00'))
+
+    def test_retries_then_skips_the_occurrence(self):
+        payer = create_account('payer', Decimal('5.00'))
+        instruction = self.instruction(payer)
+        occurrence = instruction.scheduled_for
+        run_at = self.now
+        for attempt in (1, 2):
+            self.assertEqual(standing.run_batch(run_at)['retried'], 1)
+            instruction.refresh_from_db()
+            self.assertEqual(instruction.attempts, attempt)
+            self.assertEqual(instruction.scheduled_for, occurrence)
+            self.assertEqual(instruction.next_run_at, run_at + timedelta(minutes=60))
+            # Not due again before the retry delay has passed
+            self.assertEqual(standing.run_batch(run_at + timedelta(minutes=59))['picked'], 0)
+            run_at = instruction.next_run_at
+
+        self.assertEqual(standing.run_batch(run_at)['skipped'], 1)
+        instruction.refresh_from_db()
+        self.assertEqual(instruction.attempts, 0)
+        self.assertEqual(instruction.scheduled_for, occurrence + timedelta(days=1))
+        self.assertEqual(instruction.next_run_at, instruction.scheduled_for)
+        self.assertEqual(instruction.last_error, 'Insufficient balance, occurrence skipped')
+        self.assertTrue(instruction.is_active)
+        payer.refresh_from_db()
+        self.assertEqual(payer.balance, Decimal('5.00'))
+
+    def test_an_instruction_cannot_pay_its_own_account(self):
+        payer = create_account('payer', Decimal('100.00'))
+        instruction = StandingInstruction(account=payer, to_account=payer, amount=Decimal('10.00'),
+                                          starts_at=self.now)
+        with self.assertRaisesMessage(ValidationError, 'Source and destination accounts must differ.'):
+            instruction.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            instruction.save()
+
+
+@override_settings(VELOCITY_LIMITS={})
+class SkipLockedTests(TransactionTestCase):
+    # SQLite has no row locks, so this needs MySQL 8
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_instructions_locked_elsewhere_are_skipped(self):
+        now = timezone.now()
+        payee = create_account('payee', Decimal('0.00'))
+        held, free = [
+            StandingInstruction.objects.create(account=create_account(name, Decimal('100.00')), to_account=payee,
+                                               amount=Decimal('10.00'), starts_at=now - timedelta(hours=1))
+            for name in ('held', 'free')
+        ]
+        locked, release = threading.Event(), threading.Event()
+
+        def other_scheduler():
+            try:
+                with transaction.atomic():
+                    StandingInstruction.objects.select_for_update().get(pk=held.pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_scheduler)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            result = standing.run_batch(now)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual((result['picked'], result['posted']), (1, 1))
+        held.refresh_from_db()
+        free.refresh_from_db()
+        self.assertIsNone(held.last_run_at)
+        self.assertEqual(free.last_run_at, now)
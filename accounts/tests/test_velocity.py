@@ -0,0 +1,45 @@
+import time
+from decimal import Decimal
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from accounts import ledger, velocity
+from .helpers import create_account
+
+
+@override_settings(VELOCITY_LIMITS={'Saving': {'minute': {'count': 3, 'amount': '250.00'}}})
+class VelocityLimitTests(TestCase):
+    def setUp(self):
+        caches['velocity'].clear()
+        self.account = create_account('alice', Decimal('1000.00'))
+        self.other = create_account('bob')
+
+    def test_counters_live_in_their_own_cache(self):
+        bucket = int(time.time() // 60)
+        ledger.withdraw(self.account.id, Decimal('10.00'))
+        # The withdrawal may have crossed into the next minute
+        keys = [velocity._key(self.account.id, 60, bucket + offset) for offset in (0, 1)]
+        self.assertEqual(list(caches['velocity'].get_many(keys).values()), [1000 << velocity.COUNT_BITS | 1])
+        self.assertEqual(caches['default'].get_many(keys), {})
+
+    def test_amount_then_count_limits(self):
+        ledger.withdraw(self.account.id, Decimal('100.00'))
+        ledger.transfer(self.account, self.other, Decimal('100.00'))
+        with self.assertRaisesMessage(ledger.VelocityLimitExceeded, '₹250.00'):
+            ledger.withdraw(self.account.id, Decimal('100.00'))
+        ledger.withdraw(self.account.id, Decimal('50.00'))
+        with self.assertRaisesMessage(ledger.VelocityLimitExceeded, 'Limit of 3 withdrawals'):
+            ledger.withdraw(self.account.id, Decimal('1.00'))
+        ledger.deposit(self.account.id, Decimal('5.00'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('755.00'))
+
+    def test_undo_takes_a_debit_back(self):
+        for _ in range(3):
+            breach, undo = velocity.reserve(self.account.id, 'Saving', Decimal('80.00'))
+            self.assertIsNone(breach)
+            undo()
+        self.assertIsNone(velocity.reserve(self.account.id, 'Saving', Decimal('240.00'))[0])
+
+    def test_unlisted_account_types_are_not_limited(self):
+        self.assertEqual(velocity.rules('Current'), [])
+        self.assertIsNone(velocity.reserve(self.account.id, 'Current', Decimal('1000000.00'))[0])
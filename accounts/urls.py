@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
 
+# Customer pages are served by async views under ASGI (see settings.ASYNC_VIEWS)
+if settings.ASYNC_VIEWS:
+    from . import async_views as customer_views
+else:
+    customer_views = views
+
 urlpatterns = [
     # Public URLs
     path('', views.home, name='home'),
@@ -10,11 +17,12 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     
     # User URLs
-    path('dashboard/', views.dashboard, name='dashboard'),
-    path('deposit/', views.deposit, name='deposit'),
-    path('withdraw/', views.withdraw, name='withdraw'),
-    path('transfer/', views.transfer, name='transfer'),
-    path('transactions/', views.transaction_history, name='transaction_history'),
+    path('dashboard/', customer_views.dashboard, name='dashboard'),
+    path('deposit/', customer_views.deposit, name='deposit'),
+    path('withdraw/', customer_views.withdraw, name='withdraw'),
+    path('transfer/', customer_views.transfer, name='transfer'),
+    path('transactions/', customer_views.transaction_history, name='transaction_history'),
+    path('transactions/export/', customer_views.export_transactions, name='export_transactions'),
     path('profile/', views.profile, name='profile'),
     
     # Admin URLs
@@ -25,5 +33,7 @@ urlpatterns = [
     path('activate-customer/<int:customer_id>/', views.activate_customer, name='activate_customer'),
     path('all-transactions/', views.all_transactions, name='all_transactions'),
     path('reports/', views.reports, name='reports'),
+    path('admin-dashboard/db-pool/', views.db_pool_stats, name='db_pool_stats'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
 ]
 
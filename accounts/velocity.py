@@ -0,0 +1,114 @@
+"""
+Per-account velocity limits on debits (withdrawals and outgoing transfers).
+
+``settings.VELOCITY_LIMITS`` maps an account type to rules per window,
+e.g. ``{'Saving': {'minute': {'count': 5, 'amount': '50000.00'}}}``: at most
+5 debits and ₹50,000 per minute. Windows are ``minute``, ``hour`` and
+``day``; an account type without rules is not limited.
+
+Counters live in a dedicated cache (``settings.VELOCITY_CACHE``), never in
+the database. It must be shared by every worker process and must not evict
+live counters: Redis in production. Local memory keeps a count per process
+and is only fit for development and tests.
+Each window is a sliding window approximated from two fixed buckets: the
+current bucket plus the previous one weighted by how much of it still
+overlaps the window. A bucket is a single integer holding both the amount
+in paise and the count (``paise << COUNT_BITS | count``), so one atomic
+``incr`` records a debit in it.
+
+``reserve()`` runs inside the posting, after the balance check and before
+the balance update. It increments first and then compares, so concurrent
+debits cannot all slip under a limit; a debit that breaches a limit, or a
+posting that fails afterwards, takes its increments back. A posting rolled
+back later by an outer transaction stays counted, erring on the side of
+the limit.
+"""
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+
+
+WINDOWS = {'minute': 60, 'hour': 60 * 60, 'day': 24 * 60 * 60}
+COUNT_BITS = 20
+COUNT_MASK = (1 << COUNT_BITS) - 1
+
+
+def _cache():
+    return caches[getattr(settings, 'VELOCITY_CACHE', 'default')]
+
+
+def rules(account_type):
+    """[(window name, seconds, max count or None, max amount in paise or None)] for an account type"""
+    configured = getattr(settings, 'VELOCITY_LIMITS', {}).get(account_type) or {}
+    return [
+        (window, WINDOWS[window], rule.get('count'),
+         int(Decimal(str(rule['amount'])) * 100) if rule.get('amount') is not None else None)
+        for window, rule in configured.items()
+    ]
+
+
+def _key(account_id, seconds, bucket):
+    return f'velocity:{account_id}:{seconds}:{bucket}'
+
+
+def _incr(cache, key, delta, timeout):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout):
+            return delta
+        # Another posting created the bucket first
+        return cache.incr(key, delta)
+
+
+def _decr(cache, key, delta):
+    try:
+        cache.decr(key, delta)
+    except ValueError:
+        # The bucket has expired; nothing left to take back
+        pass
+
+
+def _describe(window, max_count, max_paise, count_breached):
+    if count_breached:
+        return f'Limit of {max_count} withdrawals and transfers per {window} reached.'
+    return f'Limit of ₹{Decimal(max_paise) / 100:.2f} in withdrawals and transfers per {window} reached.'
+
+
+def reserve(account_id, account_type, amount):
+    """
+    Count a debit against the account's limits. Returns (breach, undo):
+    breach is None or a message naming the limit the debit would exceed (its
+    increments are then already undone), and undo() takes a counted debit
+    back if the posting fails.
+    """
+    account_rules = rules(account_type)
+    if not account_rules:
+        return None, lambda: None
+    cache = _cache()
+    now = time.time()
+    delta = int(amount * 100) << COUNT_BITS | 1
+    previous = cache.get_many([_key(account_id, seconds, int(now // seconds) - 1)
+                               for _, seconds, _, _ in account_rules])
+    counted = []
+
+    def undo():
+        for key in counted:
+            _decr(cache, key, delta)
+
+    for window, seconds, max_count, max_paise in account_rules:
+        bucket = int(now // seconds)
+        key = _key(account_id, seconds, bucket)
+        current = _incr(cache, key, delta, 2 * seconds)
+        counted.append(key)
+        # Share of the previous bucket still inside the sliding window
+        weight = 1 - (now % seconds) / seconds
+        before = previous.get(_key(account_id, seconds, bucket - 1), 0)
+        count = (current & COUNT_MASK) + (before & COUNT_MASK) * weight
+        paise = (current >> COUNT_BITS) + (before >> COUNT_BITS) * weight
+        count_breached = max_count is not None and count > max_count
+        if count_breached or (max_paise is not None and paise > max_paise):
+            undo()
+            return _describe(window, max_count, max_paise, count_breached), lambda: None
+    return None, undo
@@ -3,10 +3,19 @@ from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db import transaction
-from django.core.paginator import Paginator
-from django.db.models import Sum, Q
+from django.db.models import Sum
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import require_POST
 from decimal import Decimal
-from .models import Customer, Account, Transaction
+from .models import Customer, Account, Transaction, ArchivedTransaction
+from . import archive, dbpool, groupcommit, ledger, metrics, outbox, pagecache, rollups, search, statements
+from .pagination import KeysetPage, KeysetPaginator
+from .querybudget import query_budget
+from .idempotency import idempotent, posting_succeeded
+from .routers import is_pinned, iter_on_replica, use_replica
+from .middleware import get_account_ref, invalidate_account_ref
 from .forms import (
     UserRegistrationForm, DepositForm, WithdrawForm, 
     TransferForm, ProfileUpdateForm
@@ -19,6 +28,7 @@ def is_admin(user):
     return user.is_staff or user.is_superuser
 
 
+@pagecache.cache_anonymous_page
 def home(request):
     """Home page"""
     return render(request, 'accounts/home.html')
@@ -32,31 +42,37 @@ def register(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            # Create customer profile
-            customer = Customer.objects.create(
-                user=user,
-                phone=form.cleaned_data['phone'],
-                address=form.cleaned_data['address'],
-                city=form.cleaned_data['city'],
-                state=form.cleaned_data['state'],
-                pincode=form.cleaned_data['pincode'],
-            )
-            # Create account with initial deposit
-            initial_deposit = form.cleaned_data['initial_deposit']
-            account = Account.objects.create(
-                customer=customer,
-                account_type=form.cleaned_data['account_type'],
-                balance=initial_deposit
-            )
-            # Create initial deposit transaction
-            Transaction.objects.create(
-                account=account,
-                transaction_type='Deposit',
-                amount=initial_deposit,
-                balance_after_transaction=initial_deposit,
-                description='Initial deposit'
-            )
+            # The user, the account, its opening deposit and that deposit's
+            # rollup and outbox rows are created together or not at all
+            with transaction.atomic():
+                user = form.save()
+                # Create customer profile
+                customer = Customer.objects.create(
+                    user=user,
+                    phone=form.cleaned_data['phone'],
+                    address=form.cleaned_data['address'],
+                    city=form.cleaned_data['city'],
+                    state=form.cleaned_data['state'],
+                    pincode=form.cleaned_data['pincode'],
+                )
+                # Create account with initial deposit
+                initial_deposit = form.cleaned_data['initial_deposit']
+                account = Account.objects.create(
+                    customer=customer,
+                    account_type=form.cleaned_data['account_type'],
+                    balance=initial_deposit
+                )
+                # Create initial deposit transaction
+                opening = Transaction.objects.create(
+                    account=account,
+                    transaction_type='Deposit',
+                    amount=initial_deposit,
+                    balance_after_transaction=initial_deposit,
+                    description='Initial deposit'
+                )
+                rollups.record(account.id, account.account_type, 'Deposit', initial_deposit)
+                outbox.record(opening)
+                search.index_customers([customer])
             messages.success(request, 'Account created successfully! Please wait for admin approval.')
             return redirect('login')
     else:
@@ -77,13 +93,10 @@ def user_login(request):
         
         if user is not None:
             # Check if customer is approved
-            try:
-                customer = Customer.objects.get(user=user)
-                if not customer.is_approved:
-                    messages.warning(request, 'Your account is pending approval. Please wait for admin approval.')
-                    return render(request, 'accounts/login.html')
-            except Customer.DoesNotExist:
-                pass
+            ref = get_account_ref(user)
+            if ref is not None and not ref.is_approved:
+                messages.warning(request, 'Your account is pending approval. Please wait for admin approval.')
+                return render(request, 'accounts/login.html')
             
             login(request, user)
             if user.is_staff:
@@ -96,251 +109,257 @@ def user_login(request):
 
 
 @login_required
+@query_budget(4)
 def dashboard(request):
     """User dashboard"""
-    try:
-        customer = Customer.objects.get(user=request.user)
-        account = Account.objects.get(customer=customer)
-        
-        # Get recent transactions
-        recent_transactions = Transaction.objects.filter(account=account)[:5]
-        
-        context = {
-            'customer': customer,
-            'account': account,
-            'recent_transactions': recent_transactions,
-        }
-        return render(request, 'accounts/dashboard.html', context)
-    except (Customer.DoesNotExist, Account.DoesNotExist):
+    ref = request.customer_context.ref
+    if ref is None:
         messages.error(request, 'Account not found. Please contact administrator.')
         return redirect('home')
+    
+    # The account and recent transactions are only queried when their cached
+    # fragments are missing (see accounts/pagecache.py)
+    context = {
+        'ref': ref,
+        'account': SimpleLazyObject(lambda: request.customer_context.account),
+        'recent_transactions': SimpleLazyObject(lambda: archive.history(ref.id, 5).get_page().object_list),
+        **pagecache.dashboard_context(pagecache.account_version(ref.id)),
+    }
+    return render(request, 'accounts/dashboard.html', context)
 
 
 @login_required
+@idempotent
+# Worst case: the day's first posting to a summary bucket creates the row
+# and loses the insert to a concurrent posting (rollups._add), and an
+# idempotency key is marked done with the posting
+@query_budget(12)
 def deposit(request):
     """Deposit money view"""
-    try:
-        customer = Customer.objects.get(user=request.user)
-        account = Account.objects.get(customer=customer)
-        
-        if not customer.is_approved:
-            messages.error(request, 'Your account is not approved yet.')
-            return redirect('dashboard')
-        
-        if request.method == 'POST':
-            form = DepositForm(request.POST)
-            if form.is_valid():
-                amount = form.cleaned_data['amount']
-                description = form.cleaned_data.get('description', 'Deposit')
-                
-                with transaction.atomic():
-                    account.balance += amount
-                    account.save()
-                    
-                    Transaction.objects.create(
-                        account=account,
-                        transaction_type='Deposit',
-                        amount=amount,
-                        balance_after_transaction=account.balance,
-                        description=description
-                    )
-                
-                messages.success(request, f'Successfully deposited ₹{amount}. New balance: ₹{account.balance}')
-                return redirect('dashboard')
-        else:
-            form = DepositForm()
-        
-        return render(request, 'accounts/deposit.html', {'form': form, 'account': account})
-    except (Customer.DoesNotExist, Account.DoesNotExist):
+    ref = request.customer_context.ref
+    if ref is None:
         messages.error(request, 'Account not found.')
         return redirect('dashboard')
+    
+    if not ref.is_approved:
+        messages.error(request, 'Your account is not approved yet.')
+        return redirect('dashboard')
+    
+    if request.method == 'POST':
+        form = DepositForm(request.POST)
+        if form.is_valid():
+            amount = form.cleaned_data['amount']
+            description = form.cleaned_data.get('description', 'Deposit')
+            
+            with metrics.posting('deposit'):
+                posted = groupcommit.deposit(ref.id, amount, description)
+            
+            posting_succeeded(request, f'Successfully deposited ₹{amount}. New balance: ₹{posted.balance_after_transaction}')
+            return redirect('dashboard')
+    else:
+        form = DepositForm()
+    
+    return render(request, 'accounts/deposit.html', {'form': form, 'account': request.customer_context.account})
 
 
 @login_required
+@idempotent
+@query_budget(12)
 def withdraw(request):
     """Withdraw money view"""
-    try:
-        customer = Customer.objects.get(user=request.user)
-        account = Account.objects.get(customer=customer)
-        
-        if not customer.is_approved:
-            messages.error(request, 'Your account is not approved yet.')
-            return redirect('dashboard')
-        
-        if request.method == 'POST':
-            form = WithdrawForm(request.POST)
-            if form.is_valid():
-                amount = form.cleaned_data['amount']
-                description = form.cleaned_data.get('description', 'Withdrawal')
-                
-                if amount > account.balance:
-                    messages.error(request, 'Insufficient balance!')
-                    return render(request, 'accounts/withdraw.html', {'form': form, 'account': account})
-                
-                with transaction.atomic():
-                    account.balance -= amount
-                    account.save()
-                    
-                    Transaction.objects.create(
-                        account=account,
-                        transaction_type='Withdraw',
-                        amount=amount,
-                        balance_after_transaction=account.balance,
-                        description=description
-                    )
-                
-                messages.success(request, f'Successfully withdrew ₹{amount}. New balance: ₹{account.balance}')
-                return redirect('dashboard')
-        else:
-            form = WithdrawForm()
-        
-        return render(request, 'accounts/withdraw.html', {'form': form, 'account': account})
-    except (Customer.DoesNotExist, Account.DoesNotExist):
+    ref = request.customer_context.ref
+    if ref is None:
         messages.error(request, 'Account not found.')
         return redirect('dashboard')
+    
+    if not ref.is_approved:
+        messages.error(request, 'Your account is not approved yet.')
+        return redirect('dashboard')
+    
+    if request.method == 'POST':
+        form = WithdrawForm(request.POST)
+        if form.is_valid():
+            amount = form.cleaned_data['amount']
+            description = form.cleaned_data.get('description', 'Withdrawal')
+            
+            try:
+                with metrics.posting('withdraw'):
+                    posted = groupcommit.withdraw(ref.id, amount, description)
+            except ledger.InsufficientBalance:
+                messages.error(request, 'Insufficient balance!')
+                return render(request, 'accounts/withdraw.html', {'form': form, 'account': request.customer_context.account})
+            except ledger.VelocityLimitExceeded as exc:
+                messages.error(request, str(exc))
+                return render(request, 'accounts/withdraw.html', {'form': form, 'account': request.customer_context.account})
+            
+            posting_succeeded(request, f'Successfully withdrew ₹{amount}. New balance: ₹{posted.balance_after_transaction}')
+            return redirect('dashboard')
+    else:
+        form = WithdrawForm()
+    
+    return render(request, 'accounts/withdraw.html', {'form': form, 'account': request.customer_context.account})
 
 
 @login_required
+@idempotent
+# As for deposits, for both legs' summary rows
+@query_budget(20)
 def transfer(request):
     """Transfer money view"""
-    try:
-        customer = Customer.objects.get(user=request.user)
-        account = Account.objects.get(customer=customer)
-        
-        if not customer.is_approved:
-            messages.error(request, 'Your account is not approved yet.')
-            return redirect('dashboard')
-        
-        if request.method == 'POST':
-            form = TransferForm(request.POST)
-            if form.is_valid():
-                to_account_number = form.cleaned_data['to_account_number']
-                amount = form.cleaned_data['amount']
-                description = form.cleaned_data.get('description', 'Transfer')
-                
-                if amount > account.balance:
-                    messages.error(request, 'Insufficient balance!')
-                    return render(request, 'accounts/transfer.html', {'form': form, 'account': account})
-                
-                try:
-                    to_account = Account.objects.get(account_number=to_account_number, is_active=True)
-                    if to_account == account:
-                        messages.error(request, 'Cannot transfer to your own account!')
-                        return render(request, 'accounts/transfer.html', {'form': form, 'account': account})
-                except Account.DoesNotExist:
-                    messages.error(request, 'Recipient account not found or inactive!')
-                    return render(request, 'accounts/transfer.html', {'form': form, 'account': account})
-                
-                with transaction.atomic():
-                    # Deduct from sender
-                    account.balance -= amount
-                    account.save()
-                    
-                    # Add to recipient
-                    to_account.balance += amount
-                    to_account.save()
-                    
-                    # Create transactions
-                    Transaction.objects.create(
-                        account=account,
-                        transaction_type='Transfer',
-                        amount=amount,
-                        balance_after_transaction=account.balance,
-                        description=f'Transfer to {to_account_number} - {description}',
-                        to_account=to_account
-                    )
-                    
-                    Transaction.objects.create(
-                        account=to_account,
-                        transaction_type='Transfer',
-                        amount=amount,
-                        balance_after_transaction=to_account.balance,
-                        description=f'Transfer from {account.account_number} - {description}',
-                        to_account=account
-                    )
-                
-                messages.success(request, f'Successfully transferred ₹{amount} to account {to_account_number}')
-                return redirect('dashboard')
-        else:
-            form = TransferForm()
-        
-        return render(request, 'accounts/transfer.html', {'form': form, 'account': account})
-    except (Customer.DoesNotExist, Account.DoesNotExist):
+    ref = request.customer_context.ref
+    if ref is None:
         messages.error(request, 'Account not found.')
         return redirect('dashboard')
+    
+    if not ref.is_approved:
+        messages.error(request, 'Your account is not approved yet.')
+        return redirect('dashboard')
+    
+    if request.method == 'POST':
+        form = TransferForm(request.POST)
+        if form.is_valid():
+            to_account_number = form.cleaned_data['to_account_number']
+            amount = form.cleaned_data['amount']
+            description = form.cleaned_data.get('description', 'Transfer')
+            
+            try:
+                to_account = Account.objects.only('id', 'account_number').get(
+                    account_number=to_account_number, is_active=True)
+                if to_account.id == ref.id:
+                    messages.error(request, 'Cannot transfer to your own account!')
+                    return render(request, 'accounts/transfer.html', {'form': form, 'account': request.customer_context.account})
+            except Account.DoesNotExist:
+                messages.error(request, 'Recipient account not found or inactive!')
+                return render(request, 'accounts/transfer.html', {'form': form, 'account': request.customer_context.account})
+            
+            try:
+                with metrics.posting('transfer'):
+                    ledger.transfer(ref, to_account, amount, description)
+            except ledger.InsufficientBalance:
+                messages.error(request, 'Insufficient balance!')
+                return render(request, 'accounts/transfer.html', {'form': form, 'account': request.customer_context.account})
+            except ledger.VelocityLimitExceeded as exc:
+                messages.error(request, str(exc))
+                return render(request, 'accounts/transfer.html', {'form': form, 'account': request.customer_context.account})
+            
+            posting_succeeded(request, f'Successfully transferred ₹{amount} to account {to_account_number}')
+            return redirect('dashboard')
+    else:
+        form = TransferForm()
+    
+    return render(request, 'accounts/transfer.html', {'form': form, 'account': request.customer_context.account})
 
 
 @login_required
+@use_replica
+@query_budget(3)
 def transaction_history(request):
     """Transaction history view"""
+    ref = request.customer_context.ref
+    if ref is None:
+        messages.error(request, 'Account not found.')
+        return redirect('dashboard')
+    
+    # Keyset pagination: constant cost however deep the history goes,
+    # continuing into archived rows past the oldest hot one
+    paginator = archive.history(ref.id, 10)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    
+    return render(request, 'accounts/transaction_history.html', {
+        'page_obj': page_obj,
+        'account': ref
+    })
+
+
+def statement_response(chunks, account_number, start, end, fmt):
+    """Stream statement chunks as a file download"""
+    response = StreamingHttpResponse(chunks, content_type=statements.FORMATS[fmt][0])
+    name = statements.filename(account_number, fmt, start, end)
+    response['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
+
+@login_required
+@use_replica
+@query_budget(2)
+def export_transactions(request):
+    """Download a statement as CSV or JSON Lines; staff may pass ?account=<number>"""
     try:
-        customer = Customer.objects.get(user=request.user)
-        account = Account.objects.get(customer=customer)
-        
-        transactions = Transaction.objects.filter(account=account).order_by('-created_at')
-        
-        # Pagination
-        paginator = Paginator(transactions, 10)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        return render(request, 'accounts/transaction_history.html', {
-            'page_obj': page_obj,
-            'account': account
-        })
-    except (Customer.DoesNotExist, Account.DoesNotExist):
+        start, end, fmt = statements.parse_params(request.GET)
+    except ValueError as exc:
+        messages.error(request, f'Invalid export request: {exc}')
+        return redirect('transaction_history')
+    
+    account_number = request.GET.get('account')
+    if account_number and is_admin(request.user):
+        account = Account.objects.filter(account_number=account_number).only('id', 'account_number').first()
+    else:
+        account = request.customer_context.ref
+    if account is None:
         messages.error(request, 'Account not found.')
         return redirect('dashboard')
+    
+    # Rows are read and formatted while the response is sent, after this
+    # view has returned, so the replica routing goes with the iterator
+    chunks = statements.render(statements.statement_lines(account.id, start, end), fmt)
+    if not is_pinned(request):
+        chunks = iter_on_replica(chunks)
+    return statement_response(chunks, account.account_number, start, end, fmt)
 
 
 @login_required
+@query_budget(6)
 def profile(request):
     """User profile view"""
-    try:
-        customer = Customer.objects.get(user=request.user)
-        account = Account.objects.get(customer=customer)
-        
-        if request.method == 'POST':
-            form = ProfileUpdateForm(request.POST, instance=customer)
-            if form.is_valid():
-                customer = form.save()
-                # Update user info
-                user = request.user
-                user.first_name = request.POST.get('first_name', user.first_name)
-                user.last_name = request.POST.get('last_name', user.last_name)
-                user.email = request.POST.get('email', user.email)
-                user.save()
-                messages.success(request, 'Profile updated successfully!')
-                return redirect('profile')
-        else:
-            form = ProfileUpdateForm(instance=customer)
-            form.fields['first_name'].initial = request.user.first_name
-            form.fields['last_name'].initial = request.user.last_name
-            form.fields['email'].initial = request.user.email
-        
-        return render(request, 'accounts/profile.html', {
-            'form': form,
-            'customer': customer,
-            'account': account
-        })
-    except Customer.DoesNotExist:
+    customer = request.customer_context.customer
+    account = request.customer_context.account
+    if customer is None:
         messages.error(request, 'Customer profile not found.')
         return redirect('dashboard')
+    
+    if request.method == 'POST':
+        form = ProfileUpdateForm(request.POST, instance=customer)
+        if form.is_valid():
+            customer = form.save()
+            # Update user info
+            user = request.user
+            user.first_name = request.POST.get('first_name', user.first_name)
+            user.last_name = request.POST.get('last_name', user.last_name)
+            user.email = request.POST.get('email', user.email)
+            user.save()
+            invalidate_account_ref(user.pk)
+            search.index_customers([customer])
+            if account is not None:
+                pagecache.bump_account_versions([account.id])
+            messages.success(request, 'Profile updated successfully!')
+            return redirect('profile')
+    else:
+        form = ProfileUpdateForm(instance=customer)
+        form.fields['first_name'].initial = request.user.first_name
+        form.fields['last_name'].initial = request.user.last_name
+        form.fields['email'].initial = request.user.email
+    
+    return render(request, 'accounts/profile.html', {
+        'form': form,
+        'customer': customer,
+        'account': account
+    })
 
 
 # Admin Views
 @login_required
 @user_passes_test(is_admin)
+@use_replica
+@query_budget(6)
 def admin_dashboard(request):
     """Admin dashboard"""
     total_customers = Customer.objects.count()
     total_accounts = Account.objects.count()
     total_balance = Account.objects.aggregate(Sum('balance'))['balance__sum'] or Decimal('0.00')
     
-    total_deposits = Transaction.objects.filter(transaction_type='Deposit').aggregate(
-        Sum('amount'))['amount__sum'] or Decimal('0.00')
-    total_withdrawals = Transaction.objects.filter(transaction_type='Withdraw').aggregate(
-        Sum('amount'))['amount__sum'] or Decimal('0.00')
+    totals = rollups.totals_by_type()
+    total_deposits = totals['Deposit']
+    total_withdrawals = totals['Withdraw']
     
     pending_approvals = Customer.objects.filter(is_approved=False).count()
     recent_transactions = Transaction.objects.all()[:10]
@@ -359,22 +378,24 @@ def admin_dashboard(request):
 
 @login_required
 @user_passes_test(is_admin)
+@use_replica
+@query_budget(6)
 def manage_customers(request):
     """Admin view to manage customers"""
     search_query = request.GET.get('search', '')
-    customers = Customer.objects.all()
+    customers = Customer.objects.select_related('user', 'account').only(
+        'phone', 'is_approved', 'created_at',
+        'user__username', 'user__first_name', 'user__last_name', 'user__email',
+        'account__account_number', 'account__balance', 'account__is_active',
+    )
     
     if search_query:
-        customers = customers.filter(
-            Q(user__username__icontains=search_query) |
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(phone__icontains=search_query)
-        )
-    
-    paginator = Paginator(customers, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        # Ranked matches from the search index, best first
+        results = search.search_customers(search_query, customers)
+        page_obj = KeysetPage(results, False, False, len(results))
+    else:
+        paginator = KeysetPaginator(customers, 10, count_total=True)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
     
     return render(request, 'accounts/manage_customers.html', {
         'page_obj': page_obj,
@@ -382,17 +403,20 @@ def manage_customers(request):
     })
 
 
+@require_POST
 @login_required
 @user_passes_test(is_admin)
 def approve_customer(request, customer_id):
     """Approve customer account"""
-    customer = get_object_or_404(Customer, id=customer_id)
+    customer = get_object_or_404(Customer.objects.select_related('user'), id=customer_id)
     customer.is_approved = True
     customer.save()
+    invalidate_account_ref(customer.user_id)
     messages.success(request, f'Customer {customer.user.username} approved successfully!')
     return redirect('manage_customers')
 
 
+@require_POST
 @login_required
 @user_passes_test(is_admin)
 def deactivate_customer(request, customer_id):
@@ -402,12 +426,15 @@ def deactivate_customer(request, customer_id):
         account = Account.objects.get(customer=customer)
         account.is_active = False
         account.save()
+        invalidate_account_ref(customer.user_id)
+        pagecache.bump_account_versions([account.id])
         messages.success(request, f'Account {account.account_number} deactivated successfully!')
     except Account.DoesNotExist:
         messages.error(request, 'Account not found.')
     return redirect('manage_customers')
 
 
+@require_POST
 @login_required
 @user_passes_test(is_admin)
 def activate_customer(request, customer_id):
@@ -417,6 +444,8 @@ def activate_customer(request, customer_id):
         account = Account.objects.get(customer=customer)
         account.is_active = True
         account.save()
+        invalidate_account_ref(customer.user_id)
+        pagecache.bump_account_versions([account.id])
         messages.success(request, f'Account {account.account_number} activated successfully!')
     except Account.DoesNotExist:
         messages.error(request, 'Account not found.')
@@ -425,21 +454,26 @@ def activate_customer(request, customer_id):
 
 @login_required
 @user_passes_test(is_admin)
+@use_replica
+@query_budget(6)
 def all_transactions(request):
     """Admin view all transactions"""
     search_query = request.GET.get('search', '')
-    transactions = Transaction.objects.all().order_by('-created_at')
+    hot, archived = [
+        model.objects.select_related('account__customer__user').only(
+            'transaction_id', 'transaction_type', 'amount', 'balance_after_transaction', 'created_at',
+            'account__account_number', 'account__customer__user__username',
+            'account__customer__user__first_name', 'account__customer__user__last_name',
+        )
+        for model in (Transaction, ArchivedTransaction)
+    ]
     
     if search_query:
-        transactions = transactions.filter(
-            Q(transaction_id__icontains=search_query) |
-            Q(account__account_number__icontains=search_query) |
-            Q(account__customer__user__username__icontains=search_query)
-        )
+        hot = search.filter_transactions(hot, search_query)
+        archived = search.filter_transactions(archived, search_query)
     
-    paginator = Paginator(transactions, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(hot, 20, older=[archived])
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     return render(request, 'accounts/all_transactions.html', {
         'page_obj': page_obj,
@@ -449,14 +483,14 @@ def all_transactions(request):
 
 @login_required
 @user_passes_test(is_admin)
+@use_replica
+@query_budget(4)
 def reports(request):
     """Admin reports view"""
-    total_deposits = Transaction.objects.filter(transaction_type='Deposit').aggregate(
-        Sum('amount'))['amount__sum'] or Decimal('0.00')
-    total_withdrawals = Transaction.objects.filter(transaction_type='Withdraw').aggregate(
-        Sum('amount'))['amount__sum'] or Decimal('0.00')
-    total_transfers = Transaction.objects.filter(transaction_type='Transfer').aggregate(
-        Sum('amount'))['amount__sum'] or Decimal('0.00')
+    totals = rollups.totals_by_type()
+    total_deposits = totals['Deposit']
+    total_withdrawals = totals['Withdraw']
+    total_transfers = totals['Transfer']
     
     total_balance = Account.objects.aggregate(Sum('balance'))['balance__sum'] or Decimal('0.00')
     
@@ -473,3 +507,24 @@ def reports(request):
     }
     return render(request, 'accounts/reports.html', context)
 
+
+@login_required
+@user_passes_test(is_admin)
+def db_pool_stats(request):
+    """Connection pool counters of the worker process serving the request"""
+    return JsonResponse(dbpool.stats())
+
+
+def can_scrape_metrics(request):
+    """Whether a request may read /metrics: the scrape token, an allowed address or staff"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS or is_admin(request.user)
+
+
+def prometheus_metrics(request):
+    """Prometheus scrape endpoint for this worker process"""
+    if not can_scrape_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
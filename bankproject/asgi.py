@@ -12,6 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bankproject.settings')
+# Serve the customer pages with the async views in accounts/async_views.py
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
 
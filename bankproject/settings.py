@@ -34,11 +34,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CustomerContextMiddleware',
+    'accounts.routers.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,9 +70,15 @@ WSGI_APPLICATION = 'bankproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connection pool (see accounts/dbpool.py): each worker process keeps up to
+# DB_POOL_SIZE connections per database and reuses them across requests
+# under both WSGI and ASGI. DB_POOL_SIZE=0 turns pooling off. Size it for
+# the request threads plus POSTING_THREAD_POOL_SIZE of each process.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 20))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'accounts.backends.mysql',
         'NAME': 'bank_management_db',
         'USER': 'root',
         'PASSWORD': '',
@@ -78,9 +87,121 @@ DATABASES = {
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # Requests hand their connection back to the pool when they finish
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': 10,
+            'MAX_LIFETIME': 30 * 60,
+            'HEALTH_CHECK': True,
+        } if DB_POOL_SIZE else {},
     }
 }
 
+# Read replicas (see accounts/routers.py): comma-separated hosts in
+# DATABASE_REPLICA_HOSTS become aliases replica1, replica2, ... with the same
+# credentials as the primary. History, statements, reports and admin
+# listings read from them; all writes go to 'default'.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+# Seconds a client's reads stay on the primary after it writes
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# Local memory is per process; point this at a shared backend such as
+# 'django.core.cache.backends.redis.RedisCache' when running several workers
+# so account invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # State every worker process must agree on, such as the page cache's
+    # version tokens. Set REDIS_URL in production; the local-memory fallback
+    # is per process and only fit for development with a single worker.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+    # Velocity limit counters (see accounts/velocity.py), kept apart so page
+    # and fragment traffic cannot evict them. In production point
+    # VELOCITY_REDIS_URL (or REDIS_URL) at a Redis that does not evict keys
+    # with a TTL (maxmemory-policy noeviction); the local-memory fallback
+    # counts per process and is for development only.
+    'velocity': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('VELOCITY_REDIS_URL') or os.environ['REDIS_URL'],
+    } if os.environ.get('VELOCITY_REDIS_URL') or os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'velocity',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+# Cached customer/account ids and status flags (see accounts/middleware.py)
+ACCOUNT_REF_CACHE = 'default'
+ACCOUNT_REF_CACHE_TIMEOUT = 300
+
+# Versioned dashboard fragments and the anonymous home page (see
+# accounts/pagecache.py). Fragments are keyed on a per-account version that
+# every posting replaces, so they can be kept for long.
+PAGE_CACHE = 'default'
+# Where the per-account version tokens live; must be shared by all workers,
+# or a posting served by one worker leaves the others' fragments current
+PAGE_VERSION_CACHE = 'shared'
+DASHBOARD_FRAGMENT_TIMEOUT = 60 * 60
+HOME_PAGE_CACHE_TIMEOUT = 5 * 60
+
+# Range-partition the archive table of `manage.py archive_transactions` by
+# month on MySQL (see accounts/archive.py)
+ARCHIVE_PARTITIONS = True
+
+# Interest on Saving accounts (`manage.py accrue_interest`, see
+# accounts/interest.py): annual rate, as a string so it stays exact, over
+# an ACT/365 day count
+SAVINGS_INTEREST_RATE = '0.035'
+INTEREST_DAY_COUNT = 365
+
+# Standing instructions (`manage.py run_standing_instructions`, see
+# accounts/standing.py): an occurrence that finds too little money is
+# retried every STANDING_RETRY_MINUTES, at most STANDING_MAX_ATTEMPTS times
+STANDING_RETRY_MINUTES = 60
+STANDING_MAX_ATTEMPTS = 3
+
+# Transactional outbox of postings relayed by `manage.py relay_outbox` (see
+# accounts/outbox.py). The relay waits OUTBOX_SETTLE_SECONDS before skipping
+# a gap in event ids, which must be longer than any posting transaction.
+OUTBOX_ENABLED = True
+OUTBOX_SINK = 'jsonl:outbox.jsonl'
+OUTBOX_TOPIC = 'ledger.postings'
+OUTBOX_SETTLE_SECONDS = 10
+OUTBOX_RETENTION_DAYS = 7
+
+# Velocity limits on withdrawals and outgoing transfers per account type
+# (see accounts/velocity.py): at most `count` debits and `amount` rupees per
+# sliding minute/hour/day. Counters live in VELOCITY_CACHE, a dedicated
+# alias that must be shared by all workers and never cull (see CACHES).
+VELOCITY_CACHE = 'velocity'
+VELOCITY_LIMITS = {
+    'Saving': {
+        'minute': {'count': 10, 'amount': '100000.00'},
+        'day': {'count': 100, 'amount': '500000.00'},
+    },
+    'Current': {
+        'minute': {'count': 60, 'amount': '1000000.00'},
+        'day': {'count': 2000, 'amount': '10000000.00'},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -139,3 +260,56 @@ LOGOUT_REDIRECT_URL = 'home'
 # Minimum initial deposit
 MIN_INITIAL_DEPOSIT = 500
 
+
+# Transaction id / account number generation (see accounts/ids.py).
+# ID_NODE numbers the host (0-15 with 4 ID_HOST_BITS) and must be unique per
+# machine when running on more than one; each process on a host claims its
+# own slot (up to 64) by locking a file in ID_SLOT_DIR, which must be local
+# to the host.
+ID_GENERATOR = 'accounts.ids.SnowflakeIdGenerator'
+ID_NODE = int(os.environ['ID_NODE']) if 'ID_NODE' in os.environ else None
+ID_HOST_BITS = 4
+ID_SLOT_DIR = os.environ.get('ID_SLOT_DIR')
+
+# Per-view query budgets (see accounts/querybudget.py): 'raise', 'warn' or 'off'
+QUERY_BUDGET_MODE = 'warn' if DEBUG else 'off'
+
+# Async views for the customer pages (see accounts/async_views.py). Enabled by
+# bankproject/asgi.py; WSGI deployments keep the sync views.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+# Threads available to async views for ledger postings. Keep this at or
+# below the number of database connections each process may open.
+POSTING_THREAD_POOL_SIZE = int(os.environ.get('POSTING_THREAD_POOL_SIZE', 16))
+
+# Group commit for deposits/withdrawals (see accounts/groupcommit.py): postings
+# arriving within the window are committed together in one transaction.
+GROUP_COMMIT = os.environ.get('GROUP_COMMIT') == '1'
+GROUP_COMMIT_WINDOW_MS = 2
+GROUP_COMMIT_MAX_BATCH = 500
+# A posting still queued after this many seconds is posted directly, and the
+# process stops group-committing
+GROUP_COMMIT_TIMEOUT = 30
+
+# Idempotency keys on posting requests are kept this long (seconds) for
+# replaying retries; purge expired ones with `manage.py purge_idempotency_keys`.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Benchmarks (manage.py benchmark, benchmark_suite and loadtest) write
+# fixtures to the configured database and rebuild daily summaries when they
+# remove them. They refuse to run unless this is set, so only set it for a
+# database that holds benchmark or seeded data.
+BENCHMARK_DATABASE = os.environ.get('BENCHMARK_DATABASE') == '1'
+
+# Metrics (see accounts/metrics.py), scraped from GET /metrics by Prometheus.
+# Query counts and DB time are recorded for this share of requests (0-1);
+# request latency is always recorded.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+# Scrapers of /metrics send "Authorization: Bearer <METRICS_TOKEN>"; staff can
+# read it logged in. METRICS_ALLOWED_IPS lets addresses in without either, but
+# behind a reverse proxy REMOTE_ADDR is the proxy's, so only list addresses
+# that reach the app directly.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = []
+# Queries slower than this (milliseconds) are logged to accounts.slow_queries;
+# None turns the slow-query log off.
+SLOW_QUERY_MS = 200